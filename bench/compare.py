@@ -0,0 +1,73 @@
+"""Compare two benchmark results written by bench.run.
+
+    python -m bench.compare before.json after.json --max-regression 10
+
+Prints throughput and latency per target with the relative change. Exits
+with status 1 if a p95 or p99 latency grew by more than `--max-regression`
+percent, so the comparison can gate CI.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+# Latencies that fail the comparison when they regress
+GATED = ("p95_ms", "p99_ms")
+
+
+def change(before: float, after: float) -> float | None:
+    """Relative change in percent; None if there is no baseline."""
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before: dict, after: dict, *, max_regression: float) -> tuple[str, bool]:
+    """Return the comparison table and whether any gated latency regressed."""
+    lines = [
+        f"before {before.get('commit') or '?'}  after {after.get('commit') or '?'}",
+        f"{'target':<28}{'metric':<16}{'before':>12}{'after':>12}{'change':>10}",
+    ]
+    regressed = False
+    for target, result in after["results"].items():
+        baseline = before["results"].get(target)
+        if baseline is None:
+            continue
+        for metric in METRICS:
+            delta = change(baseline[metric], result[metric])
+            flag = ""
+            if metric in GATED and delta is not None and delta > max_regression:
+                regressed = True
+                flag = " !"
+            shown = f"{delta:+.1f}%" if delta is not None else "n/a"
+            lines.append(
+                f"{target:<28}{metric:<16}{baseline[metric]:>12}{result[metric]:>12}"
+                f"{shown:>10}{flag}"
+            )
+    return "\n".join(lines), regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark results")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=float("inf"),
+        help="Fail if p95/p99 latency grew by more than this percent",
+    )
+    args = parser.parse_args(argv)
+    before = json.loads(Path(args.before).read_text())
+    after = json.loads(Path(args.after).read_text())
+    table, regressed = compare(before, after, max_regression=args.max_regression)
+    print(table)
+    if regressed:
+        print(f"Latency regressed by more than {args.max_regression}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Load and latency benchmark of the registry.
+
+Seeds a fresh database at the requested scale, starts a stand-in MCP
+service and the registry (`src/main.py`) as subprocesses, drives concurrent
+load against each target and writes throughput and latency percentiles as
+JSON. The registry subprocess inherits the environment, so settings under
+test (e.g. `CATALOG_STORE_ENABLED=false`) are passed as usual:
+
+    python -m bench.run --users 10000 --concurrency 32 --output before.json
+    python -m bench.compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import httpx
+from fastmcp import Client
+
+from bench import synthetic
+from storage import get_engine_and_sessionmaker, init_db
+
+ROOT = Path(__file__).parent.parent
+TARGETS = (
+    "token",
+    "tools_for_role",
+    "list_services",
+    "get_tools",
+    "add_service",
+    "authorize_user_to_service",
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(fraction * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: list[float], errors: int, seconds: float) -> dict[str, Any]:
+    latencies = sorted(latencies)
+
+    def ms(value: float) -> float:
+        return round(value * 1000, 3)
+
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+async def drive(
+    call: Callable[[int, int], Awaitable[None]],
+    *,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+) -> dict[str, Any]:
+    """Run `requests` calls of call(worker, n) over `concurrency` workers.
+
+    The first `warmup` calls are not measured. A call fails by raising.
+    """
+    latencies: list[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker(index: int):
+        nonlocal errors
+        while (n := next(counter)) < requests + warmup:
+            start = time.perf_counter()
+            try:
+                await call(index, n)
+            except Exception:  # noqa: BLE001
+                if n >= warmup:
+                    errors += 1
+                continue
+            if n >= warmup:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+class Bench:
+    def __init__(self, args, *, base_url: str, standin_url: str):
+        self.args = args
+        self.scale = scale_of(args)
+        self.base_url = base_url
+        self.standin_url = standin_url
+        self.random = random.Random(args.seed)
+
+    def random_user(self) -> int:
+        return self.random.randrange(self.scale.users)
+
+    async def run(self, target: str) -> dict[str, Any]:
+        if target in ("get_tools", "add_service", "authorize_user_to_service"):
+            return await self._run_tool(target)
+        return await self._run_http(target)
+
+    async def _run_http(self, target: str) -> dict[str, Any]:
+        limits = httpx.Limits(max_connections=self.args.concurrency)
+        async with httpx.AsyncClient(
+            base_url=self.base_url, limits=limits, timeout=60
+        ) as client:
+
+            async def call(worker: int, n: int):
+                if target == "token":
+                    user = self.random_user()
+                    service = self.random.choice(
+                        synthetic.token_services(user, self.scale)
+                    )
+                    response = await client.request(
+                        "GET",
+                        "/token",
+                        json={
+                            "service_name": synthetic.service_name(service),
+                            "user_id": synthetic.user_id(user),
+                        },
+                    )
+                elif target == "tools_for_role":
+                    role = self.random.randrange(self.scale.roles)
+                    response = await client.post(
+                        "/tools_for_role", json={"role": synthetic.role_name(role)}
+                    )
+                else:
+                    response = await client.get("/list_services")
+                response.raise_for_status()
+
+            return await self._drive(call, target)
+
+    async def _run_tool(self, target: str) -> dict[str, Any]:
+        # One MCP session per worker, as agents keep theirs open
+        clients = [
+            Client(f"{self.base_url}/mcp/", timeout=60)
+            for _ in range(self.args.concurrency)
+        ]
+        for client in clients:
+            await client.__aenter__()
+        try:
+
+            async def call(worker: int, n: int):
+                if target == "get_tools":
+                    service = self.random.randrange(self.scale.services)
+                    arguments = {"service_name": synthetic.service_name(service)}
+                elif target == "add_service":
+                    # A new service per call, each discovered from the stand-in
+                    arguments = {
+                        "service_name": f"bench-added-{n}",
+                        "endpoint": f"{self.standin_url}?service=bench-added-{n}",
+                        "description": "",
+                        "requires_authorization": False,
+                    }
+                else:
+                    user = self.random_user()
+                    service = self.random.randrange(self.scale.services)
+                    arguments = {
+                        "service_name": synthetic.service_name(service),
+                        "user_id": synthetic.user_id(user),
+                        "token": f"bench-token-{n}",
+                    }
+                await clients[worker].call_tool(target, arguments)
+
+            return await self._drive(call, target)
+        finally:
+            for client in clients:
+                await client.__aexit__(None, None, None)
+
+    async def _drive(self, call, target: str) -> dict[str, Any]:
+        requests = self.args.requests
+        if target == "add_service":
+            requests = self.args.add_service_requests
+        return await drive(
+            call,
+            requests=requests,
+            concurrency=self.args.concurrency,
+            warmup=min(self.args.warmup, requests),
+        )
+
+
+def scale_of(args) -> synthetic.Scale:
+    return synthetic.Scale(
+        services=args.services,
+        tools_per_service=args.tools_per_service,
+        roles=args.roles,
+        users=args.users,
+        tokens_per_user=args.tokens_per_user,
+    )
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up in {timeout}s")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load and latency benchmark of the registry"
+    )
+    scale = synthetic.Scale()
+    parser.add_argument("--services", type=int, default=scale.services)
+    parser.add_argument(
+        "--tools-per-service", type=int, default=scale.tools_per_service
+    )
+    parser.add_argument("--roles", type=int, default=scale.roles)
+    parser.add_argument("--users", type=int, default=scale.users)
+    parser.add_argument("--tokens-per-user", type=int, default=scale.tokens_per_user)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--requests", type=int, default=1000, help="Measured requests per target"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=50, help="Unmeasured requests per target"
+    )
+    parser.add_argument(
+        "--add-service-requests",
+        type=int,
+        default=50,
+        help="Measured add_service calls; each runs a remote discovery",
+    )
+    parser.add_argument(
+        "--targets",
+        default=",".join(TARGETS),
+        help=f"Comma-separated subset of {','.join(TARGETS)}",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--database-url",
+        default="",
+        help="Empty database to seed (default: a temporary SQLite file)",
+    )
+    parser.add_argument("--output", default="", help="JSON file (default: stdout)")
+    args = parser.parse_args(argv)
+    args.targets = [target for target in args.targets.split(",") if target]
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scale = scale_of(args)
+    standin_port, registry_port = free_port(), free_port()
+    standin_url = f"http://127.0.0.1:{standin_port}/mcp/"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/bench.db"
+        engine, _ = get_engine_and_sessionmaker(database_url)
+        init_db(engine)
+        start = time.perf_counter()
+        # Seeded services point at the stand-in too, so gateway or health
+        # settings under test reach a live server
+        counts = synthetic.seed(
+            engine,
+            scale,
+            endpoint=lambda i: f"{standin_url}?service={synthetic.service_name(i)}",
+        )
+        seed_seconds = time.perf_counter() - start
+        engine.dispose()
+        print(f"Seeded {counts} in {seed_seconds:.1f}s", file=sys.stderr)
+
+        env = {
+            "HEALTH_PROBE_INTERVAL_SECONDS": "0",
+            "LOG_LEVEL": "WARNING",
+            **os.environ,
+            "DATABASE_URL": database_url,
+            "MCP_HOST": "127.0.0.1",
+            "MCP_PORT": str(registry_port),
+            # No agents to notify
+            "AGENT_REREAD_HOOK": "",
+        }
+        processes = [
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "bench.standin",
+                    "--port",
+                    str(standin_port),
+                    "--tools",
+                    str(args.tools_per_service),
+                ],
+                cwd=ROOT,
+                stdout=subprocess.DEVNULL,
+            ),
+            subprocess.Popen(
+                [sys.executable, "src/main.py"],
+                cwd=ROOT,
+                env=env,
+                # Access logs; warnings and errors go to stderr
+                stdout=subprocess.DEVNULL,
+            ),
+        ]
+        try:
+            base_url = f"http://127.0.0.1:{registry_port}"
+            wait_until_up(standin_url, processes[0])
+            wait_until_up(f"{base_url}/health", processes[1])
+            bench = Bench(args, base_url=base_url, standin_url=standin_url)
+            results = {}
+            for target in args.targets:
+                results[target] = asyncio.run(bench.run(target))
+                print(f"{target}: {results[target]}", file=sys.stderr)
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "config": {
+            **scale.to_dict(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "add_service_requests": args.add_service_requests,
+            "seed": args.seed,
+            "database": database_url.split(":", 1)[0],
+        },
+        "seed_seconds": round(seed_seconds, 3),
+        "rows": counts,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
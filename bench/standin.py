@@ -0,0 +1,47 @@
+"""Local stand-in MCP service for discovery during benchmarks.
+
+Serves `--tools` trivial tools and the `service_description` resource read
+by discovery, over streamable HTTP at `/mcp/`. Any query string is accepted,
+so one stand-in answers for many distinct registered endpoints
+(`/mcp/?service=1`, `/mcp/?service=2`, ...).
+
+    python -m bench.standin --port 9100 --tools 20
+"""
+
+import argparse
+
+from fastmcp import FastMCP
+
+
+def build_server(*, name: str = "bench-standin", tools: int = 20) -> FastMCP:
+    server = FastMCP(name=name)
+
+    def make_tool(i: int):
+        def tool(text: str = "") -> str:
+            return f"tool-{i}: {text}"
+
+        return tool
+
+    for i in range(tools):
+        server.tool(make_tool(i), name=f"tool-{i}", description=f"Stand-in tool {i}")
+
+    @server.resource("resource://service_description", name="service_description")
+    def service_description() -> str:
+        return f"Stand-in service with {tools} tools"
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--tools", type=int, default=20)
+    args = parser.parse_args()
+    build_server(tools=args.tools).run(
+        transport="http", host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Synthetic registry data at configurable scale.
+
+Rows are bulk-inserted with Core `executemany` in chunks, bypassing the ORM
+and the change log, so millions of rows load in seconds on SQLite. Names are
+deterministic (`service-0`, `tool-0`, `role-0`, `user-0`) so benchmarks and
+scale tests can address known rows.
+"""
+
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from sqlalchemy import insert
+
+from models import (
+    MCPRole,
+    MCPRoleClosure,
+    MCPService,
+    MCPTool,
+    MCPToolRole,
+    MCPUser,
+    UserAccessToken,
+)
+
+
+@dataclass
+class Scale:
+    services: int = 100
+    tools_per_service: int = 20
+    roles: int = 10
+    users: int = 1000
+    tokens_per_user: int = 2
+    # Roles form chains of this length (role-0 <- role-1 <- ...), so role
+    # lookups go through the closure table as they do in production
+    role_depth: int = 5
+
+    def to_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+def service_name(i: int) -> str:
+    return f"service-{i}"
+
+
+def tool_name(i: int) -> str:
+    return f"tool-{i}"
+
+
+def role_name(i: int) -> str:
+    return f"role-{i}"
+
+
+def user_id(i: int) -> str:
+    return f"user-{i}"
+
+
+def requires_authorization(service: int) -> bool:
+    # Half of the services take a per-user token
+    return service % 2 == 0
+
+
+def role_of_user(user: int, scale: Scale) -> int:
+    return user % scale.roles
+
+
+def token_services(user: int, scale: Scale) -> list[int]:
+    """Services (indexes) the user holds a token for."""
+    count = min(scale.tokens_per_user, scale.services)
+    return [(user + offset) % scale.services for offset in range(count)]
+
+
+def _chunks(rows: Iterator[dict[str, Any]], size: int) -> Iterator[list[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parent(role: int, scale: Scale) -> int | None:
+    return role - 1 if role % scale.role_depth else None
+
+
+def seed(
+    engine,
+    scale: Scale,
+    *,
+    endpoint: Callable[[int], str] | None = None,
+    chunk_size: int = 10_000,
+) -> dict[str, int]:
+    """Insert a catalog of the given scale into an empty, initialized database.
+
+    `endpoint(i)` gives the URL of service i (default: an unresolvable
+    `.invalid` host). Each tool is attached to one role; each user has one
+    role and `tokens_per_user` tokens. Returns the number of rows per table.
+    """
+    endpoint = endpoint or (lambda i: f"http://{service_name(i)}.invalid/mcp/")
+    tools = scale.services * scale.tools_per_service
+
+    def services():
+        for i in range(scale.services):
+            yield {
+                "id": i + 1,
+                "service_name": service_name(i),
+                "endpoint": endpoint(i),
+                "description": f"Synthetic service {i}",
+                "requires_authorization": requires_authorization(i),
+                "method_authorization": "Bearer" if requires_authorization(i) else "",
+            }
+
+    def tool_rows():
+        for i in range(tools):
+            yield {
+                "id": i + 1,
+                "service_id": i // scale.tools_per_service + 1,
+                "name": tool_name(i % scale.tools_per_service),
+                "description": f"Synthetic tool {i}",
+            }
+
+    def roles():
+        for i in range(scale.roles):
+            parent = _parent(i, scale)
+            yield {
+                "id": i + 1,
+                "name": role_name(i),
+                "default_system_prompt": f"You act as {role_name(i)}",
+                "parent_id": parent + 1 if parent is not None else None,
+            }
+
+    def closure():
+        for i in range(scale.roles):
+            ancestor, depth = i, 0
+            while ancestor is not None:
+                yield {
+                    "ancestor_id": ancestor + 1,
+                    "descendant_id": i + 1,
+                    "depth": depth,
+                }
+                ancestor, depth = _parent(ancestor, scale), depth + 1
+
+    def tool_roles():
+        if scale.roles:
+            for i in range(tools):
+                yield {"tool_id": i + 1, "role_id": i % scale.roles + 1}
+
+    def users():
+        for i in range(scale.users):
+            yield {
+                "id": i + 1,
+                "user_id": user_id(i),
+                "role_id_fk": role_of_user(i, scale) + 1 if scale.roles else None,
+            }
+
+    def tokens():
+        for i in range(scale.users):
+            for service in token_services(i, scale):
+                yield {
+                    "user_id_fk": i + 1,
+                    "service_id": service + 1,
+                    "token": f"token-{i}-{service}",
+                }
+
+    counts = {}
+    # Parents first: foreign keys are enforced on SQLite connections
+    with engine.begin() as conn:
+        for model, rows in (
+            (MCPService, services()),
+            (MCPTool, tool_rows()),
+            (MCPRole, roles()),
+            (MCPRoleClosure, closure()),
+            (MCPToolRole, tool_roles()),
+            (MCPUser, users()),
+            (UserAccessToken, tokens()),
+        ):
+            table = model.__table__
+            counts[table.name] = 0
+            for chunk in _chunks(rows, chunk_size):
+                conn.execute(insert(table), chunk)
+                counts[table.name] += len(chunk)
+    return counts
+
+
+__all__ = [
+    "Scale",
+    "requires_authorization",
+    "role_name",
+    "role_of_user",
+    "seed",
+    "service_name",
+    "token_services",
+    "tool_name",
+    "user_id",
+]
@@ -0,0 +1,91 @@
+import logging
+from typing import Any
+
+from sqlalchemy.orm import sessionmaker
+
+import changes
+import crud
+import envs
+import metrics
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Role part (default system prompt, accessible services and tools) is shared by
+# all users holding the role; user part is the role name and authorized services.
+role_cache = TTLCache(envs.BOOTSTRAP_CACHE_TTL_SECONDS)
+user_cache = TTLCache(envs.BOOTSTRAP_CACHE_TTL_SECONDS)
+metrics.watch_cache("bootstrap_role", role_cache)
+metrics.watch_cache("bootstrap_user", user_cache)
+
+
+def get_bundle(session_factory: sessionmaker, *, user_id: str) -> dict[str, Any]:
+    """Return everything a user's agent needs at session start.
+
+    Includes the user's role, the role's default system prompt and the services
+    with tools usable by the role, each with its authorization status for the
+    user. Cold calls take four queries; warm calls are served from the caches.
+    """
+    # The session only checks out a connection on the first cache miss
+    with session_factory() as db:
+        role_name, authorized = user_cache.get_or_load(
+            user_id, lambda: crud.get_user_access(db, user_id=user_id)
+        )
+        catalog = None
+        if role_name:
+            catalog = role_cache.get_or_load(
+                role_name, lambda: crud.get_role_catalog(db, role_name=role_name)
+            )
+
+    catalog = catalog or {"default_system_prompt": "", "services": {}}
+    services = {}
+    for service_name, service in catalog["services"].items():
+        services[service_name] = {
+            "transport": "streamable_http",
+            "url": service["endpoint"],
+            "description": service["description"],
+            "requires_authorization": service["requires_authorization"],
+            "method_authorization": service["method_authorization"],
+            "authorized": (
+                not service["requires_authorization"] or service_name in authorized
+            ),
+            "tools": service["tools"],
+        }
+    return {
+        "user_id": user_id,
+        "role": role_name,
+        "default_system_prompt": catalog["default_system_prompt"],
+        "services": services,
+    }
+
+
+@changes.subscribe
+def _invalidate(change: changes.Change) -> None:
+    if change.entity in ("service", "tool_roles"):
+        role_cache.clear()
+        if change.entity == "service" and change.action == "removed":
+            # Tokens of the removed service were deleted with it
+            user_cache.clear()
+    elif change.entity == "role":
+        if change.action == "removed" or (
+            change.action == "updated" and "parent_role_name" in change.data
+        ):
+            # Roles inheriting from it see a different set of tools
+            role_cache.clear()
+        else:
+            role_cache.invalidate(change.data["role_name"])
+        if change.action == "removed":
+            # Users holding the role were unset
+            user_cache.clear()
+    elif change.entity == "user":
+        for user_id in change.data["user_ids"]:
+            user_cache.invalidate(user_id)
+    elif change.entity == "token":
+        user_cache.invalidate(change.data["user_id"])
+    elif change.entity == "replica":
+        # A follower replaced its copy of the registry
+        role_cache.clear()
+        user_cache.clear()
+
+
+__all__ = ["get_bundle", "role_cache", "user_cache"]
@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl_seconds`.
+
+    Entries are dropped explicitly through `invalidate`/`clear` (driven by
+    change notifications) and the TTL only bounds staleness if a notification
+    is missed. A load that overlaps an invalidation is returned to its caller
+    but not stored, so a read that started before a commit cannot repopulate
+    the cache with pre-commit data.
+    """
+
+    def __init__(self, ttl_seconds: float, maxsize: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], T]) -> T:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation == self._generation and self.ttl_seconds > 0:
+                self._data[key] = (now + self.ttl_seconds, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+__all__ = ["TTLCache"]
@@ -0,0 +1,505 @@
+import copy
+import logging
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field, fields, replace
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+import changes
+import crud
+import models
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Columns:
+    """Column-oriented catalog snapshot; row i of a table is position i of its columns.
+
+    Rows are appended for added services and tools. Rows of removed ones are
+    left in place with their strings cleared and are dropped from the
+    position maps, so positions held by readers stay valid; the next load
+    compacts them. Strings are interned per snapshot, so repeated endpoints
+    or descriptions are stored once.
+    """
+
+    service_ids: array = field(default_factory=lambda: array("q"))
+    service_names: list[str] = field(default_factory=list)
+    service_endpoints: list[str] = field(default_factory=list)
+    service_descriptions: list[str | None] = field(default_factory=list)
+    # Positions (in the tool columns) of each service's tools
+    service_tools: list[array] = field(default_factory=list)
+    service_positions: dict[str, int] = field(default_factory=dict)
+
+    tool_ids: array = field(default_factory=lambda: array("q"))
+    tool_services: array = field(default_factory=lambda: array("l"))
+    tool_names: list[str] = field(default_factory=list)
+    tool_descriptions: list[str | None] = field(default_factory=list)
+    tool_positions: dict[int, int] = field(default_factory=dict)
+
+    role_names: dict[int, str] = field(default_factory=dict)
+    role_ids: dict[str, int] = field(default_factory=dict)
+    # Ancestors of each role, the role itself included (from mcp_role_closure)
+    role_ancestors: dict[int, tuple[int, ...]] = field(default_factory=dict)
+    # Sorted positions of the tools attached directly to each role
+    role_tools: dict[int, array] = field(default_factory=dict)
+
+    def footprint(self) -> int:
+        """Approximate memory used by the snapshot in bytes."""
+        size = 0
+        strings: dict[int, str] = {}
+        for column in fields(self):
+            value = getattr(self, column.name)
+            size += sys.getsizeof(value)
+            items = value.values() if isinstance(value, dict) else value
+            for item in items:
+                if isinstance(item, str):
+                    strings[id(item)] = item
+                elif isinstance(item, (array, tuple)):
+                    size += sys.getsizeof(item)
+            if isinstance(value, dict):
+                for key in value:
+                    if isinstance(key, str):
+                        strings[id(key)] = key
+        return size + sum(sys.getsizeof(s) for s in strings.values())
+
+    def copy(self, *names: str) -> "_Columns":
+        """Return a snapshot sharing all columns but the named ones, which are copied."""
+        return replace(self, **{name: copy.copy(getattr(self, name)) for name in names})
+
+
+class CatalogStore:
+    """Optional in-process snapshot of services, tools and role attachments.
+
+    Serves the catalog read endpoints (service listings, tools of a service,
+    tools of a role) from compact array-backed columns instead of querying
+    the database and building ORM objects on every read. The snapshot is
+    loaded at startup and kept current from committed changes, each of which
+    swaps in a snapshot with copies of just the columns it touches: an added
+    service or role reads just its own rows, and only a follower's replica
+    reload makes the next read load everything.
+
+    When disabled, each read opens a session and delegates to crud, which is
+    the behaviour the endpoints had before the store existed. Users are not
+    part of the snapshot: listing by user_id looks up the user's role and
+    lists the role's services from the snapshot.
+    """
+
+    def __init__(self, session_factory: sessionmaker, *, enabled: bool = False):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._version = 0
+        self._columns: _Columns | None = None
+
+    def list_services(
+        self, *, role_name: str | None = None, user_id: str | None = None
+    ) -> list[dict[str, Any]]:
+        """List services like crud.list_services_brief / crud.list_services_for_role."""
+        if not self.enabled:
+            with self.session_factory() as db:
+                if role_name or user_id:
+                    return crud.list_services_for_role(
+                        db, role_name=role_name, user_id=user_id
+                    )
+                return crud.list_services_brief(db)
+        if user_id:
+            with self.session_factory() as db:
+                role = crud.get_role_for_user(db, user_id=user_id)
+            if role is None:
+                return []
+            role_name = role.name
+
+        columns = self._get_columns()
+        if not role_name:
+            return [
+                {
+                    "service_name": columns.service_names[i],
+                    "endpoint": columns.service_endpoints[i],
+                    "description": columns.service_descriptions[i],
+                }
+                for i in range(len(columns.service_ids))
+                if columns.service_names[i] is not None
+            ]
+        counts = Counter(
+            columns.tool_services[position]
+            for position in self._role_tool_positions(columns, role_name)
+        )
+        services = [
+            {
+                "service_name": columns.service_names[i],
+                "endpoint": columns.service_endpoints[i],
+                "description": columns.service_descriptions[i],
+                "tools_count": count,
+            }
+            for i, count in counts.items()
+        ]
+        return sorted(services, key=lambda service: service["service_name"])
+
+    def get_tools(self, *, service_name: str) -> list[dict[str, Any]]:
+        """Return tools of a service with id, name, description and attached roles."""
+        if not self.enabled:
+            with self.session_factory() as db:
+                return [
+                    {
+                        "id": t.id,
+                        "name": t.name,
+                        "description": t.description,
+                        "roles": [r.name for r in (t.roles or [])],
+                    }
+                    for t in crud.get_tools(db, service_name=service_name)
+                ]
+
+        columns = self._get_columns()
+        service = columns.service_positions.get(service_name)
+        if service is None:
+            return []
+        return [
+            {
+                "id": columns.tool_ids[position],
+                "name": columns.tool_names[position],
+                "description": columns.tool_descriptions[position],
+                "roles": [
+                    columns.role_names[role_id]
+                    for role_id, positions in list(columns.role_tools.items())
+                    if _contains(positions, position)
+                ],
+            }
+            for position in columns.service_tools[service]
+        ]
+
+    def tools_for_role(self, *, role_name: str) -> list[dict[str, Any]]:
+        """Return tools usable by a role (inherited ones included), ordered by id."""
+        if not self.enabled:
+            with self.session_factory() as db:
+                return [
+                    {"id": t.id, "name": t.name, "description": t.description}
+                    for t in crud.list_tools_by_role(db, role_name=role_name)
+                ]
+
+        columns = self._get_columns()
+        return [
+            {
+                "id": columns.tool_ids[position],
+                "name": columns.tool_names[position],
+                "description": columns.tool_descriptions[position],
+            }
+            for position in sorted(
+                self._role_tool_positions(columns, role_name),
+                key=columns.tool_ids.__getitem__,
+            )
+        ]
+
+    def stats(self) -> dict[str, Any]:
+        """Return snapshot sizes and its approximate memory footprint."""
+        columns = self._columns
+        if not self.enabled or columns is None:
+            return {"enabled": self.enabled, "loaded": False}
+        return {
+            "enabled": True,
+            "loaded": True,
+            "services": len(columns.service_positions),
+            "tools": len(columns.tool_positions),
+            "roles": len(columns.role_ids),
+            "role_attachments": sum(len(p) for p in columns.role_tools.values()),
+            "memory_bytes": columns.footprint(),
+        }
+
+    def load(self) -> _Columns:
+        """(Re)build the snapshot from the database with five queries."""
+        version = self._version
+        with self.session_factory() as db:
+            services = db.execute(
+                select(
+                    models.MCPService.id,
+                    models.MCPService.service_name,
+                    models.MCPService.endpoint,
+                    models.MCPService.description,
+                ).order_by(models.MCPService.id)
+            ).all()
+            tools = db.execute(
+                select(
+                    models.MCPTool.id,
+                    models.MCPTool.service_id,
+                    models.MCPTool.name,
+                    models.MCPTool.description,
+                ).order_by(models.MCPTool.id)
+            ).all()
+            roles = db.execute(
+                select(models.MCPRole.id, models.MCPRole.name).order_by(
+                    models.MCPRole.id
+                )
+            ).all()
+            lineage = db.execute(
+                select(
+                    models.MCPRoleClosure.descendant_id,
+                    models.MCPRoleClosure.ancestor_id,
+                )
+            ).all()
+            attachments = db.execute(
+                select(models.MCPToolRole.role_id, models.MCPToolRole.tool_id)
+            ).all()
+
+        interned: dict[str, str] = {}
+
+        def intern(value: str | None) -> str | None:
+            return value if value is None else interned.setdefault(value, value)
+
+        columns = _Columns()
+        service_index: dict[int, int] = {}
+        for service_id, name, endpoint, description in services:
+            service_index[service_id] = len(columns.service_ids)
+            columns.service_positions[intern(name)] = len(columns.service_ids)
+            columns.service_ids.append(service_id)
+            columns.service_names.append(intern(name))
+            columns.service_endpoints.append(intern(endpoint))
+            columns.service_descriptions.append(intern(description))
+            columns.service_tools.append(array("l"))
+        for tool_id, service_id, name, description in tools:
+            position = len(columns.tool_ids)
+            service = service_index[service_id]
+            columns.tool_positions[tool_id] = position
+            columns.tool_ids.append(tool_id)
+            columns.tool_services.append(service)
+            columns.tool_names.append(intern(name))
+            columns.tool_descriptions.append(intern(description))
+            columns.service_tools[service].append(position)
+        for role_id, name in roles:
+            columns.role_names[role_id] = intern(name)
+            columns.role_ids[intern(name)] = role_id
+        ancestors: dict[int, list[int]] = {}
+        for role_id, ancestor_id in lineage:
+            ancestors.setdefault(role_id, []).append(ancestor_id)
+        columns.role_ancestors = {k: tuple(v) for k, v in ancestors.items()}
+        role_tools: dict[int, list[int]] = {}
+        for role_id, tool_id in attachments:
+            role_tools.setdefault(role_id, []).append(columns.tool_positions[tool_id])
+        columns.role_tools = {
+            role_id: array("l", sorted(role_tools.get(role_id, ())))
+            for role_id in columns.role_names
+        }
+
+        with self._lock:
+            # A change committed while loading may be missing from the data;
+            # the snapshot still serves this read but is not kept.
+            if version == self._version:
+                self._columns = columns
+        logger.info(
+            "Catalog store loaded services=%s, tools=%s, roles=%s, memory_bytes=%s",
+            len(columns.service_ids),
+            len(columns.tool_ids),
+            len(columns.role_ids),
+            columns.footprint(),
+        )
+        return columns
+
+    def apply(self, change: changes.Change) -> None:
+        """Apply a committed change to the snapshot.
+
+        The rows the change needs are read and the updated snapshot is built
+        without holding the lock, copying only the columns the change touches;
+        it then replaces the current snapshot in one assignment, so readers
+        keep a consistent snapshot. If another change is applied meanwhile,
+        the change is applied again on top of it.
+        """
+        while True:
+            with self._lock:
+                columns = self._columns
+                if columns is None or change.entity == "replica":
+                    self._version += 1
+                    self._columns = None
+                    return
+                version = self._version
+            updated = self._updated(columns, change)
+            with self._lock:
+                if version == self._version:
+                    self._version += 1
+                    self._columns = updated
+                    return
+
+    def _updated(self, columns: _Columns, change: changes.Change) -> _Columns:
+        data = change.data
+        if change.entity == "tool_roles":
+            role_id = columns.role_ids.get(data["role_name"])
+            if role_id is None:
+                return columns
+            if data.get("tool_ids"):
+                positions = {
+                    columns.tool_positions[tool_id]
+                    for tool_id in data["tool_ids"]
+                    if tool_id in columns.tool_positions
+                }
+            else:
+                service = columns.service_positions.get(data.get("service_name"))
+                positions = (
+                    set(columns.service_tools[service])
+                    if service is not None
+                    else set()
+                )
+            current = set(columns.role_tools.get(role_id, ()))
+            if change.action == "added":
+                current |= positions
+            else:
+                current -= positions
+            columns = columns.copy("role_tools")
+            columns.role_tools[role_id] = array("l", sorted(current))
+        elif change.entity == "service":
+            columns = self._remove_service(columns, data["service_name"])
+            if change.action == "added":
+                columns = self._add_service(columns, data["service_name"])
+        elif change.entity == "role":
+            columns = self._apply_role(columns, change)
+        return columns
+
+    def _add_service(self, columns: _Columns, service_name: str) -> _Columns:
+        # A new service has no role attachments yet, only its rows are read
+        with self.session_factory() as db:
+            service = db.execute(
+                select(
+                    models.MCPService.id,
+                    models.MCPService.endpoint,
+                    models.MCPService.description,
+                ).where(models.MCPService.service_name == service_name)
+            ).first()
+            if service is None:
+                return columns
+            tools = db.execute(
+                select(
+                    models.MCPTool.id, models.MCPTool.name, models.MCPTool.description
+                )
+                .where(models.MCPTool.service_id == service.id)
+                .order_by(models.MCPTool.id)
+            ).all()
+
+        columns = columns.copy(
+            "service_ids",
+            "service_names",
+            "service_endpoints",
+            "service_descriptions",
+            "service_tools",
+            "service_positions",
+            "tool_ids",
+            "tool_services",
+            "tool_names",
+            "tool_descriptions",
+            "tool_positions",
+        )
+        position = len(columns.service_ids)
+        tool_positions = array("l")
+        for tool_id, name, description in tools:
+            tool_positions.append(len(columns.tool_ids))
+            columns.tool_ids.append(tool_id)
+            columns.tool_services.append(position)
+            columns.tool_names.append(name)
+            columns.tool_descriptions.append(description)
+            columns.tool_positions[tool_id] = tool_positions[-1]
+        columns.service_ids.append(service.id)
+        columns.service_names.append(service_name)
+        columns.service_endpoints.append(service.endpoint)
+        columns.service_descriptions.append(service.description)
+        columns.service_tools.append(tool_positions)
+        columns.service_positions[service_name] = position
+        return columns
+
+    @staticmethod
+    def _remove_service(columns: _Columns, service_name: str) -> _Columns:
+        service = columns.service_positions.get(service_name)
+        if service is None:
+            return columns
+        columns = columns.copy(
+            "service_names",
+            "service_endpoints",
+            "service_descriptions",
+            "service_tools",
+            "service_positions",
+            "tool_names",
+            "tool_descriptions",
+            "tool_positions",
+            "role_tools",
+        )
+        del columns.service_positions[service_name]
+        removed = set(columns.service_tools[service])
+        for position in removed:
+            del columns.tool_positions[columns.tool_ids[position]]
+            columns.tool_names[position] = None
+            columns.tool_descriptions[position] = None
+        for role_id, positions in list(columns.role_tools.items()):
+            if any(position in removed for position in positions):
+                columns.role_tools[role_id] = array(
+                    "l", (p for p in positions if p not in removed)
+                )
+        columns.service_names[service] = None
+        columns.service_endpoints[service] = None
+        columns.service_descriptions[service] = None
+        columns.service_tools[service] = array("l")
+        return columns
+
+    def _apply_role(self, columns: _Columns, change: changes.Change) -> _Columns:
+        data = change.data
+        role_name = data["role_name"]
+        if change.action == "updated" and "parent_role_name" not in data:
+            return columns
+        role_id = columns.role_ids.get(role_name)
+        # Roles whose ancestors change: the role and the roles inheriting from it
+        subtree = {
+            descendant_id
+            for descendant_id, ancestors in columns.role_ancestors.items()
+            if role_id in ancestors
+        }
+        with self.session_factory() as db:
+            if change.action == "added":
+                role_id = db.execute(
+                    select(models.MCPRole.id).where(models.MCPRole.name == role_name)
+                ).scalar_one_or_none()
+                if role_id is None:
+                    return columns
+                subtree = {role_id}
+            lineage = db.execute(
+                select(
+                    models.MCPRoleClosure.descendant_id,
+                    models.MCPRoleClosure.ancestor_id,
+                ).where(models.MCPRoleClosure.descendant_id.in_(subtree))
+            ).all()
+
+        columns = columns.copy("role_names", "role_ids", "role_ancestors", "role_tools")
+        if change.action == "added":
+            columns.role_names[role_id] = role_name
+            columns.role_ids[role_name] = role_id
+        elif change.action == "removed" and role_id is not None:
+            columns.role_tools.pop(role_id, None)
+            columns.role_ancestors.pop(role_id, None)
+            columns.role_ids.pop(role_name, None)
+            columns.role_names.pop(role_id, None)
+        ancestors: dict[int, list[int]] = {}
+        for descendant_id, ancestor_id in lineage:
+            ancestors.setdefault(descendant_id, []).append(ancestor_id)
+        for descendant_id, ancestor_ids in ancestors.items():
+            columns.role_ancestors[descendant_id] = tuple(ancestor_ids)
+        return columns
+
+    def _get_columns(self) -> _Columns:
+        return self._columns or self.load()
+
+    @staticmethod
+    def _role_tool_positions(columns: _Columns, role_name: str) -> set[int]:
+        role_id = columns.role_ids.get(role_name)
+        if role_id is None:
+            return set()
+        positions: set[int] = set()
+        for ancestor_id in columns.role_ancestors.get(role_id, (role_id,)):
+            positions.update(columns.role_tools.get(ancestor_id, ()))
+        return positions
+
+
+def _contains(sorted_positions: array, position: int) -> bool:
+    i = bisect_left(sorted_positions, position)
+    return i < len(sorted_positions) and sorted_positions[i] == position
+
+
+__all__ = ["CatalogStore"]
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import bindparam, delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import envs
+import models
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "pending_changes"
+_LOGGED_KEY = "logged_changes"
+# The change log is pruned once every this many publish() calls that
+# versioned rows
+_PRUNE_EVERY = 100
+_publishes = 0
+
+
+@dataclass(frozen=True)
+class Change:
+    """A committed mutation made by a crud function.
+
+    `entity` is one of "service", "role", "tool_roles", "user" or "token";
+    `action` is one of "added", "removed" or "updated". `data` carries the
+    identifying keys (service_name, role_name, tool_ids, user_ids, ...).
+    """
+
+    entity: str
+    action: str
+    data: dict[str, Any] = field(default_factory=dict)
+
+
+ChangeListener = Callable[[Change], None]
+
+_listeners: list[ChangeListener] = []
+
+# Changes dispatched at commit in this process, counted by (entity, action,
+# data) until the change poller reads them back from the change log. None
+# while no poller runs.
+_local: Counter[tuple[str, str, str]] | None = None
+_local_lock = threading.Lock()
+
+
+def subscribe(listener: ChangeListener) -> ChangeListener:
+    """Register a listener called for every change once its transaction commits."""
+    _listeners.append(listener)
+    return listener
+
+
+def record(db: Session, entity: str, action: str, **data: Any) -> None:
+    """Record a change on the session; listeners are notified after commit.
+
+    Deferring notification to commit time keeps in-process caches from being
+    repopulated with uncommitted state, and also covers batched commits made
+    by the write queue. Changes of rolled back transactions are dropped.
+
+    Changes are also appended to the change log table in the committing
+    transaction, which is what other processes sync from.
+    """
+    db.info.setdefault(_PENDING_KEY, []).append(Change(entity, action, data))
+
+
+@event.listens_for(Session, "before_commit")
+def _log_changes(session: Session) -> None:
+    pending = session.info.get(_PENDING_KEY)
+    if not pending:
+        return
+    # Logged unversioned: versions are handed out by publish() after commit,
+    # so committing writers never wait on each other for one
+    rows = [
+        {
+            "entity": change.entity,
+            "action": change.action,
+            "data": json.dumps(change.data),
+        }
+        for change in pending
+    ]
+    session.execute(insert(models.MCPChangeLog), rows)
+    if _local is not None:
+        # Counted before the rows can be read back by the poller; uncounted
+        # again if the commit fails
+        keys = [(row["entity"], row["action"], row["data"]) for row in rows]
+        with _local_lock:
+            _local.update(keys)
+        session.info[_LOGGED_KEY] = keys
+
+
+def publish(db: Session) -> None:
+    """Version the committed change log rows that have no version yet.
+
+    Readers of the log call this before reading it. Rows are versioned in id
+    order by one transaction at a time, which holds the counter row lock
+    until it commits, so versions become visible in the order they were
+    handed out: a reader that sees version N has also seen every version
+    below N. Rows of transactions still in flight are versioned by a later
+    call.
+    """
+    global _publishes
+    log = models.MCPChangeLog.__table__
+    pending = db.scalars(
+        select(log.c.id).where(log.c.version.is_(None)).order_by(log.c.id)
+    ).all()
+    if not pending:
+        return
+    newest = next_version(db, len(pending))
+    db.execute(
+        update(log)
+        .where(log.c.id == bindparam("row_id"), log.c.version.is_(None))
+        .values(version=bindparam("row_version")),
+        [
+            {"row_id": row_id, "row_version": version}
+            for version, row_id in enumerate(pending, start=newest - len(pending) + 1)
+        ],
+    )
+    _publishes += 1
+    if _publishes % _PRUNE_EVERY == 0:
+        db.execute(
+            delete(log).where(log.c.version <= newest - envs.CHANGE_LOG_RETENTION)
+        )
+    db.commit()
+
+
+def next_version(connection, count: int) -> int:
+    """Reserve `count` versions in the current transaction; returns the last.
+
+    The counter row stays locked until the transaction ends.
+    """
+    version = models.MCPChangeVersion.__table__
+    bumped = connection.execute(
+        update(version)
+        .where(version.c.id == 1)
+        .values(version=version.c.version + count)
+    )
+    if bumped.rowcount == 0:
+        # Databases created without init_db
+        newest = connection.scalar(select(func.max(models.MCPChangeLog.version)))
+        connection.execute(insert(version).values(id=1, version=(newest or 0) + count))
+    return connection.scalar(select(version.c.version).where(version.c.id == 1))
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_changes(session: Session) -> None:
+    session.info.pop(_LOGGED_KEY, None)
+    for change in session.info.pop(_PENDING_KEY, []):
+        dispatch(change)
+
+
+def dispatch(change: Change) -> None:
+    """Notify the listeners of a committed change."""
+    for listener in _listeners:
+        try:
+            listener(change)
+        except Exception:
+            logger.exception("Change listener failed for %s", change)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    keys = session.info.pop(_LOGGED_KEY, None)
+    if keys and _local is not None:
+        with _local_lock:
+            for key in keys:
+                _take_local(key)
+
+
+def _take_local(key: tuple[str, str, str]) -> bool:
+    """Uncount a change of this process; False if none is counted.
+
+    The caller holds _local_lock.
+    """
+    count = _local.get(key, 0)
+    if count == 0:
+        return False
+    if count == 1:
+        del _local[key]
+    else:
+        _local[key] = count - 1
+    return True
+
+
+class ChangePoller:
+    """Applies changes committed by other processes sharing the database.
+
+    Each process (e.g. each worker of a multi-worker server) keeps its own
+    caches and indexes, and the listeners only hear of changes committed in
+    that process. The poller reads the change log every `interval_seconds`
+    and dispatches the changes committed since its last read by the other
+    processes; its own process's changes were dispatched at commit and are
+    skipped. When the log was pruned past the poller's version, listeners get
+    a "replica" change and reload everything.
+    """
+
+    def __init__(self, session_factory, *, interval_seconds: float = 1.0):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.version: int | None = None
+        self.polls = 0
+        self.applied = 0
+        self._task: asyncio.Task | None = None
+
+    def mark_current(self) -> None:
+        """Start from the current version of the log.
+
+        Call before the caches are loaded: changes committed in between are
+        dispatched again, which leaves the caches the same.
+        """
+        global _local
+        with self.session_factory() as db:
+            publish(db)
+            self.version = db.scalar(select(func.max(models.MCPChangeLog.version))) or 0
+        with _local_lock:
+            _local = Counter()
+
+    def poll_once(self) -> int:
+        """Dispatch the changes of other processes since the last poll; returns their number."""
+        if self.version is None:
+            self.mark_current()
+        with self.session_factory() as db:
+            publish(db)
+            oldest = db.scalar(select(func.min(models.MCPChangeLog.version)))
+            rows = db.execute(
+                select(
+                    models.MCPChangeLog.version,
+                    models.MCPChangeLog.entity,
+                    models.MCPChangeLog.action,
+                    models.MCPChangeLog.data,
+                )
+                .where(models.MCPChangeLog.version > self.version)
+                .order_by(models.MCPChangeLog.version)
+            ).all()
+        self.polls += 1
+        if oldest is not None and self.version < oldest - 1:
+            # Fell behind the retained log: the missed changes are unknown
+            with _local_lock:
+                _local.clear()
+            self.version = rows[-1].version if rows else self.version
+            self.applied += 1
+            dispatch(Change("replica", "reloaded"))
+            return 1
+
+        applied = 0
+        for row in rows:
+            self.version = row.version
+            with _local_lock:
+                if _take_local((row.entity, row.action, row.data)):
+                    continue
+            dispatch(Change(row.entity, row.action, json.loads(row.data)))
+            applied += 1
+        self.applied += applied
+        return applied
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {"version": self.version, "polls": self.polls, "applied": self.applied}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await asyncio.to_thread(self.poll_once)
+            except Exception:
+                logger.exception("Change log poll failed")
+
+
+__all__ = [
+    "Change",
+    "ChangeListener",
+    "ChangePoller",
+    "dispatch",
+    "next_version",
+    "publish",
+    "record",
+    "subscribe",
+]
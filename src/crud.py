@@ -1,15 +1,29 @@
+import json
 import logging
-
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import select
-
+from typing import Any
+
+from sqlalchemy.orm import Session, aliased, joinedload
+from sqlalchemy import (
+    Integer,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    true,
+    update,
+)
+
+import changes
 import models
+import tracing
 from discovery import DiscoveryClient, DiscoveryError
 
 
 logger = logging.getLogger(__name__)
 
 
+@tracing.traced("crud.create_or_update_service")
 async def create_or_update_service(
     db: Session,
     service_name: str,
@@ -19,7 +33,24 @@ async def create_or_update_service(
     method_authorization: str,
     #    context: Context,
 ) -> models.MCPService:
-    # Discover tools from endpoint
+    tools, description = await discover_service(endpoint, description)
+    return add_discovered_service(
+        db,
+        service_name=service_name,
+        endpoint=endpoint,
+        description=description,
+        requires_authorization=requires_authorization,
+        method_authorization=method_authorization,
+        tools=tools,
+    )
+
+
+@tracing.traced("crud.discover_service")
+async def discover_service(endpoint: str, description: str) -> tuple[list[dict], str]:
+    """Discover a service's tools and, unless given, its description.
+
+    Only talks to the remote endpoint; no database session is needed.
+    """
     client = DiscoveryClient()
     tools = await client.fetch_tools(str(endpoint))
     if not description:
@@ -35,7 +66,24 @@ async def create_or_update_service(
         #        "Please provide a description for the MCP service",
         #        response_type=str,
         #    )
+    return tools, description
 
+
+@tracing.traced("crud.add_discovered_service")
+def add_discovered_service(
+    db: Session,
+    *,
+    service_name: str,
+    endpoint: str,
+    description: str,
+    requires_authorization: bool,
+    method_authorization: str,
+    tools: list[dict],
+) -> models.MCPService:
+    """Store a service with its already discovered tools.
+
+    Raises ValueError if a service with the same name already exists.
+    """
     # Check if service exists by unique service_name
     result = db.execute(
         select(models.MCPService).where(
@@ -60,34 +108,43 @@ async def create_or_update_service(
     else:
         raise ValueError(f"Service with name '{service_name}' already exists")
 
-    # Insert tools
-    for t in tools:
-        db.add(
-            models.MCPTool(
-                service_name=service.service_name,
-                name=t["name"],
-                description=t.get("description", ""),
-            )
+    # Insert tools in one statement, however many the service has
+    db.flush()
+    if tools:
+        db.execute(
+            insert(models.MCPTool),
+            [
+                {
+                    "service_id": service.id,
+                    "name": t["name"],
+                    "description": t.get("description", ""),
+                }
+                for t in tools
+            ],
         )
 
+    changes.record(db, "service", "added", service_name=service_name)
     db.commit()
     db.refresh(service)
     return service
 
 
+@tracing.traced("crud.delete_service")
 def delete_service(db: Session, service_name: str) -> bool:
-    # Delete service and cascade tools
+    # Single DELETE; tools, their role attachments and user tokens are removed
+    # by the database ON DELETE CASCADE constraints without loading any rows.
     result = db.execute(
-        select(models.MCPService).where(models.MCPService.service_name == service_name)
+        delete(models.MCPService)
+        .where(models.MCPService.service_name == service_name)
+        .execution_options(synchronize_session=False)
     )
-    service = result.scalar_one_or_none()
-    if service is None:
-        return False
-    db.delete(service)
+    if result.rowcount > 0:
+        changes.record(db, "service", "removed", service_name=service_name)
     db.commit()
-    return True
+    return result.rowcount > 0
 
 
+@tracing.traced("crud.list_services_brief")
 def list_services_brief(db: Session) -> list[dict[str, str]]:
     """Return only endpoint and description for all services."""
     result = db.execute(
@@ -103,6 +160,59 @@ def list_services_brief(db: Session) -> list[dict[str, str]]:
     ]
 
 
+@tracing.traced("crud.list_services_for_role")
+def list_services_for_role(
+    db: Session, *, role_name: str | None = None, user_id: str | None = None
+) -> list[dict[str, Any]]:
+    """Return services with at least one tool usable by a role, with tool counts.
+
+    The role is given by name or resolved from the user's role; tools attached
+    to any ancestor role count too. Everything is computed by one aggregated
+    join over mcp_role_closure / mcp_tool_roles / mcp_tools / mcp_services.
+    Returns an empty list if the role (or user) is unknown.
+    """
+    if bool(role_name) == bool(user_id):
+        raise ValueError("Exactly one of 'role_name' or 'user_id' must be provided")
+
+    columns = (
+        models.MCPService.service_name,
+        models.MCPService.endpoint,
+        models.MCPService.description,
+    )
+    stmt = (
+        select(*columns, func.count(models.MCPToolRole.tool_id.distinct()))
+        .join(models.MCPTool, models.MCPTool.service_id == models.MCPService.id)
+        .join(models.MCPToolRole, models.MCPToolRole.tool_id == models.MCPTool.id)
+        .join(
+            models.MCPRoleClosure,
+            models.MCPRoleClosure.ancestor_id == models.MCPToolRole.role_id,
+        )
+    )
+    if role_name:
+        stmt = stmt.join(
+            models.MCPRole, models.MCPRole.id == models.MCPRoleClosure.descendant_id
+        ).where(models.MCPRole.name == role_name)
+    else:
+        stmt = stmt.join(
+            models.MCPUser,
+            models.MCPUser.role_id_fk == models.MCPRoleClosure.descendant_id,
+        ).where(models.MCPUser.user_id == user_id)
+    stmt = stmt.group_by(models.MCPService.id, *columns).order_by(
+        models.MCPService.service_name
+    )
+
+    return [
+        {
+            "service_name": service_name,
+            "endpoint": endpoint,
+            "description": description,
+            "tools_count": tools_count,
+        }
+        for service_name, endpoint, description, tools_count in db.execute(stmt)
+    ]
+
+
+@tracing.traced("crud.get_tools")
 def get_tools(
     db: Session,
     *,
@@ -113,8 +223,10 @@ def get_tools(
     service_stmt = (
         select(models.MCPService)
         .options(
-            # Eager-load tools and their attached roles to avoid detached lazy loads
-            joinedload(models.MCPService.tools).joinedload(models.MCPTool.roles)
+            # Eager-load tools and their attached roles to avoid detached lazy loads.
+            # Roles come in a second query by tool id: nesting the association
+            # join in the outer join makes SQLite scan all of mcp_tool_roles
+            joinedload(models.MCPService.tools).selectinload(models.MCPTool.roles)
         )
         .where(models.MCPService.service_name == service_name)
     )
@@ -129,59 +241,318 @@ def get_tools(
     return list(service.tools)
 
 
-def get_or_create_user(db: Session, *, user_id: str) -> models.MCPUser:
+def _role_tool_ids(role_condition):
+    """Select ids of tools attached to a role or any of its ancestors.
+
+    `role_condition` filters `MCPRoleClosure.descendant_id`, i.e. the role
+    whose effective tools are wanted.
+    """
+    return (
+        select(models.MCPToolRole.tool_id)
+        .join(
+            models.MCPRoleClosure,
+            models.MCPRoleClosure.ancestor_id == models.MCPToolRole.role_id,
+        )
+        .where(role_condition)
+    )
+
+
+@tracing.traced("crud.get_role_catalog")
+def get_role_catalog(db: Session, *, role_name: str) -> dict[str, Any] | None:
+    """Return a role's default system prompt and the services/tools it can use.
+
+    Services are keyed by service_name and only include tools attached to the
+    role or one of its ancestors. Returns None if the role does not exist.
+    """
+    role = db.execute(
+        select(models.MCPRole.id, models.MCPRole.default_system_prompt).where(
+            models.MCPRole.name == role_name
+        )
+    ).first()
+    if role is None:
+        return None
+
+    stmt = (
+        select(
+            models.MCPService.service_name,
+            models.MCPService.endpoint,
+            models.MCPService.description,
+            models.MCPService.requires_authorization,
+            models.MCPService.method_authorization,
+            models.MCPTool.id,
+            models.MCPTool.name,
+            models.MCPTool.description,
+        )
+        .join(models.MCPTool, models.MCPTool.service_id == models.MCPService.id)
+        .where(
+            models.MCPTool.id.in_(
+                _role_tool_ids(models.MCPRoleClosure.descendant_id == role.id)
+            )
+        )
+        .order_by(models.MCPService.service_name, models.MCPTool.name)
+    )
+    services: dict[str, dict[str, Any]] = {}
+    for row in db.execute(stmt):
+        service = services.setdefault(
+            row[0],
+            {
+                "endpoint": row[1],
+                "description": row[2],
+                "requires_authorization": row[3],
+                "method_authorization": row[4],
+                "tools": [],
+            },
+        )
+        service["tools"].append({"id": row[5], "name": row[6], "description": row[7]})
+    return {
+        "default_system_prompt": role.default_system_prompt or "",
+        "services": services,
+    }
+
+
+@tracing.traced("crud.get_user_access")
+def get_user_access(db: Session, *, user_id: str) -> tuple[str, frozenset[str]]:
+    """Return the user's role name ("" if none) and services the user holds tokens for.
+
+    Registers the user if missing.
+    """
+    user = db.execute(
+        select(models.MCPUser.id, models.MCPRole.name)
+        .outerjoin(models.MCPRole, models.MCPRole.id == models.MCPUser.role_id_fk)
+        .where(models.MCPUser.user_id == user_id)
+    ).first()
+    if user is None:
+        get_or_create_user(db, user_id=user_id)
+        return "", frozenset()
+
+    authorized = db.execute(
+        select(models.MCPService.service_name)
+        .join(
+            models.UserAccessToken,
+            models.UserAccessToken.service_id == models.MCPService.id,
+        )
+        .where(models.UserAccessToken.user_id_fk == user.id)
+    ).scalars()
+    return user.name or "", frozenset(authorized)
+
+
+# Change log entities that describe the catalog (services, tools, role bindings)
+CATALOG_ENTITIES = ("service", "tool_roles", "role")
+
+
+def _catalog_services(
+    db: Session, *, service_names: set[str] | None = None
+) -> dict[str, dict[str, Any]]:
+    """Return services keyed by name with their tools and directly attached roles."""
+    stmt = (
+        select(
+            models.MCPService.service_name,
+            models.MCPService.endpoint,
+            models.MCPService.description,
+            models.MCPService.requires_authorization,
+            models.MCPService.method_authorization,
+            models.MCPTool.id,
+            models.MCPTool.name,
+            models.MCPTool.description,
+        )
+        .outerjoin(models.MCPTool, models.MCPTool.service_id == models.MCPService.id)
+        .order_by(models.MCPService.service_name, models.MCPTool.id)
+    )
+    roles_stmt = select(models.MCPToolRole.tool_id, models.MCPRole.name).join(
+        models.MCPRole, models.MCPRole.id == models.MCPToolRole.role_id
+    )
+    if service_names is not None:
+        stmt = stmt.where(models.MCPService.service_name.in_(service_names))
+        roles_stmt = roles_stmt.join(
+            models.MCPTool, models.MCPTool.id == models.MCPToolRole.tool_id
+        ).join(
+            models.MCPService,
+            (models.MCPService.id == models.MCPTool.service_id)
+            & models.MCPService.service_name.in_(service_names),
+        )
+    tool_roles: dict[int, list[str]] = {}
+    for tool_id, role_name in db.execute(roles_stmt):
+        tool_roles.setdefault(tool_id, []).append(role_name)
+
+    services: dict[str, dict[str, Any]] = {}
+    for row in db.execute(stmt):
+        service = services.setdefault(
+            row[0],
+            {
+                "endpoint": row[1],
+                "description": row[2],
+                "requires_authorization": row[3],
+                "method_authorization": row[4],
+                "tools": [],
+            },
+        )
+        if row[5] is not None:
+            service["tools"].append(
+                {
+                    "id": row[5],
+                    "name": row[6],
+                    "description": row[7],
+                    "roles": tool_roles.get(row[5], []),
+                }
+            )
+    return services
+
+
+@tracing.traced("crud.get_catalog_snapshot")
+def get_catalog_snapshot(db: Session) -> dict[str, Any]:
+    """Return all services with tools and attached roles, and all roles with parents."""
+    parent = aliased(models.MCPRole)
+    roles = db.execute(
+        select(models.MCPRole.name, parent.name)
+        .outerjoin(parent, parent.id == models.MCPRole.parent_id)
+        .order_by(models.MCPRole.id)
+    ).all()
+    return {
+        "services": _catalog_services(db),
+        "roles": [
+            {"name": name, "parent_role_name": parent_name or ""}
+            for name, parent_name in roles
+        ],
+    }
+
+
+@tracing.traced("crud.get_catalog_changes")
+def get_catalog_changes(db: Session, *, since: int | None = None) -> dict[str, Any]:
+    """Return catalog changes committed after version `since`.
+
+    Committed changes are versioned first (see changes.publish). Returns
+    `{"version", "full": False, "changes": [...]}`, where each change holds its
+    version, entity, action and identifying keys; added services also carry
+    their current `service` (with tools), or None if removed since. When
+    `since` is missing, unknown or older than the retained log, returns
+    `{"version", "full": True, "services", "roles"}` with a full snapshot (also
+    after a follower registry reloaded its replica).
+    Snapshots may already include some changes after `version`; applying
+    those changes again leaves the catalog the same.
+    """
+    changes.publish(db)
+    oldest, version = db.execute(
+        select(
+            func.min(models.MCPChangeLog.version),
+            func.max(models.MCPChangeLog.version),
+        )
+    ).one()
+    version = version or 0
+    if since is None or since > version or (oldest is not None and since < oldest - 1):
+        return {"version": version, "full": True, **get_catalog_snapshot(db)}
+
+    rows = (
+        db.execute(
+            select(models.MCPChangeLog)
+            .where(
+                models.MCPChangeLog.version > since,
+                models.MCPChangeLog.version <= version,
+                models.MCPChangeLog.entity.in_(CATALOG_ENTITIES + ("replica",)),
+            )
+            .order_by(models.MCPChangeLog.version)
+        )
+        .scalars()
+        .all()
+    )
+    if any(row.entity == "replica" for row in rows):
+        # A follower reloaded its replica wholesale; there are no finer changes
+        return {"version": version, "full": True, **get_catalog_snapshot(db)}
+    changes_out = [
+        {
+            "version": row.version,
+            "entity": row.entity,
+            "action": row.action,
+            **json.loads(row.data),
+        }
+        for row in rows
+    ]
+    added = {
+        change["service_name"]
+        for change in changes_out
+        if change["entity"] == "service" and change["action"] == "added"
+    }
+    if added:
+        services = _catalog_services(db, service_names=added)
+        for change in changes_out:
+            if change["entity"] == "service" and change["action"] == "added":
+                change["service"] = services.get(change["service_name"])
+    return {"version": version, "full": False, "changes": changes_out}
+
+
+@tracing.traced("crud.get_or_create_user")
+def get_or_create_user(
+    db: Session, *, user_id: str, commit: bool = True
+) -> models.MCPUser:
+    """Return the user by external id, registering a record if missing.
+
+    With `commit=False` the new record is only flushed, leaving the
+    transaction to the caller (e.g. the group-commit write queue).
+    """
     stmt = select(models.MCPUser).where(models.MCPUser.user_id == user_id)
     user = db.execute(stmt).scalar_one_or_none()
     if user is None:
-        logger.info(f"User {user_id} does not exist, register a record")
+        logger.info("User %s does not exist, register a record", user_id)
         user = models.MCPUser(user_id=user_id)
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        changes.record(db, "user", "added", user_ids=[user_id])
+        if commit:
+            db.commit()
+            db.refresh(user)
+        else:
+            db.flush()
     else:
-        logger.info(f"User {user_id} already exists")
+        logger.info("User %s already exists", user_id)
     return user
 
 
+@tracing.traced("crud.set_user_service_token")
 def set_user_service_token(
     db: Session,
     *,
     user_id: str,
     service_name: str,
     token: str,
+    commit: bool = True,
 ) -> models.UserAccessToken:
     """Create or update a user's access token for the given service.
 
-    Ensures one token per (user, service) pair.
+    Ensures one token per (user, service) pair. With `commit=False` changes
+    are only flushed and the caller owns the transaction.
     """
     # Ensure service exists (by service_name)
-    service_stmt = select(models.MCPService).where(
-        models.MCPService.service_name == service_name
-    )
-    service = db.execute(service_stmt).scalar_one_or_none()
-    if service is None:
+    service_id = db.execute(
+        select(models.MCPService.id).where(
+            models.MCPService.service_name == service_name
+        )
+    ).scalar_one_or_none()
+    if service_id is None:
         raise ValueError(f"Service with name '{service_name}' not found")
 
-    user = get_or_create_user(db, user_id=user_id)
+    user = get_or_create_user(db, user_id=user_id, commit=commit)
 
     token_stmt = select(models.UserAccessToken).where(
         models.UserAccessToken.user_id_fk == user.id,
-        models.UserAccessToken.service_name == service_name,
+        models.UserAccessToken.service_id == service_id,
     )
     existing = db.execute(token_stmt).scalar_one_or_none()
     if existing is None:
         existing = models.UserAccessToken(
-            user_id_fk=user.id, service_name=service_name, token=token
+            user_id_fk=user.id, service_id=service_id, token=token
         )
         db.add(existing)
     else:
         existing.token = token
 
-    db.commit()
-    db.refresh(existing)
+    changes.record(db, "token", "updated", user_id=user_id, service_name=service_name)
+    if commit:
+        db.commit()
+        db.refresh(existing)
+    else:
+        db.flush()
     return existing
 
 
+@tracing.traced("crud.get_user_service_token")
 def get_user_service_token(
     db: Session,
     *,
@@ -189,19 +560,52 @@ def get_user_service_token(
     service_name: str,
 ) -> str | None:
     """Return token for the given user and service_name, or None if missing."""
-    stmt_user = select(models.MCPUser).where(models.MCPUser.user_id == user_id)
-    user = db.execute(stmt_user).scalar_one_or_none()
-    if user is None:
-        return None
-
-    stmt = select(models.UserAccessToken.token).where(
-        models.UserAccessToken.user_id_fk == user.id,
-        models.UserAccessToken.service_name == service_name,
+    stmt = (
+        select(models.UserAccessToken.token)
+        .join(models.MCPUser, models.MCPUser.id == models.UserAccessToken.user_id_fk)
+        .join(
+            models.MCPService, models.MCPService.id == models.UserAccessToken.service_id
+        )
+        .where(
+            models.MCPUser.user_id == user_id,
+            models.MCPService.service_name == service_name,
+        )
     )
     row = db.execute(stmt).first()
     return row[0] if row else None
 
 
+@tracing.traced("crud.get_service_connection")
+def get_service_connection(
+    db: Session, *, service_name: str, user_id: str
+) -> dict[str, Any] | None:
+    """Return what is needed to call a service as the user, in one query.
+
+    Returns endpoint, requires_authorization, method_authorization and the
+    user's token for the service (None if missing), or None if the service
+    does not exist.
+    """
+    token = (
+        select(models.UserAccessToken.token)
+        .join(models.MCPUser, models.MCPUser.id == models.UserAccessToken.user_id_fk)
+        .where(
+            models.UserAccessToken.service_id == models.MCPService.id,
+            models.MCPUser.user_id == user_id,
+        )
+        .scalar_subquery()
+    )
+    row = db.execute(
+        select(
+            models.MCPService.endpoint,
+            models.MCPService.requires_authorization,
+            models.MCPService.method_authorization,
+            token.label("token"),
+        ).where(models.MCPService.service_name == service_name)
+    ).first()
+    return dict(row._mapping) if row else None
+
+
+@tracing.traced("crud.get_service_auth_method")
 def get_service_auth_method(
     db: Session,
     *,
@@ -218,6 +622,7 @@ def get_service_auth_method(
     return row[0] if row else None
 
 
+@tracing.traced("crud.get_service_requires_authorization")
 def get_service_requires_authorization(
     db: Session,
     *,
@@ -236,12 +641,20 @@ def get_service_requires_authorization(
 
 __all__ = [
     "create_or_update_service",
+    "discover_service",
+    "add_discovered_service",
     "list_services_brief",
+    "list_services_for_role",
     "delete_service",
     "get_tools",
+    "get_role_catalog",
+    "get_user_access",
+    "get_catalog_snapshot",
+    "get_catalog_changes",
     "get_or_create_user",
     "set_user_service_token",
     "get_user_service_token",
+    "get_service_connection",
     "get_service_auth_method",
     "get_service_requires_authorization",
     "DiscoveryError",
@@ -251,26 +664,46 @@ __all__ = [
 # Roles CRUD
 
 
+@tracing.traced("crud.create_role")
 def create_role(
-    db: Session, *, role_name: str, default_system_prompt: str = ""
+    db: Session,
+    *,
+    role_name: str,
+    default_system_prompt: str = "",
+    parent_role_name: str | None = None,
 ) -> models.MCPRole:
-    """Create a new role by unique name.
+    """Create a new role by unique name, optionally inheriting from a parent role.
 
-    Raises ValueError if role already exists.
+    Raises ValueError if role already exists or the parent role is not found.
     """
     stmt = select(models.MCPRole).where(models.MCPRole.name == role_name)
     existing = db.execute(stmt).scalar_one_or_none()
     if existing is not None:
         raise ValueError(f"Role with name '{role_name}' already exists")
+    parent_id = _get_role_id(db, parent_role_name) if parent_role_name else None
     role = models.MCPRole(
-        name=role_name, default_system_prompt=default_system_prompt or ""
+        name=role_name,
+        default_system_prompt=default_system_prompt or "",
+        parent_id=parent_id,
     )
     db.add(role)
+    db.flush()
+    db.execute(
+        insert(models.MCPRoleClosure).values(
+            ancestor_id=role.id, descendant_id=role.id, depth=0
+        )
+    )
+    if parent_id is not None:
+        _link_role_subtree(db, role_id=role.id, parent_id=parent_id)
+    changes.record(
+        db, "role", "added", role_name=role_name, parent_role_name=parent_role_name
+    )
     db.commit()
     db.refresh(role)
     return role
 
 
+@tracing.traced("crud.attach_role_to_tool")
 def attach_role_to_tool(db: Session, *, role_name: str, tool_id: int) -> bool:
     """Attach an existing role to a tool.
 
@@ -290,13 +723,15 @@ def attach_role_to_tool(db: Session, *, role_name: str, tool_id: int) -> bool:
         raise ValueError(f"Tool with id '{tool_id}' not found")
 
     if role in tool.roles:
-        logger.info(f"Role {role_name} is already attached to tool {tool_id}")
+        logger.info("Role %s is already attached to tool %s", role_name, tool_id)
         return False
     tool.roles.append(role)
+    changes.record(db, "tool_roles", "added", role_name=role_name, tool_ids=[tool_id])
     db.commit()
     return True
 
 
+@tracing.traced("crud.detach_role_from_tool")
 def detach_role_from_tool(db: Session, *, role_name: str, tool_id: int) -> bool:
     """Detach a role from a tool.
 
@@ -316,50 +751,318 @@ def detach_role_from_tool(db: Session, *, role_name: str, tool_id: int) -> bool:
         raise ValueError(f"Tool with id '{tool_id}' not found")
 
     if role not in tool.roles:
-        logger.info(f"Role {role_name} is not attached to tool {tool_id}")
+        logger.info("Role %s is not attached to tool %s", role_name, tool_id)
         return False
     tool.roles.remove(role)
+    changes.record(db, "tool_roles", "removed", role_name=role_name, tool_ids=[tool_id])
+    db.commit()
+    return True
+
+
+def _tools_selector(*, tool_ids: list[int] | None, service_name: str | None):
+    """Return a WHERE clause selecting tools either by ids or by owning service."""
+    if bool(tool_ids) == bool(service_name):
+        raise ValueError("Exactly one of 'tool_ids' or 'service_name' must be provided")
+    if service_name:
+        return models.MCPTool.service_id == (
+            select(models.MCPService.id)
+            .where(models.MCPService.service_name == service_name)
+            .scalar_subquery()
+        )
+    return models.MCPTool.id.in_(tool_ids)
+
+
+def _get_role_id(db: Session, role_name: str) -> int:
+    role_id = db.execute(
+        select(models.MCPRole.id).where(models.MCPRole.name == role_name)
+    ).scalar_one_or_none()
+    if role_id is None:
+        raise ValueError(f"Role with name '{role_name}' not found")
+    return role_id
+
+
+def _link_role_subtree(db: Session, *, role_id: int, parent_id: int) -> None:
+    """Make every ancestor of the parent an ancestor of the role's subtree.
+
+    One INSERT ... SELECT over the cross product of the parent's ancestors and
+    the role's descendants (both include the role/parent itself).
+    """
+    ancestors = aliased(models.MCPRoleClosure)
+    subtree = aliased(models.MCPRoleClosure)
+    db.execute(
+        insert(models.MCPRoleClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(
+                ancestors.ancestor_id,
+                subtree.descendant_id,
+                ancestors.depth + subtree.depth + 1,
+            )
+            .join(subtree, true())
+            .where(
+                ancestors.descendant_id == parent_id,
+                subtree.ancestor_id == role_id,
+            ),
+        )
+    )
+
+
+def _unlink_role_subtree(db: Session, *, role_id: int, ancestor_ids: list[int]) -> None:
+    """Remove the closure rows linking the role's subtree to its strict ancestors."""
+    if not ancestor_ids:
+        return
+    # Materialized first: MySQL cannot DELETE from a table it selects from
+    subtree_ids = (
+        db.execute(
+            select(models.MCPRoleClosure.descendant_id).where(
+                models.MCPRoleClosure.ancestor_id == role_id
+            )
+        )
+        .scalars()
+        .all()
+    )
+    db.execute(
+        delete(models.MCPRoleClosure)
+        .where(
+            models.MCPRoleClosure.descendant_id.in_(subtree_ids),
+            models.MCPRoleClosure.ancestor_id.in_(ancestor_ids),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _get_role_lineage(db: Session, role_name: str) -> tuple[int, list[int]] | None:
+    """Return the role id and its strict ancestor ids, or None if not found."""
+    rows = db.execute(
+        select(models.MCPRoleClosure.ancestor_id, models.MCPRoleClosure.depth)
+        .join(
+            models.MCPRole,
+            models.MCPRole.id == models.MCPRoleClosure.descendant_id,
+        )
+        .where(models.MCPRole.name == role_name)
+    ).all()
+    if not rows:
+        return None
+    role_id = next(ancestor_id for ancestor_id, depth in rows if depth == 0)
+    return role_id, [ancestor_id for ancestor_id, depth in rows if depth > 0]
+
+
+@tracing.traced("crud.set_role_parent")
+def set_role_parent(
+    db: Session, *, role_name: str, parent_role_name: str | None
+) -> bool:
+    """Set (or clear with None) the parent a role inherits tools from.
+
+    The role and all roles inheriting from it gain the new parent's tools and
+    lose those of the previous one. Returns True if the parent changed.
+    Raises ValueError if either role is not found or the change would make
+    the role inherit from itself.
+    """
+    lineage = _get_role_lineage(db, role_name)
+    if lineage is None:
+        raise ValueError(f"Role with name '{role_name}' not found")
+    role_id, ancestor_ids = lineage
+    parent_id = _get_role_id(db, parent_role_name) if parent_role_name else None
+
+    current_parent_id = db.execute(
+        select(models.MCPRole.parent_id).where(models.MCPRole.id == role_id)
+    ).scalar_one()
+    if current_parent_id == parent_id:
+        return False
+    if parent_id is not None:
+        in_subtree = db.execute(
+            select(models.MCPRoleClosure.id).where(
+                models.MCPRoleClosure.ancestor_id == role_id,
+                models.MCPRoleClosure.descendant_id == parent_id,
+            )
+        ).first()
+        if in_subtree is not None:
+            raise ValueError(
+                f"Role '{parent_role_name}' inherits from '{role_name}' "
+                "and cannot be its parent"
+            )
+
+    _unlink_role_subtree(db, role_id=role_id, ancestor_ids=ancestor_ids)
+    if parent_id is not None:
+        _link_role_subtree(db, role_id=role_id, parent_id=parent_id)
+    db.execute(
+        update(models.MCPRole)
+        .where(models.MCPRole.id == role_id)
+        .values(parent_id=parent_id)
+        .execution_options(synchronize_session=False)
+    )
+    changes.record(
+        db, "role", "updated", role_name=role_name, parent_role_name=parent_role_name
+    )
     db.commit()
     return True
 
 
+@tracing.traced("crud.attach_role_to_tools")
+def attach_role_to_tools(
+    db: Session,
+    *,
+    role_name: str,
+    tool_ids: list[int] | None = None,
+    service_name: str | None = None,
+) -> int:
+    """Attach a role to many tools with a single INSERT ... SELECT.
+
+    Tools are selected either by `tool_ids` or by `service_name` (all tools of
+    the service). Unknown tool ids and already attached tools are skipped.
+    Returns the number of newly attached tools.
+    Raises ValueError if role not found.
+    """
+    where = _tools_selector(tool_ids=tool_ids, service_name=service_name)
+    role_id = _get_role_id(db, role_name)
+
+    already_attached = select(models.MCPToolRole.tool_id).where(
+        models.MCPToolRole.role_id == role_id
+    )
+    stmt = insert(models.MCPToolRole).from_select(
+        ["tool_id", "role_id"],
+        select(models.MCPTool.id, literal(role_id, Integer)).where(
+            where, models.MCPTool.id.not_in(already_attached)
+        ),
+    )
+    attached = db.execute(stmt).rowcount
+    if attached:
+        changes.record(
+            db,
+            "tool_roles",
+            "added",
+            role_name=role_name,
+            tool_ids=tool_ids,
+            service_name=service_name,
+        )
+    db.commit()
+    logger.info("Role %s attached to %s tools", role_name, attached)
+    return attached
+
+
+@tracing.traced("crud.detach_role_from_tools")
+def detach_role_from_tools(
+    db: Session,
+    *,
+    role_name: str,
+    tool_ids: list[int] | None = None,
+    service_name: str | None = None,
+) -> int:
+    """Detach a role from many tools with a single DELETE.
+
+    Tools are selected either by `tool_ids` or by `service_name`.
+    Returns the number of detached tools.
+    Raises ValueError if role not found.
+    """
+    where = _tools_selector(tool_ids=tool_ids, service_name=service_name)
+    role_id = _get_role_id(db, role_name)
+
+    stmt = (
+        delete(models.MCPToolRole)
+        .where(
+            models.MCPToolRole.role_id == role_id,
+            models.MCPToolRole.tool_id.in_(select(models.MCPTool.id).where(where)),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    detached = db.execute(stmt).rowcount
+    if detached:
+        changes.record(
+            db,
+            "tool_roles",
+            "removed",
+            role_name=role_name,
+            tool_ids=tool_ids,
+            service_name=service_name,
+        )
+    db.commit()
+    logger.info("Role %s detached from %s tools", role_name, detached)
+    return detached
+
+
+@tracing.traced("crud.assign_role_to_users")
+def assign_role_to_users(db: Session, *, role_name: str, user_ids: list[str]) -> int:
+    """Assign a role to many existing users with a single UPDATE.
+
+    Unknown user ids are skipped. Returns the number of updated users.
+    Raises ValueError if role not found.
+    """
+    role_id = _get_role_id(db, role_name)
+    if not user_ids:
+        return 0
+
+    # Only the users that exist are updated, and only they are recorded
+    existing = list(
+        db.execute(
+            select(models.MCPUser.user_id).where(models.MCPUser.user_id.in_(user_ids))
+        ).scalars()
+    )
+    if not existing:
+        return 0
+    stmt = (
+        update(models.MCPUser)
+        .where(models.MCPUser.user_id.in_(existing))
+        .values(role_id_fk=role_id)
+        .execution_options(synchronize_session=False)
+    )
+    assigned = db.execute(stmt).rowcount
+    if assigned:
+        changes.record(db, "user", "updated", user_ids=existing, role_name=role_name)
+    db.commit()
+    logger.info("Role %s assigned to %s users", role_name, assigned)
+    return assigned
+
+
+@tracing.traced("crud.remove_role")
 def remove_role(db: Session, *, role_name: str) -> bool:
     """Remove a role by name; it is also removed from all tools.
-    It is also removed from all users.
+    It is also removed from all users. Roles inheriting from it become
+    top-level roles and keep only their own tools.
 
     Raises ValueError if role not found.
     """
-    role = db.execute(
-        select(models.MCPRole).where(models.MCPRole.name == role_name)
-    ).scalar_one_or_none()
-    if role is None:
-        logger.info(f"Role {role_name} does not exist")
+    lineage = _get_role_lineage(db, role_name)
+    if lineage is None:
+        logger.info("Role %s does not exist", role_name)
         raise ValueError(f"Role {role_name} does not exist")
-    # Ensure association rows are cleared even if FK cascades are not enforced
-    role.tools.clear()
-    # Also unset from users holding this role
-    for user in list(role.users):
-        user.role = None
-    db.delete(role)
+    role_id, ancestor_ids = lineage
+    # Inheriting roles lose the removed role's ancestors; its own closure rows,
+    # tool attachments (ON DELETE CASCADE), child links and users holding the
+    # role (ON DELETE SET NULL) are handled by the database.
+    _unlink_role_subtree(db, role_id=role_id, ancestor_ids=ancestor_ids)
+    db.execute(
+        delete(models.MCPRole)
+        .where(models.MCPRole.id == role_id)
+        .execution_options(synchronize_session=False)
+    )
+    changes.record(db, "role", "removed", role_name=role_name)
     db.commit()
     return True
 
 
+@tracing.traced("crud.list_tools_by_role")
 def list_tools_by_role(db: Session, *, role_name: str) -> list[models.MCPTool]:
-    """List tools that can be used by the role.
+    """List tools that can be used by the role, including inherited ones.
 
     Returns empty list if role not found or has no tools.
     """
-    role = db.execute(
-        select(models.MCPRole).where(models.MCPRole.name == role_name)
-    ).scalar_one_or_none()
-    if role is None:
-        return []
-    # Access relationship to ensure load
-    _ = role.tools  # noqa: F841
-    return list(role.tools)
+    role_id = (
+        select(models.MCPRole.id)
+        .where(models.MCPRole.name == role_name)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(models.MCPTool)
+        .where(
+            models.MCPTool.id.in_(
+                _role_tool_ids(models.MCPRoleClosure.descendant_id == role_id)
+            )
+        )
+        .order_by(models.MCPTool.id)
+    )
+    return list(db.execute(stmt).scalars())
 
 
+@tracing.traced("crud.get_role_for_user")
 def get_role_for_user(db: Session, *, user_id: str) -> models.MCPRole | None:
     """Return the role for a user.
 
@@ -375,38 +1078,48 @@ def get_role_for_user(db: Session, *, user_id: str) -> models.MCPRole | None:
     return user.role
 
 
-def assign_role_to_user(db: Session, *, user_id: str, role_name: str) -> bool:
+@tracing.traced("crud.assign_role_to_user")
+def assign_role_to_user(
+    db: Session, *, user_id: str, role_name: str, commit: bool = True
+) -> bool:
     user = db.execute(
         select(models.MCPUser).where(models.MCPUser.user_id == user_id)
     ).scalar_one_or_none()
     if user is None:
-        logger.info(f"User {user_id} does not exist, create a record")
+        logger.info("User %s does not exist, create a record", user_id)
         raise ValueError(f"User {user_id} does not exist, create a record")
     role = db.execute(
         select(models.MCPRole).where(models.MCPRole.name == role_name)
     ).scalar_one_or_none()
     if role is None:
-        logger.info(f"Role {role_name} does not exist")
+        logger.info("Role %s does not exist", role_name)
         raise ValueError(f"Role {role_name} does not exist")
     user.role = role
-    db.commit()
+    changes.record(db, "user", "updated", user_ids=[user_id], role_name=role_name)
+    if commit:
+        db.commit()
+    else:
+        db.flush()
     return True
 
 
+@tracing.traced("crud.remove_role_from_user")
 def remove_role_from_user(db: Session, *, user_id: str, role_name: str) -> bool:
     user = db.execute(
         select(models.MCPUser).where(models.MCPUser.user_id == user_id)
     ).scalar_one_or_none()
     if user is None:
-        logger.info(f"User {user_id} does not exist")
+        logger.info("User %s does not exist", user_id)
         raise ValueError(f"User {user_id} does not exist")
     if user.role is None:
-        logger.info(f"User {user_id} does not have a role")
+        logger.info("User %s does not have a role", user_id)
     user.role = None
+    changes.record(db, "user", "updated", user_ids=[user_id], role_name=None)
     db.commit()
     return True
 
 
+@tracing.traced("crud.list_users")
 def list_users(db: Session) -> list[models.MCPUser]:
     """List all users with roles eagerly loaded to avoid detached lazy loads."""
     return (
@@ -416,11 +1129,17 @@ def list_users(db: Session) -> list[models.MCPUser]:
     )
 
 
+@tracing.traced("crud.list_roles")
 def list_roles(db: Session) -> list[models.MCPRole]:
     """List all roles."""
-    return db.execute(select(models.MCPRole)).scalars().all()
+    return (
+        db.execute(select(models.MCPRole).options(joinedload(models.MCPRole.parent)))
+        .scalars()
+        .all()
+    )
 
 
+@tracing.traced("crud.set_role_default_system_prompt")
 def set_role_default_system_prompt(
     db: Session, *, role_name: str, default_system_prompt: str
 ) -> bool:
@@ -434,10 +1153,12 @@ def set_role_default_system_prompt(
     if role is None:
         raise ValueError(f"Role with name '{role_name}' not found")
     role.default_system_prompt = default_system_prompt or ""
+    changes.record(db, "role", "updated", role_name=role_name)
     db.commit()
     return True
 
 
+@tracing.traced("crud.get_role_default_system_prompt")
 def get_role_default_system_prompt(db: Session, *, role_name: str) -> str:
     """Get default system prompt for a role. Returns empty string if role not found."""
     role = db.execute(
@@ -452,7 +1173,11 @@ def get_role_default_system_prompt(db: Session, *, role_name: str) -> str:
 __all__ += [
     "create_role",
     "attach_role_to_tool",
+    "attach_role_to_tools",
     "detach_role_from_tool",
+    "detach_role_from_tools",
+    "assign_role_to_users",
+    "set_role_parent",
     "remove_role",
     "list_tools_by_role",
     "get_role_for_user",
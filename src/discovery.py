@@ -2,10 +2,14 @@ from __future__ import annotations
 
 import logging
 
+from contextlib import AsyncExitStack
 from typing import Any
 
 from fastmcp import Client as FastMCPClient
 
+import metrics
+import tracing
+
 
 class DiscoveryClient:
     def __init__(self, timeout_seconds: float = 10.0):
@@ -18,7 +22,8 @@ class DiscoveryClient:
         """
         try:
             self.logger.info("Discovering tools", extra={"endpoint": endpoint})
-            tools = await self._fetch_tools_async(endpoint)
+            with metrics.discovery_duration.time(endpoint, "tools"):
+                tools = await self._fetch_tools_async(endpoint)
 
             self.logger.info(
                 "Discovery succeeded",
@@ -26,6 +31,7 @@ class DiscoveryClient:
             )
             return tools
         except Exception as exc:  # noqa: BLE001
+            metrics.discovery_failures.inc(endpoint, "tools")
             self.logger.error(
                 "Discovery failed", extra={"endpoint": endpoint, "error": str(exc)}
             )
@@ -42,25 +48,39 @@ class DiscoveryClient:
         """
         try:
             self.logger.info("Fetching description", extra={"endpoint": endpoint})
-            description = await self._fetch_description_async(endpoint)
+            with metrics.discovery_duration.time(endpoint, "description"):
+                description = await self._fetch_description_async(endpoint)
             self.logger.info(
                 "Description fetched",
                 extra={"endpoint": endpoint, "description": description},
             )
             return description[0].text.strip()
         except Exception as exc:  # noqa: BLE001
+            metrics.discovery_failures.inc(endpoint, "description")
             self.logger.error(
                 "Description fetch failed",
                 extra={"endpoint": endpoint, "error": str(exc)},
             )
             raise DiscoveryError(f"Failed to fetch description from {endpoint}: {exc}")
 
+    async def ping(self, endpoint: str) -> None:
+        """Open an MCP session (initialize) and ping; raises on failure or timeout."""
+        async with FastMCPClient(
+            endpoint,
+            timeout=self.timeout_seconds,
+            init_timeout=self.timeout_seconds,
+        ) as client:
+            await client.ping()
+
     async def _fetch_description_async(self, endpoint: str) -> str | None:
-        async with FastMCPClient(endpoint) as client:
-            resources = await client.list_resources()
+        async with AsyncExitStack() as stack:
+            client = await self._connect(stack, endpoint)
+            with tracing.span("discovery.list_resources"):
+                resources = await client.list_resources()
             for resource in resources:
                 if resource.name == "service_description":
-                    return await client.read_resource(resource.uri)
+                    with tracing.span("discovery.read_resource"):
+                        return await client.read_resource(resource.uri)
 
         # if no description resource is found, return None
         # It's not a problem, we will ask a user to provide description
@@ -68,8 +88,10 @@ class DiscoveryClient:
 
     async def _fetch_tools_async(self, endpoint: str) -> list[dict]:
         tools_out: list[dict] = []
-        async with FastMCPClient(endpoint) as client:
-            tools: list[Any] = await client.list_tools()
+        async with AsyncExitStack() as stack:
+            client = await self._connect(stack, endpoint)
+            with tracing.span("discovery.list_tools"):
+                tools: list[Any] = await client.list_tools()
             for item in tools:
                 if isinstance(item, dict):
                     name = item.get("name")
@@ -82,6 +104,12 @@ class DiscoveryClient:
                 tools_out.append({"name": name, "description": description})
         return tools_out
 
+    @staticmethod
+    async def _connect(stack: AsyncExitStack, endpoint: str) -> FastMCPClient:
+        # Connection and MCP initialize handshake, traced apart from the requests
+        with tracing.span("discovery.connect", endpoint=endpoint):
+            return await stack.enter_async_context(FastMCPClient(endpoint))
+
 
 class DiscoveryError(RuntimeError):
     pass
@@ -4,3 +4,114 @@ MCP_PORT = os.getenv("MCP_PORT", 8000)
 MCP_HOST = os.getenv("MCP_HOST", "0.0.0.0")
 
 AGENT_REREAD_HOOK = os.getenv("AGENT_REREAD_HOOK", "")
+
+# Group-commit write queue for user registration and token writes
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "").lower() in ("1", "true")
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "100"))
+WRITE_QUEUE_MAX_DELAY_MS = float(os.getenv("WRITE_QUEUE_MAX_DELAY_MS", "5"))
+
+# Time-to-live for cached /bootstrap bundles (per role and per user). Entries are
+# also invalidated on changes; the TTL only bounds staleness. 0 disables caching.
+BOOTSTRAP_CACHE_TTL_SECONDS = float(os.getenv("BOOTSTRAP_CACHE_TTL_SECONDS", "30"))
+
+# Background jobs (asynchronous add_service): concurrent workers and how many
+# finished jobs are kept for get_job_status
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "1000"))
+
+# Background health probing of registered services; 0 disables the prober
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "30"))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "5"))
+HEALTH_PROBE_CONCURRENCY = int(os.getenv("HEALTH_PROBE_CONCURRENCY", "20"))
+
+# Gateway mode: proxy tool calls to services through the call_tool MCP tool
+GATEWAY_ENABLED = os.getenv("GATEWAY_ENABLED", "").lower() in ("1", "true")
+GATEWAY_MAX_SESSIONS = int(os.getenv("GATEWAY_MAX_SESSIONS", "100"))
+GATEWAY_TIMEOUT_SECONDS = float(os.getenv("GATEWAY_TIMEOUT_SECONDS", "30"))
+
+# Number of most recent changes kept for /catalog/changes; clients that fall
+# further behind receive a full snapshot
+CHANGE_LOG_RETENTION = int(os.getenv("CHANGE_LOG_RETENTION", "10000"))
+
+# Serve catalog reads (service listings, tools of a service or role) from an
+# in-process snapshot kept current from committed changes
+CATALOG_STORE_ENABLED = os.getenv("CATALOG_STORE_ENABLED", "").lower() in (
+    "1",
+    "true",
+)
+
+# Follower mode: with PRIMARY_URL set, the registry mirrors the primary
+# registry at that URL into its own database, serves reads locally and forwards
+# writes. REPLICATION_TOKEN authenticates followers; on the primary, the
+# /replication/changes endpoint is disabled unless it is set.
+PRIMARY_URL = os.getenv("PRIMARY_URL", "")
+REPLICATION_TOKEN = os.getenv("REPLICATION_TOKEN", "")
+FOLLOWER_SYNC_INTERVAL_SECONDS = float(os.getenv("FOLLOWER_SYNC_INTERVAL_SECONDS", "2"))
+
+# Query instrumentation: statements slower than SLOW_QUERY_MS are logged with
+# their call site, a statement repeated N_PLUS_ONE_THRESHOLD times within one
+# request or tool call is flagged as N+1, and requests running more than
+# QUERY_BUDGET statements are logged (0 disables the budget)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "20"))
+
+# In-process tracing: share of HTTP requests and MCP tool calls recorded as
+# traces (0 disables), how many recent traces /debug/traces keeps, and an
+# optional JSON-lines file receiving every trace (rotated at TRACE_FILE_MAX_BYTES)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "100"))
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", "10000000"))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+
+# Bearer token required by admin-only HTTP routes (/debug/profile); those
+# routes are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Sampling profiler behind /debug/profile: sampling interval and longest run
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Event loop watchdog: tick interval for measuring loop lag (0 disables) and
+# the stall after which the stack of the blocking code is captured
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+
+# Logging: level, size of the queue in front of the writer thread (records are
+# dropped and counted when it is full) and per-logger sampling of INFO/DEBUG
+# records as `logger=rate,...`, e.g. "http_endpoints=0.1"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# Multi-worker mode: WORKERS server processes accept connections on one shared
+# listen socket. WORKER_FD and WORKER_INDEX are set by the supervisor for each
+# worker process.
+WORKERS = int(os.getenv("WORKERS", "1"))
+WORKER_FD = os.getenv("WORKER_FD", "")
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+
+# How often a process applies changes committed by other processes sharing the
+# database to its caches and indexes; 0 disables. Defaults to 1s with WORKERS > 1.
+CHANGE_POLL_INTERVAL_SECONDS = float(
+    os.getenv("CHANGE_POLL_INTERVAL_SECONDS", "1" if WORKERS > 1 else "0")
+)
+
+# Admission control. Per-client token buckets on agent HTTP routes and MCP
+# tools: sustained requests per second (0 disables) and burst, per user_id or
+# client address, and per client address whatever user_id it names (10 times
+# the per-client values unless set). Shedding with 503 while the event loop
+# lags more than SHED_LOOP_LAG_MS (0 disables). A cap on concurrent add_service and call_tool
+# calls (0 disables), with how many may wait for a slot and for how long.
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_PER_ADDRESS_PER_SECOND = float(
+    os.getenv("RATE_LIMIT_PER_ADDRESS_PER_SECOND", str(10 * RATE_LIMIT_PER_SECOND))
+)
+RATE_LIMIT_ADDRESS_BURST = float(
+    os.getenv("RATE_LIMIT_ADDRESS_BURST", str(10 * RATE_LIMIT_BURST))
+)
+SHED_LOOP_LAG_MS = float(os.getenv("SHED_LOOP_LAG_MS", "0"))
+EXPENSIVE_TOOL_CONCURRENCY = int(os.getenv("EXPENSIVE_TOOL_CONCURRENCY", "0"))
+EXPENSIVE_TOOL_QUEUE = int(os.getenv("EXPENSIVE_TOOL_QUEUE", "100"))
+EXPENSIVE_TOOL_MAX_WAIT_MS = float(os.getenv("EXPENSIVE_TOOL_MAX_WAIT_MS", "1000"))
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import anyio
+from fastmcp import Client as FastMCPClient
+from fastmcp.client.client import CallToolResult
+from fastmcp.client.transports import StreamableHttpTransport
+from sqlalchemy.orm import sessionmaker
+
+import crud
+from permissions import PermissionIndex
+
+logger = logging.getLogger(__name__)
+
+ClientFactory = Callable[[str, dict[str, str]], FastMCPClient]
+
+
+def _streamable_http_client(
+    endpoint: str, headers: dict[str, str], timeout_seconds: float
+) -> FastMCPClient:
+    return FastMCPClient(
+        StreamableHttpTransport(endpoint, headers=headers),
+        timeout=timeout_seconds,
+        init_timeout=timeout_seconds,
+    )
+
+
+class UpstreamPool:
+    """Persistent MCP client sessions to downstream services.
+
+    Sessions are keyed by endpoint and request headers, so services without
+    authorization share one session while authorized services get one per
+    token. Calls hold a session between acquire and release. At most
+    `max_sessions` are kept open; the least recently used idle ones are closed
+    first, and a session that is discarded or evicted while in use is closed
+    once its last call releases it.
+    """
+
+    def __init__(self, client_factory: ClientFactory, *, max_sessions: int = 100):
+        self.client_factory = client_factory
+        self.max_sessions = max_sessions
+        self.connects = 0
+        self._clients: OrderedDict[tuple, FastMCPClient] = OrderedDict()
+        self._connecting: dict[tuple, asyncio.Lock] = {}
+        # Number of calls holding each client
+        self._in_use: Counter[FastMCPClient] = Counter()
+
+    async def acquire(self, endpoint: str, headers: dict[str, str]) -> FastMCPClient:
+        """Return a connected client, reusing an open session when possible.
+
+        Every acquire must be paired with a release.
+        """
+        key = _key(endpoint, headers)
+        client = self._clients.get(key)
+        if client is None or not client.is_connected():
+            client = await self._connect(key, endpoint, headers)
+        self._clients.move_to_end(key)
+        self._in_use[client] += 1
+        await self._evict()
+        return client
+
+    async def release(self, client: FastMCPClient) -> None:
+        self._in_use[client] -= 1
+        if self._in_use[client] > 0:
+            return
+        del self._in_use[client]
+        if client not in self._clients.values():
+            # Discarded or evicted while in use
+            await self._close(client)
+        await self._evict()
+
+    async def discard(self, endpoint: str, headers: dict[str, str]) -> None:
+        """Forget the session for endpoint/headers, e.g. after an error.
+
+        It is closed now, or once the calls still using it release it.
+        """
+        client = self._clients.pop(_key(endpoint, headers), None)
+        if client is not None and not self._in_use.get(client):
+            await self._close(client)
+
+    async def close(self) -> None:
+        while self._clients:
+            _, client = self._clients.popitem()
+            await self._close(client)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "sessions": len(self._clients),
+            "connects": self.connects,
+            "in_use": len(self._in_use),
+        }
+
+    async def _connect(
+        self, key: tuple, endpoint: str, headers: dict[str, str]
+    ) -> FastMCPClient:
+        # One connect per key; other callers wait for it and reuse the session
+        lock = self._connecting.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                client = self._clients.get(key)
+                if client is not None and client.is_connected():
+                    return client
+                if client is not None:
+                    await self.discard(endpoint, headers)
+                client = self.client_factory(endpoint, headers)
+                await client.__aenter__()
+                self.connects += 1
+                self._clients[key] = client
+                return client
+        finally:
+            if self._connecting.get(key) is lock:
+                del self._connecting[key]
+
+    async def _evict(self) -> None:
+        for key, client in list(self._clients.items()):
+            if len(self._clients) <= self.max_sessions:
+                return
+            if not self._in_use.get(client):
+                del self._clients[key]
+                await self._close(client)
+
+    @staticmethod
+    async def _close(client: FastMCPClient) -> None:
+        try:
+            await client.__aexit__(None, None, None)
+        except Exception:
+            logger.exception("Closing upstream session failed")
+
+
+def _key(endpoint: str, headers: dict[str, str]) -> tuple:
+    return (endpoint, tuple(sorted(headers.items())))
+
+
+class Gateway:
+    """Proxies tool calls to downstream services on behalf of users.
+
+    A call is allowed when the user's role may use the tool (checked against
+    the in-memory permission index). For services requiring authorization the
+    user's stored token is sent as `Authorization: <method_authorization>
+    <token>`. Calls go over pooled persistent sessions, so agents need neither
+    a `/token` round trip nor their own connection per service.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        permission_index: PermissionIndex,
+        *,
+        max_sessions: int = 100,
+        timeout_seconds: float = 30.0,
+        client_factory: ClientFactory | None = None,
+    ):
+        self.session_factory = session_factory
+        self.permission_index = permission_index
+        self.pool = UpstreamPool(
+            client_factory
+            or (
+                lambda endpoint, headers: _streamable_http_client(
+                    endpoint, headers, timeout_seconds
+                )
+            ),
+            max_sessions=max_sessions,
+        )
+
+    async def call_tool(
+        self,
+        *,
+        user_id: str,
+        service_name: str,
+        tool_name: str,
+        arguments: dict[str, Any] | None = None,
+    ) -> CallToolResult:
+        """Call a downstream tool as the user.
+
+        Raises PermissionError if the user's role may not use the tool or the
+        user has no token for a service requiring authorization, and
+        ValueError if the service is not found.
+        """
+        await self.permission_index.ensure_loaded()
+        if not self.permission_index.can_use(user_id, service_name, tool_name):
+            raise PermissionError(
+                f"User '{user_id}' is not allowed to use tool '{tool_name}' "
+                f"of service '{service_name}'"
+            )
+
+        def load_connection():
+            with self.session_factory() as db:
+                return crud.get_service_connection(
+                    db, service_name=service_name, user_id=user_id
+                )
+
+        connection = await asyncio.to_thread(load_connection)
+        if connection is None:
+            raise ValueError(f"Service with name '{service_name}' not found")
+        headers = {}
+        if connection["requires_authorization"]:
+            if connection["token"] is None:
+                raise PermissionError(
+                    f"User '{user_id}' is not authorized to use service '{service_name}'"
+                )
+            headers["Authorization"] = (
+                f"{connection['method_authorization']} {connection['token']}"
+            )
+
+        endpoint = connection["endpoint"]
+        try:
+            client = await self.pool.acquire(endpoint, headers)
+        except Exception as exc:  # noqa: BLE001
+            # Nothing was sent yet, so connecting again is safe
+            logger.info(
+                "Connecting to upstream %s failed (%s), retrying", service_name, exc
+            )
+            client = await self.pool.acquire(endpoint, headers)
+        try:
+            return await client.call_tool(tool_name, arguments)
+        except (
+            anyio.BrokenResourceError,
+            anyio.ClosedResourceError,
+            ConnectionError,
+        ):
+            # The call may have reached the tool, so it is not repeated; the
+            # next call gets a new session
+            await self.pool.discard(endpoint, headers)
+            raise
+        finally:
+            await self.pool.release(client)
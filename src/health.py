@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+from discovery import DiscoveryClient
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ServiceHealth:
+    healthy: bool
+    latency_ms: float | None
+    checked_at: float
+    # Last time the service answered, None if it never did
+    last_seen: float | None
+    error: str = ""
+
+
+class HealthProber:
+    """Background task that periodically pings every registered service.
+
+    Each round opens a cheap MCP session (initialize + ping) to every
+    `MCPService.endpoint`, at most `max_concurrency` at a time, and records
+    liveness and latency in memory. Service listings read the cached result,
+    so agents can skip dead services without paying for a timeout themselves.
+
+    Results are also stored in the mcp_service_health table. With several
+    workers only one of them probes; the others read the stored results on
+    the same interval, so services see one prober rather than one per worker.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        *,
+        interval_seconds: float = 30.0,
+        timeout_seconds: float = 5.0,
+        max_concurrency: int = 20,
+    ):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.max_concurrency = max_concurrency
+        self._client = DiscoveryClient(timeout_seconds=timeout_seconds)
+        self._health: dict[str, ServiceHealth] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self, *, probe: bool = True) -> None:
+        """Start probing in the running event loop; a no-op when already running.
+
+        With `probe=False`, the results another worker stores are read instead.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(probe))
+
+    def annotate(self, service_name: str) -> dict[str, Any]:
+        """Return `healthy` and `latency_ms` for a service (None until probed)."""
+        health = self._health.get(service_name)
+        if health is None:
+            return {"healthy": None, "latency_ms": None}
+        return {"healthy": health.healthy, "latency_ms": health.latency_ms}
+
+    def is_down(self, service_name: str) -> bool:
+        """Whether the last probe of the service failed."""
+        health = self._health.get(service_name)
+        return health is not None and not health.healthy
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Return the last probe result of every service, keyed by service_name."""
+        return {name: asdict(health) for name, health in self._health.items()}
+
+    async def probe_all(self) -> None:
+        """Probe every registered service once."""
+
+        def load_endpoints():
+            with self.session_factory() as db:
+                return {
+                    s["service_name"]: s["endpoint"]
+                    for s in crud.list_services_brief(db)
+                }
+
+        endpoints = await asyncio.to_thread(load_endpoints)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def probe(service_name: str, endpoint: str) -> None:
+            async with semaphore:
+                self._health[service_name] = await self._probe(
+                    endpoint, self._health.get(service_name)
+                )
+
+        await asyncio.gather(*(probe(name, url) for name, url in endpoints.items()))
+        # Drop services removed since the last round
+        for service_name in self._health.keys() - endpoints.keys():
+            del self._health[service_name]
+        down = [name for name, health in self._health.items() if not health.healthy]
+        logger.info("Health probe finished services=%s, down=%s", len(endpoints), down)
+        await asyncio.to_thread(self._store, dict(self._health))
+
+    async def refresh(self) -> None:
+        """Replace the results with the ones last stored by the probing worker."""
+        self._health = await asyncio.to_thread(self._read)
+
+    def _store(self, health: dict[str, ServiceHealth]) -> None:
+        with self.session_factory() as db:
+            db.execute(delete(models.MCPServiceHealth))
+            if health:
+                db.execute(
+                    insert(models.MCPServiceHealth),
+                    [
+                        {"service_name": name, **asdict(result)}
+                        for name, result in health.items()
+                    ],
+                )
+            db.commit()
+
+    def _read(self) -> dict[str, ServiceHealth]:
+        with self.session_factory() as db:
+            rows = db.scalars(select(models.MCPServiceHealth)).all()
+            return {
+                row.service_name: ServiceHealth(
+                    healthy=row.healthy,
+                    latency_ms=row.latency_ms,
+                    checked_at=row.checked_at,
+                    last_seen=row.last_seen,
+                    error=row.error,
+                )
+                for row in rows
+            }
+
+    async def _probe(
+        self, endpoint: str, previous: ServiceHealth | None
+    ) -> ServiceHealth:
+        started = time.monotonic()
+        try:
+            # Bounds connection setup, which the client timeouts do not cover
+            await asyncio.wait_for(
+                self._client.ping(endpoint), timeout=self.timeout_seconds
+            )
+        except Exception as exc:  # noqa: BLE001
+            return ServiceHealth(
+                healthy=False,
+                latency_ms=None,
+                checked_at=time.time(),
+                last_seen=previous.last_seen if previous else None,
+                error=str(exc) or type(exc).__name__,
+            )
+        now = time.time()
+        return ServiceHealth(
+            healthy=True,
+            latency_ms=round((time.monotonic() - started) * 1000, 1),
+            checked_at=now,
+            last_seen=now,
+        )
+
+    async def _run(self, probe: bool) -> None:
+        while True:
+            try:
+                if probe:
+                    await self.probe_all()
+                else:
+                    await self.refresh()
+            except Exception:
+                logger.exception("Health probe round failed")
+            await asyncio.sleep(self.interval_seconds)
+
+
+__all__ = ["HealthProber", "ServiceHealth"]
@@ -1,7 +1,17 @@
+import asyncio
+import functools
+import secrets
+
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse, Response
 from fastapi import HTTPException
+import bootstrap
 import crud
+import envs
+import metrics
+from profiler import ProfilerBusyError
+from rate_limit import OverloadedError, RateLimitedError, retry_after_header
+import replication
 
 import logging
 
@@ -9,21 +19,171 @@ logger = logging.getLogger(__name__)
 
 
 def register(mcp_server):
-    from main import SessionLocal
+    from main import (
+        SessionLocal,
+        admission,
+        catalog_reads,
+        catalog_store,
+        change_poller,
+        follower,
+        gateway,
+        health_prober,
+        loop_monitor,
+        permission_index,
+        query_stats,
+        request_profiler,
+        sampling_profiler,
+        tracer,
+        write_queue,
+    )
+
+    def json_body(content) -> bytes:
+        return JSONResponse(content).body
+
+    def is_admin(request: Request) -> bool:
+        return bool(envs.ADMIN_TOKEN) and secrets.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {envs.ADMIN_TOKEN}"
+        )
+
+    def require_admin(request: Request) -> None:
+        if not envs.ADMIN_TOKEN:
+            raise HTTPException(status_code=404, detail="Admin routes are disabled")
+        if not is_admin(request):
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    async def client_keys(request: Request) -> tuple[str, str]:
+        # Rate limits apply per address and user_id (query or JSON body), and
+        # per address: the user_id is caller supplied, so it only splits an
+        # address's requests
+        host = request.client.host if request.client else ""
+        user_id = request.query_params.get("user_id", "")
+        if not user_id:
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                user_id = data.get("user_id", "")
+        if user_id:
+            return f"user:{user_id}@{host}", host
+        return f"client:{host}", host
+
+    def route(path: str, methods: list[str], agent: bool = False, admin: bool = False):
+        # Every route is counted and timed in /metrics, its SQL statements are
+        # tracked in /debug/queries and sampled requests traced in /debug/traces.
+        # Admins can profile a single request with the X-Profile header.
+        # Agent routes are subject to rate limits and load shedding, admin
+        # routes require the admin token.
+        def decorator(handler):
+            traced = query_stats.tracked(
+                f"http {path}", tracer.traced(f"http {path}", handler)
+            )
+
+            @functools.wraps(handler)
+            async def endpoint(request: Request):
+                if admin:
+                    require_admin(request)
+                if agent and admission.checks:
+                    # The client key is only needed (and the body only read)
+                    # for rate limits
+                    client, address = (
+                        await client_keys(request)
+                        if admission.rate_limits
+                        else ("", "")
+                    )
+                    try:
+                        admission.admit(path, client, address)
+                    except RateLimitedError as exc:
+                        raise HTTPException(
+                            status_code=429,
+                            detail=str(exc),
+                            headers=retry_after_header(exc),
+                        )
+                    except OverloadedError as exc:
+                        raise HTTPException(
+                            status_code=503,
+                            detail=str(exc),
+                            headers=retry_after_header(exc),
+                        )
+                if request.headers.get("X-Profile") and is_admin(request):
+                    return await request_profiler.run(
+                        f"http {path}", lambda: traced(request)
+                    )
+                return await traced(request)
+
+            return mcp_server.custom_route(path, methods=methods)(
+                metrics.timed_route(path, endpoint)
+            )
+
+        return decorator
 
     ########################################################
     # Health check
     ########################################################
 
-    @mcp_server.custom_route("/health", methods=["GET"])
+    @route("/health", methods=["GET"])
     async def http_health_check(request):
         return JSONResponse({"status": "healthy", "service": "mcp-server"})
 
+    @mcp_server.custom_route("/metrics", methods=["GET"])
+    async def http_metrics(request):
+        return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+    @route("/debug/stats", methods=["GET"], admin=True)
+    async def http_debug_stats(request):
+        return JSONResponse(
+            {
+                "catalog": catalog_store.stats(),
+                "single_flight": catalog_reads.stats(),
+                "health": health_prober.stats(),
+                "gateway": gateway.pool.stats(),
+                "follower": follower.stats() if follower is not None else None,
+                "loop": loop_monitor.stats(),
+                "worker": envs.WORKER_INDEX,
+                "change_poller": change_poller.stats(),
+                "expensive_tools": admission.stats(),
+            }
+        )
+
+    @route("/debug/queries", methods=["GET"], admin=True)
+    async def http_debug_queries(request):
+        return JSONResponse(query_stats.stats())
+
+    @route("/debug/traces", methods=["GET"], admin=True)
+    async def http_debug_traces(request: Request):
+        limit = request.query_params.get("limit", "20")
+        min_ms = request.query_params.get("min_ms", "0")
+        try:
+            traces = tracer.traces(limit=int(limit), min_ms=float(min_ms))
+        except ValueError:
+            raise HTTPException(
+                status_code=400, detail="limit and min_ms must be numbers"
+            )
+        return JSONResponse({"traces": traces})
+
+    @route("/debug/profile", methods=["GET"], admin=True)
+    async def http_debug_profile(request: Request):
+        seconds = request.query_params.get("seconds", "10")
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="seconds must be a number")
+        logger.info("http_debug_profile sampling for %ss", seconds)
+        try:
+            stacks = await asyncio.to_thread(sampling_profiler.profile, seconds)
+        except ProfilerBusyError as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        return PlainTextResponse(stacks)
+
+    @route("/debug/profile/requests", methods=["GET"], admin=True)
+    async def http_debug_profile_requests(request: Request):
+        return JSONResponse({"reports": request_profiler.reports()})
+
     ########################################################
     # User management
     ########################################################
 
-    @mcp_server.custom_route("/register_user", methods=["POST"])
+    @route("/register_user", methods=["POST"], agent=True)
     async def http_register_user(request: Request):
         logger.info("http_register_user called")
         data = await request.json()
@@ -31,36 +191,44 @@ def register(mcp_server):
         role_name = data.get("role_name", "")
         if user_id == "":
             raise HTTPException(status_code=400, detail="user_id is required")
-        with SessionLocal() as db:
-            crud.get_or_create_user(db, user_id=user_id)
+
+        if follower is not None:
+            await follower.forward_http("/register_user", data)
+            return JSONResponse({"status": "user registered"})
+
+        def register_user(db):
+            crud.get_or_create_user(db, user_id=user_id, commit=False)
             if role_name:
-                crud.assign_role_to_user(db, user_id=user_id, role_name=role_name)
+                crud.assign_role_to_user(
+                    db, user_id=user_id, role_name=role_name, commit=False
+                )
+
+        await write_queue.run(register_user)
         return JSONResponse({"status": "user registered"})
 
-    @mcp_server.custom_route("/list_users", methods=["GET"])
+    @route("/list_users", methods=["GET"])
     async def http_list_users(request: Request):
         logger.info("http_list_users called")
-        with SessionLocal() as db:
-            users = crud.list_users(db)
-            return JSONResponse(
-                {
-                    "users": [
-                        {
-                            "user": {
-                                "user_id": user.user_id,
-                                "role": user.role.name if user.role else "",
-                            }
+
+        def list_users():
+            with SessionLocal() as db:
+                return [
+                    {
+                        "user": {
+                            "user_id": user.user_id,
+                            "role": user.role.name if user.role else "",
                         }
-                        for user in users
-                    ]
-                }
-            )
+                    }
+                    for user in crud.list_users(db)
+                ]
+
+        return JSONResponse({"users": await asyncio.to_thread(list_users)})
 
     ########################################################
     # Role-based access management
     ########################################################
 
-    @mcp_server.custom_route("/role_for_user", methods=["POST"])
+    @route("/role_for_user", methods=["POST"], agent=True)
     async def http_role_for_user(request: Request):
         logger.info("http_role_for_user called")
         data = await request.json()
@@ -68,16 +236,16 @@ def register(mcp_server):
         if user_id == "":
             raise HTTPException(status_code=400, detail="user_id is required")
 
-        with SessionLocal() as db:
-            # Ensure the user exists, then fetch with correct lookup key (external user_id)
-            crud.get_or_create_user(db, user_id=user_id)
-            role = crud.get_role_for_user(db, user_id=user_id)
+        def role_for_user():
+            with SessionLocal() as db:
+                # Ensure the user exists, then fetch with correct lookup key (external user_id)
+                crud.get_or_create_user(db, user_id=user_id)
+                role = crud.get_role_for_user(db, user_id=user_id)
+                return role.name if role is not None else ""
 
-        if role is None:
-            return JSONResponse({"role": ""})
-        return JSONResponse({"role": role.name})
+        return JSONResponse({"role": await asyncio.to_thread(role_for_user)})
 
-    @mcp_server.custom_route("/tools_for_role", methods=["POST"])
+    @route("/tools_for_role", methods=["POST"], agent=True)
     async def http_tools_for_role(request: Request):
         logger.info("http_tools_for_role called")
         data = await request.json()
@@ -86,23 +254,39 @@ def register(mcp_server):
             raise HTTPException(
                 status_code=400, detail="role is required and should be non-empty"
             )
-        with SessionLocal() as db:
-            tools = crud.list_tools_by_role(db, role_name=role_name)
-
-        return JSONResponse(
-            {
-                "tools": [
-                    {
-                        "id": t.id,
-                        "name": t.name,
-                        "description": t.description,
-                    }
-                    for t in tools
-                ]
-            }
+        body = await catalog_reads.do(
+            ("/tools_for_role", role_name),
+            lambda: json_body(
+                {"tools": catalog_store.tools_for_role(role_name=role_name)}
+            ),
         )
+        return Response(body, media_type="application/json")
+
+    @route("/authorize_check", methods=["POST"], agent=True)
+    async def http_authorize_check(request: Request):
+        data = await request.json()
+        checks = data.get("checks", [])
+        if not isinstance(checks, list) or not checks:
+            raise HTTPException(
+                status_code=400,
+                detail="checks is required: a list of {user_id, service_name, tool_name}",
+            )
+        await permission_index.ensure_loaded()
+        try:
+            allowed = [
+                permission_index.can_use(
+                    check["user_id"], check["service_name"], check["tool_name"]
+                )
+                for check in checks
+            ]
+        except (KeyError, TypeError):
+            raise HTTPException(
+                status_code=400,
+                detail="each check requires user_id, service_name and tool_name",
+            ) from None
+        return JSONResponse({"allowed": allowed})
 
-    @mcp_server.custom_route("/system_prompt_for_role", methods=["POST"])
+    @route("/system_prompt_for_role", methods=["POST"], agent=True)
     async def http_system_prompt_for_role(request: Request):
         logger.info("http_system_prompt_for_role called")
         data = await request.json()
@@ -111,35 +295,115 @@ def register(mcp_server):
             raise HTTPException(
                 status_code=400, detail="role is required and should be non-empty"
             )
-        with SessionLocal() as db:
-            prompt = crud.get_role_default_system_prompt(db, role_name=role_name)
+
+        def system_prompt():
+            with SessionLocal() as db:
+                return crud.get_role_default_system_prompt(db, role_name=role_name)
+
+        prompt = await asyncio.to_thread(system_prompt)
         return JSONResponse({"default_system_prompt": prompt})
 
+    @route("/bootstrap", methods=["POST"], agent=True)
+    async def http_bootstrap(request: Request):
+        logger.info("http_bootstrap called")
+        data = await request.json()
+        user_id = data.get("user_id", "")
+        if user_id == "":
+            raise HTTPException(status_code=400, detail="user_id is required")
+        bundle = await asyncio.to_thread(
+            bootstrap.get_bundle, SessionLocal, user_id=user_id
+        )
+        return JSONResponse(bundle)
+
     ########################################################
     # Service management
     ########################################################
 
-    @mcp_server.custom_route("/list_services", methods=["GET"])
-    def http_list_services(request: Request):
+    @route("/list_services", methods=["GET"], agent=True)
+    async def http_list_services(request: Request):
         logger.info("http_list_services called")
-        with SessionLocal() as db:
-            services = crud.list_services_brief(db)
-            result = {
-                service["service_name"]: {
+        # Optional filter: only services with tools usable by the role/user
+        role_name = request.query_params.get("role", "")
+        user_id = request.query_params.get("user_id", "")
+        # Optional filter: skip services whose last health probe failed
+        healthy_only = request.query_params.get("healthy_only", "").lower() in (
+            "1",
+            "true",
+        )
+        if role_name and user_id:
+            raise HTTPException(
+                status_code=400, detail="Only one of role or user_id can be provided"
+            )
+
+        def list_services() -> bytes:
+            services = catalog_store.list_services(
+                role_name=role_name or None, user_id=user_id or None
+            )
+            result = {}
+            for service in services:
+                if healthy_only and health_prober.is_down(service["service_name"]):
+                    continue
+                entry = {
                     "transport": "streamable_http",
                     "url": service["endpoint"],
+                    **health_prober.annotate(service["service_name"]),
                 }
-                for service in services
-            }
-            return JSONResponse({"services": result})
+                if "tools_count" in service:
+                    entry["tools_count"] = service["tools_count"]
+                result[service["service_name"]] = entry
+            return json_body({"services": result})
+
+        body = await catalog_reads.do(
+            ("/list_services", role_name, user_id, healthy_only), list_services
+        )
+        return Response(body, media_type="application/json")
+
+    @route("/catalog/changes", methods=["GET"], agent=True)
+    async def http_catalog_changes(request: Request):
+        logger.info("http_catalog_changes called")
+        since = request.query_params.get("since", "")
+        if since and not since.isdigit():
+            raise HTTPException(
+                status_code=400, detail="since must be a non-negative integer version"
+            )
+
+        def catalog_changes():
+            with SessionLocal() as db:
+                return crud.get_catalog_changes(db, since=int(since) if since else None)
+
+        return JSONResponse(await asyncio.to_thread(catalog_changes))
+
+    @route("/replication/changes", methods=["GET"])
+    async def http_replication_changes(request: Request):
+        logger.info("http_replication_changes called")
+        if not envs.REPLICATION_TOKEN:
+            raise HTTPException(status_code=404, detail="Replication is disabled")
+        if not secrets.compare_digest(
+            request.headers.get("Authorization", ""),
+            f"Bearer {envs.REPLICATION_TOKEN}",
+        ):
+            raise HTTPException(status_code=401, detail="Invalid replication token")
+        since = request.query_params.get("since", "")
+        if since and not since.isdigit():
+            raise HTTPException(
+                status_code=400, detail="since must be a non-negative integer version"
+            )
+
+        def build():
+            with SessionLocal() as db:
+                return json_body(
+                    replication.build_changes(db, since=int(since) if since else None)
+                )
+
+        body = await asyncio.to_thread(build)
+        return Response(body, media_type="application/json")
 
     ########################################################
     # Token management
     ########################################################
 
-    @mcp_server.custom_route("/token", methods=["GET"])
+    @route("/token", methods=["GET"], agent=True)
     async def http_get_token(request: Request):
-        logger.info("http_get_token called")
         data = await request.json()
         service_name = data.get("service_name", "")
         user_id = data.get("user_id", "")
@@ -149,31 +413,29 @@ def register(mcp_server):
             )
 
         logger.info(
-            f"http_get_token called service_name={service_name}, user_id={user_id}"
+            "http_get_token called service_name=%s, user_id=%s", service_name, user_id
         )
 
-        with SessionLocal() as db:
-            # If service does not require authorization, return 200 OK without token
-            requires_auth = crud.get_service_requires_authorization(
-                db, service_name=service_name
-            )
-            if requires_auth is None:
-                raise HTTPException(status_code=404, detail="Service not found")
-            if requires_auth is False:
-                return JSONResponse({"status": "Ok"})
-
-            token = crud.get_user_service_token(
-                db, user_id=user_id, service_name=service_name
-            )
-            if token is None:
-                raise HTTPException(
-                    status_code=401,
-                    detail="User is not authorized to use this service. Authroize please.",
+        def service_connection():
+            with SessionLocal() as db:
+                # Authorization settings and the user's token in one query
+                return crud.get_service_connection(
+                    db, service_name=service_name, user_id=user_id
                 )
-            method = crud.get_service_auth_method(db, service_name=service_name)
-            if method is None:
-                raise HTTPException(status_code=404, detail="Service not found")
-            logger.info(
-                f"http_get_token returned token={token}, method_authorization={method}"
+
+        connection = await asyncio.to_thread(service_connection)
+        if connection is None:
+            raise HTTPException(status_code=404, detail="Service not found")
+        # If service does not require authorization, return 200 OK without token
+        if not connection["requires_authorization"]:
+            return JSONResponse({"status": "Ok"})
+
+        token = connection["token"]
+        if token is None:
+            raise HTTPException(
+                status_code=401,
+                detail="User is not authorized to use this service. Authroize please.",
             )
-            return JSONResponse({"token": token, "method_authorization": method})
+        method = connection["method_authorization"]
+        logger.debug("http_get_token returned method_authorization=%s", method)
+        return JSONResponse({"token": token, "method_authorization": method})
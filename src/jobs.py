@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import sessionmaker
+
+import models
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """A unit of background work and its progress.
+
+    `status` is one of "queued", "running", "succeeded" or "failed"; `step`
+    is a free-form progress label set by the job function while running.
+    """
+
+    kind: str
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"
+    step: str = ""
+    error: str = ""
+    result: Any = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+JobFunction = Callable[[Job], Awaitable[Any]]
+
+
+class JobPool:
+    """Bounded pool of asyncio workers running submitted jobs.
+
+    `submit` returns immediately with a queued Job; at most `max_workers` jobs
+    run concurrently and the rest wait in the queue. Finished jobs are kept
+    for status lookups, up to `max_history` of them (oldest dropped first).
+
+    With a `session_factory`, job state is also written to the mcp_jobs
+    table whenever it changes, so `get` finds the jobs that other workers
+    sharing the database run. Job functions report progress with
+    `set_step`.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int = 4,
+        max_history: int = 1000,
+        session_factory: sessionmaker | None = None,
+    ):
+        self.max_workers = max_workers
+        self.max_history = max_history
+        self.session_factory = session_factory
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def submit(self, kind: str, fn: JobFunction) -> Job:
+        """Queue fn to run as a job of the given kind."""
+        self._ensure_started(asyncio.get_running_loop())
+        job = Job(kind=kind)
+        # Stored before its id is handed out, so every worker can find it
+        await self._save(job, prune=True)
+        self._jobs[job.job_id] = job
+        self._trim_history()
+        self._queue.put_nowait((job, fn))
+        logger.info("Job queued job_id=%s, kind=%s", job.job_id, kind)
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        job = self._jobs.get(job_id)
+        if job is None and self.session_factory is not None:
+            job = await asyncio.to_thread(self._load, job_id)
+        return job
+
+    async def set_step(self, job: Job, step: str) -> None:
+        """Set the progress label of a running job."""
+        job.step = step
+        job.updated_at = time.time()
+        await self._save(job)
+
+    def _ensure_started(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._loop is loop and all(not w.done() for w in self._workers):
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [
+            loop.create_task(self._worker(self._queue)) for _ in range(self.max_workers)
+        ]
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            job, fn = await queue.get()
+            job.status = "running"
+            job.updated_at = time.time()
+            try:
+                await self._save(job)
+                job.result = await fn(job)
+                job.status = "succeeded"
+            except Exception as exc:
+                logger.exception("Job failed job_id=%s, kind=%s", job.job_id, job.kind)
+                job.status = "failed"
+                job.error = str(exc)
+            job.updated_at = time.time()
+            try:
+                await self._save(job)
+            except Exception:
+                logger.exception("Storing job job_id=%s failed", job.job_id)
+
+    async def _save(self, job: Job, *, prune: bool = False) -> None:
+        if self.session_factory is not None:
+            await asyncio.to_thread(self._store, job, prune)
+
+    def _store(self, job: Job, prune: bool) -> None:
+        finished = ("succeeded", "failed")
+        with self.session_factory() as db:
+            db.merge(
+                models.MCPJob(
+                    job_id=job.job_id,
+                    kind=job.kind,
+                    status=job.status,
+                    step=job.step,
+                    error=job.error,
+                    result=None
+                    if job.result is None
+                    else json.dumps(job.result, default=str),
+                    created_at=job.created_at,
+                    updated_at=job.updated_at,
+                )
+            )
+            if prune:
+                cutoff = db.scalar(
+                    select(models.MCPJob.updated_at)
+                    .where(models.MCPJob.status.in_(finished))
+                    .order_by(models.MCPJob.updated_at.desc())
+                    .offset(self.max_history)
+                    .limit(1)
+                )
+                if cutoff is not None:
+                    db.execute(
+                        delete(models.MCPJob).where(
+                            models.MCPJob.status.in_(finished),
+                            models.MCPJob.updated_at <= cutoff,
+                        )
+                    )
+            db.commit()
+
+    def _load(self, job_id: str) -> Job | None:
+        with self.session_factory() as db:
+            row = db.get(models.MCPJob, job_id)
+            if row is None:
+                return None
+            return Job(
+                kind=row.kind,
+                job_id=row.job_id,
+                status=row.status,
+                step=row.step,
+                error=row.error,
+                result=None if row.result is None else json.loads(row.result),
+                created_at=row.created_at,
+                updated_at=row.updated_at,
+            )
+
+    def _trim_history(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in ("succeeded", "failed")
+        ]
+        for job_id in finished[: max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+
+__all__ = ["Job", "JobFunction", "JobPool"]
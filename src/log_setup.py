@@ -0,0 +1,154 @@
+import atexit
+import logging
+import queue
+import random
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+import metrics
+
+# Secrets that must not reach the logs: access tokens, authorization headers,
+# passwords and keys, in `key=value`, `key: value` and JSON forms. Keys match
+# whole names only, so e.g. `max_token=5` is kept.
+_SECRET_KEYS = (
+    "access_token",
+    "refresh_token",
+    "token",
+    "password",
+    "client_secret",
+    "secret",
+    "api_key",
+    "apikey",
+)
+_SECRET_PATTERNS = (
+    re.compile(
+        r"(?i)(authorization[\"']?\s*[:=]\s*[\"']?(?:basic|bearer)\s+)[^\s\"',}]+"
+    ),
+    re.compile(
+        rf"(?i)((?<![\w-])(?:{'|'.join(_SECRET_KEYS)})[\"']?\s*[:=]\s*[\"']?)"
+        r"[^\s\"',}]+"
+    ),
+)
+REDACTED = "***"
+
+
+def redact(message: str) -> str:
+    """Replace secret values in a log message with ***."""
+    for pattern in _SECRET_PATTERNS:
+        message = pattern.sub(rf"\g<1>{REDACTED}", message)
+    return message
+
+
+class RedactingFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of INFO and DEBUG records of selected loggers.
+
+    `rates` maps logger names to the fraction kept (0 to 1); child loggers
+    inherit their parent's rate. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while True:
+            rate = self.rates.get(name)
+            if rate is not None:
+                break
+            if "." not in name:
+                return True
+            name = name.rsplit(".", 1)[0]
+        if random.random() < rate:
+            return True
+        metrics.log_records_sampled_out.inc()
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Enqueues records for the listener thread without blocking the caller.
+
+    Records are enqueued as they are: the message is formatted (and
+    redacted) by the listener thread, not on the request path. When the
+    bounded queue is full the record is dropped and counted.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.log_records_dropped.inc()
+
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    """Parse `logger=rate,logger=rate` (e.g. `http_endpoints=0.1`)."""
+    rates = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(
+    *,
+    level: str = "INFO",
+    queue_size: int = 10_000,
+    sample_rates: dict[str, float] | None = None,
+) -> QueueListener:
+    """Route all logging through a bounded queue to a stderr writer thread.
+
+    Replaces the root logger's handlers. The listener is stopped (flushing
+    queued records) at interpreter exit.
+    """
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(
+        RedactingFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+    handler, listener = queued(stream, queue_size=queue_size)
+    handler.addFilter(SamplingFilter(sample_rates or {}))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return listener
+
+
+def queued(
+    target: logging.Handler, *, queue_size: int = 10_000
+) -> tuple[DroppingQueueHandler, QueueListener]:
+    """Return a handler that hands records to `target` on a writer thread.
+
+    The listener is started, and stopped (flushing queued records) at
+    interpreter exit.
+    """
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = QueueListener(handler.queue, target, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler, listener
+
+
+__all__ = [
+    "DroppingQueueHandler",
+    "RedactingFormatter",
+    "SamplingFilter",
+    "configure_logging",
+    "parse_sample_rates",
+    "queued",
+    "redact",
+]
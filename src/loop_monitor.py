@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Measures event loop lag and captures what blocks the loop.
+
+    A task on the loop wakes up every `interval_seconds` and records how late
+    it ran (the lag). A watchdog thread checks the task's heartbeat; when the
+    loop has not ticked for `threshold_seconds` it captures the stack of the
+    loop thread, i.e. the code blocking it (typically a synchronous database
+    call or CPU-bound work inside an `async def`), and logs it. The last
+    `history` blocks are kept with their stacks and durations for
+    /debug/stats; lag and block counts are exported in /metrics.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval_seconds: float = 0.1,
+        threshold_seconds: float = 0.1,
+        history: int = 20,
+    ):
+        self.interval_seconds = interval_seconds
+        self.threshold_seconds = threshold_seconds
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.blocks = 0
+        self._blocks: deque[dict[str, Any]] = deque(maxlen=history)
+        self._heartbeat = time.monotonic()
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "last_lag_ms": round(self.last_lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "blocks": self.blocks,
+            "recent_blocks": list(reversed(self._blocks)),
+        }
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            metrics.loop_lag.observe(lag)
+
+    def _watch(self) -> None:
+        blocked: dict[str, Any] | None = None
+        blocked_since = 0.0
+        while not self._stopped.wait(self.threshold_seconds / 2):
+            heartbeat = self._heartbeat
+            # A tick is due every interval; anything later counts as blocked
+            stalled = time.monotonic() - heartbeat - self.interval_seconds
+            if blocked is None and stalled >= self.threshold_seconds:
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                blocked = {"timestamp": time.time(), "stack": stack}
+                blocked_since = heartbeat
+                self.blocks += 1
+                metrics.loop_blocks.inc()
+                logger.warning(
+                    "Event loop blocked for over %.0fms, blocking call:\n%s",
+                    self.threshold_seconds * 1000,
+                    stack,
+                )
+            elif blocked is not None and heartbeat != blocked_since:
+                # The loop ticked again; the stall lasted until that tick
+                duration = heartbeat - blocked_since - self.interval_seconds
+                blocked["duration_ms"] = round(duration * 1000, 3)
+                self._blocks.append(blocked)
+                logger.warning("Event loop was blocked for %.0fms", duration * 1000)
+                blocked = None
+
+
+__all__ = ["LoopMonitor"]
@@ -1,28 +1,138 @@
 import logging
 import asyncio
+import sys
 
 from fastmcp import FastMCP
 
 from storage import get_engine_and_sessionmaker, init_db, get_db_session
 
+import changes
 import envs
+import metrics
+from catalog import CatalogStore
+from gateway import Gateway
+from health import HealthProber
+from jobs import JobPool
+from log_setup import configure_logging, parse_sample_rates
+from loop_monitor import LoopMonitor
+from permissions import PermissionIndex
+from profiler import RequestProfiler, SamplingProfiler
+from query_stats import QueryScopeMiddleware, QueryStats
+from rate_limit import AdmissionControl, AdmissionMiddleware
+from replication import Follower, ForwardWritesMiddleware
+from single_flight import SingleFlight
+from tracing import Tracer, TracingMiddleware
+from write_queue import WriteQueue
+import workers
 
 import http_endpoints
 import mcp_endpoints
 
+if __name__ == "__main__":
+    # Run as a script: `from main import ...` in the endpoint modules must get
+    # this module, not initialize a second copy of everything below
+    sys.modules.setdefault("main", sys.modules[__name__])
+
 
 # Configure logging
 logger = logging.getLogger("mcp_storage")
 if not logging.getLogger().handlers:
-    logging.basicConfig(
-        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    # Records are formatted and written by a background thread, off the event loop
+    configure_logging(
+        level=envs.LOG_LEVEL,
+        queue_size=envs.LOG_QUEUE_SIZE,
+        sample_rates=parse_sample_rates(envs.LOG_SAMPLE_RATES),
     )
 logger.info("MCP Storage initialized")
 
 
 engine, SessionLocal = get_engine_and_sessionmaker()
+metrics.instrument_engine(engine)
+query_stats = QueryStats(
+    slow_query_ms=envs.SLOW_QUERY_MS,
+    n_plus_one_threshold=envs.N_PLUS_ONE_THRESHOLD,
+    budget=envs.QUERY_BUDGET,
+)
+query_stats.install(engine)
+tracer = Tracer(
+    sample_rate=envs.TRACE_SAMPLE_RATE,
+    buffer_size=envs.TRACE_BUFFER,
+    file_path=envs.TRACE_FILE,
+    max_bytes=envs.TRACE_FILE_MAX_BYTES,
+    backup_count=envs.TRACE_FILE_BACKUPS,
+)
+tracer.install(engine)
+sampling_profiler = SamplingProfiler(
+    interval_seconds=envs.PROFILE_INTERVAL_MS / 1000,
+    max_seconds=envs.PROFILE_MAX_SECONDS,
+)
+request_profiler = RequestProfiler()
+loop_monitor = LoopMonitor(
+    interval_seconds=envs.LOOP_MONITOR_INTERVAL_MS / 1000,
+    threshold_seconds=envs.LOOP_BLOCK_THRESHOLD_MS / 1000,
+)
+admission = AdmissionControl(
+    rate=envs.RATE_LIMIT_PER_SECOND,
+    burst=envs.RATE_LIMIT_BURST,
+    address_rate=envs.RATE_LIMIT_PER_ADDRESS_PER_SECOND,
+    address_burst=envs.RATE_LIMIT_ADDRESS_BURST,
+    shed_loop_lag_seconds=envs.SHED_LOOP_LAG_MS / 1000,
+    loop_monitor=loop_monitor,
+    expensive_concurrency=envs.EXPENSIVE_TOOL_CONCURRENCY,
+    expensive_queue=envs.EXPENSIVE_TOOL_QUEUE,
+    expensive_max_wait_seconds=envs.EXPENSIVE_TOOL_MAX_WAIT_MS / 1000,
+)
 init_db(engine)
 get_db = get_db_session(SessionLocal)
+change_poller = changes.ChangePoller(
+    SessionLocal, interval_seconds=envs.CHANGE_POLL_INTERVAL_SECONDS
+)
+if envs.CHANGE_POLL_INTERVAL_SECONDS > 0:
+    # Before any cache loads, so no change of another process is missed
+    change_poller.mark_current()
+permission_index = PermissionIndex(SessionLocal)
+changes.subscribe(permission_index.apply)
+write_queue = WriteQueue(
+    SessionLocal,
+    enabled=envs.WRITE_QUEUE_ENABLED,
+    max_batch=envs.WRITE_QUEUE_MAX_BATCH,
+    max_delay_ms=envs.WRITE_QUEUE_MAX_DELAY_MS,
+)
+catalog_store = CatalogStore(SessionLocal, enabled=envs.CATALOG_STORE_ENABLED)
+changes.subscribe(catalog_store.apply)
+if catalog_store.enabled:
+    catalog_store.load()
+# Concurrent identical catalog reads (e.g. all agents re-reading after the
+# AGENT_REREAD_HOOK fires) share one query and serialization
+catalog_reads = SingleFlight()
+# Job state is stored in the database, so any worker can report a job
+jobs = JobPool(
+    max_workers=envs.JOB_WORKERS,
+    max_history=envs.JOB_HISTORY,
+    session_factory=SessionLocal,
+)
+gateway = Gateway(
+    SessionLocal,
+    permission_index,
+    max_sessions=envs.GATEWAY_MAX_SESSIONS,
+    timeout_seconds=envs.GATEWAY_TIMEOUT_SECONDS,
+)
+health_prober = HealthProber(
+    SessionLocal,
+    interval_seconds=envs.HEALTH_PROBE_INTERVAL_SECONDS,
+    timeout_seconds=envs.HEALTH_PROBE_TIMEOUT_SECONDS,
+    max_concurrency=envs.HEALTH_PROBE_CONCURRENCY,
+)
+follower = (
+    Follower(
+        SessionLocal,
+        primary_url=envs.PRIMARY_URL,
+        replication_token=envs.REPLICATION_TOKEN,
+        interval_seconds=envs.FOLLOWER_SYNC_INTERVAL_SECONDS,
+    )
+    if envs.PRIMARY_URL
+    else None
+)
 
 
 mcp_server = FastMCP(
@@ -33,11 +143,58 @@ mcp_server = FastMCP(
 
 http_endpoints.register(mcp_server)
 mcp_endpoints.register(mcp_server)
+mcp_server.add_middleware(metrics.ToolMetricsMiddleware(mcp_server))
+mcp_server.add_middleware(AdmissionMiddleware(mcp_server, admission))
+mcp_server.add_middleware(QueryScopeMiddleware(query_stats))
+mcp_server.add_middleware(TracingMiddleware(tracer))
+if follower is not None:
+    mcp_server.add_middleware(ForwardWritesMiddleware(follower))
 
 
-if __name__ == "__main__":
+async def main():
     # Default run method; FastMCP decides transport from env/cli
     host = envs.MCP_HOST
     port = int(envs.MCP_PORT)
-    logger.info(f"Starting MCP server host={host}, port={port}")
-    asyncio.run(mcp_server.run_async(transport="http", host=host, port=port))
+    if envs.HEALTH_PROBE_INTERVAL_SECONDS > 0:
+        # One worker probes the services, the others read its results
+        health_prober.start(probe=envs.WORKER_INDEX == 0)
+    if envs.LOOP_MONITOR_INTERVAL_MS > 0:
+        loop_monitor.start()
+    if envs.CHANGE_POLL_INTERVAL_SECONDS > 0:
+        change_poller.start()
+    if follower is not None and not envs.WORKER_FD:
+        # Serve nothing stale: the first sync completes before startup
+        await follower.sync_once()
+    if follower is not None and envs.WORKER_INDEX == 0:
+        # One worker keeps the replica in sync; the others pick the
+        # replicated changes up from the change log
+        follower.start()
+    if envs.WORKER_FD:
+        # A worker of the supervisor: serve on the inherited socket. MCP
+        # sessions are not shared between workers, so every request stands alone.
+        logger.info("Starting MCP worker %s", envs.WORKER_INDEX)
+        await mcp_server.run_async(
+            transport="http",
+            uvicorn_config={"fd": int(envs.WORKER_FD)},
+            stateless_http=True,
+            show_banner=False,
+        )
+        return
+    logger.info("Starting MCP server host=%s, port=%s", host, port)
+    await mcp_server.run_async(transport="http", host=host, port=port)
+
+
+if __name__ == "__main__":
+    if envs.WORKERS > 1 and not envs.WORKER_FD:
+        if follower is not None:
+            # Workers start from a synced replica
+            asyncio.run(follower.sync_once())
+        sys.exit(
+            workers.supervise(
+                workers=envs.WORKERS,
+                host=envs.MCP_HOST,
+                port=int(envs.MCP_PORT),
+                argv=sys.argv,
+            )
+        )
+    asyncio.run(main())
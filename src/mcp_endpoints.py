@@ -1,8 +1,10 @@
+import asyncio
 from typing import Annotated, Any
 import crud
 import envs
-import httpx
 from constants import DEFAULT_SYSTEM_PROMPT_MAX_LENGTH
+from mcp.types import ContentBlock
+from notifications import notify_agents
 
 import logging
 
@@ -11,7 +13,15 @@ logger = logging.getLogger(__name__)
 
 
 def register(mcp_server):
-    from main import SessionLocal
+    from main import (
+        SessionLocal,
+        catalog_reads,
+        catalog_store,
+        gateway,
+        health_prober,
+        jobs,
+        write_queue,
+    )
 
     ########################################################
     # User management
@@ -42,10 +52,16 @@ def register(mcp_server):
             str,
             "Optional default system prompt for agents using this role",
         ] = "",
+        parent_role_name: Annotated[
+            str,
+            "Optional parent role; the new role inherits all its tools",
+        ] = "",
     ) -> Annotated[str, "The created role."]:
-        """Create a new role with optional default system prompt"""
+        """Create a new role with optional default system prompt and parent role"""
         logger.info(
-            f"create_role called role_name={role_name}, has_prompt={bool(default_system_prompt)}"
+            "create_role called role_name=%s, has_prompt=%s",
+            role_name,
+            bool(default_system_prompt),
         )
         if (
             default_system_prompt
@@ -57,7 +73,10 @@ def register(mcp_server):
             )
         with SessionLocal() as db:
             crud.create_role(
-                db, role_name=role_name, default_system_prompt=default_system_prompt
+                db,
+                role_name=role_name,
+                default_system_prompt=default_system_prompt,
+                parent_role_name=parent_role_name or None,
             )
         return f"Role with name='{role_name}' created"
 
@@ -65,7 +84,7 @@ def register(mcp_server):
     def list_roles() -> Annotated[
         list[dict[str, str]], "List roles with default_system_prompt"
     ]:
-        """List all roles with their default system prompt"""
+        """List all roles with their default system prompt and parent role"""
         logger.info("list_roles called")
         with SessionLocal() as db:
             roles = crud.list_roles(db)
@@ -73,14 +92,38 @@ def register(mcp_server):
                 {
                     "name": role.name,
                     "default_system_prompt": role.default_system_prompt or "",
+                    "parent_role_name": role.parent.name if role.parent else "",
                 }
                 for role in roles
             ]
 
+    @mcp_server.tool(tags=["admin"])
+    def set_role_parent(
+        role_name: Annotated[str, "Role name"],
+        parent_role_name: Annotated[
+            str, "Role to inherit tools from; empty to make the role top-level"
+        ] = "",
+    ) -> Annotated[str, "Operation status"]:
+        """Set the parent role a role inherits tools from"""
+        logger.info(
+            "set_role_parent called role_name=%s, parent_role_name=%s",
+            role_name,
+            parent_role_name,
+        )
+        with SessionLocal() as db:
+            crud.set_role_parent(
+                db, role_name=role_name, parent_role_name=parent_role_name or None
+            )
+        if parent_role_name:
+            return (
+                f"Role with name='{role_name}' now inherits from '{parent_role_name}'"
+            )
+        return f"Role with name='{role_name}' has no parent role"
+
     @mcp_server.tool(tags=["admin"])
     def remove_role(role_name: str) -> Annotated[str, "The deleted role."]:
         """Delete a role"""
-        logger.info(f"remove_role called role_name={role_name}")
+        logger.info("remove_role called role_name=%s", role_name)
         with SessionLocal() as db:
             crud.remove_role(db, role_name=role_name)
         return f"Role with name='{role_name}' deleted"
@@ -92,7 +135,9 @@ def register(mcp_server):
     ) -> Annotated[str, "The updated role's system prompt"]:
         """Set or update default system prompt for a role"""
         logger.info(
-            f"set_role_system_prompt called role_name={role_name}, has_prompt={bool(default_system_prompt)}"
+            "set_role_system_prompt called role_name=%s, has_prompt=%s",
+            role_name,
+            bool(default_system_prompt),
         )
         if (
             default_system_prompt
@@ -114,7 +159,7 @@ def register(mcp_server):
     ) -> Annotated[str, "The assigned role."]:
         """Assign a role to a user"""
         logger.info(
-            f"assign_role_to_user called user_id={user_id}, role_name={role_name}"
+            "assign_role_to_user called user_id=%s, role_name=%s", user_id, role_name
         )
         with SessionLocal() as db:
             crud.assign_role_to_user(db, user_id=user_id, role_name=role_name)
@@ -126,7 +171,7 @@ def register(mcp_server):
     ) -> Annotated[str, "The removed role."]:
         """Remove a role from a user"""
         logger.info(
-            f"remove_role_from_user called user_id={user_id}, role_name={role_name}"
+            "remove_role_from_user called user_id=%s, role_name=%s", user_id, role_name
         )
         with SessionLocal() as db:
             crud.remove_role_from_user(db, user_id=user_id, role_name=role_name)
@@ -138,7 +183,7 @@ def register(mcp_server):
     ) -> Annotated[str, "The attached role."]:
         """Attach a role to a tool"""
         logger.info(
-            f"attach_role_to_tool called tool_id={tool_id}, role_name={role_name}"
+            "attach_role_to_tool called tool_id=%s, role_name=%s", tool_id, role_name
         )
         with SessionLocal() as db:
             crud.attach_role_to_tool(db, tool_id=tool_id, role_name=role_name)
@@ -150,12 +195,79 @@ def register(mcp_server):
     ) -> Annotated[str, "The detached role."]:
         """Detach a role from a tool"""
         logger.info(
-            f"detach_role_from_tool called tool_id={tool_id}, role_name={role_name}"
+            "detach_role_from_tool called tool_id=%s, role_name=%s", tool_id, role_name
         )
         with SessionLocal() as db:
             crud.detach_role_from_tool(db, tool_id=tool_id, role_name=role_name)
         return f"Role with name='{role_name}' detached from tool with id='{tool_id}'"
 
+    @mcp_server.tool(tags=["admin"])
+    def attach_role_to_tools(
+        role_name: str,
+        tool_ids: Annotated[list[int] | None, "Tool ids to attach the role to"] = None,
+        service_name: Annotated[
+            str, "Attach the role to every tool of this service instead of tool_ids"
+        ] = "",
+    ) -> Annotated[str, "The attached role."]:
+        """Attach a role to many tools at once, selected by ids or by service"""
+        logger.info(
+            "attach_role_to_tools called role_name=%s, tools_count=%s, service_name=%s",
+            role_name,
+            len(tool_ids or []),
+            service_name,
+        )
+        with SessionLocal() as db:
+            attached = crud.attach_role_to_tools(
+                db,
+                role_name=role_name,
+                tool_ids=tool_ids,
+                service_name=service_name or None,
+            )
+        return f"Role with name='{role_name}' attached to {attached} tools"
+
+    @mcp_server.tool(tags=["admin"])
+    def detach_role_from_tools(
+        role_name: str,
+        tool_ids: Annotated[
+            list[int] | None, "Tool ids to detach the role from"
+        ] = None,
+        service_name: Annotated[
+            str, "Detach the role from every tool of this service instead of tool_ids"
+        ] = "",
+    ) -> Annotated[str, "The detached role."]:
+        """Detach a role from many tools at once, selected by ids or by service"""
+        logger.info(
+            "detach_role_from_tools called role_name=%s, tools_count=%s, service_name=%s",
+            role_name,
+            len(tool_ids or []),
+            service_name,
+        )
+        with SessionLocal() as db:
+            detached = crud.detach_role_from_tools(
+                db,
+                role_name=role_name,
+                tool_ids=tool_ids,
+                service_name=service_name or None,
+            )
+        return f"Role with name='{role_name}' detached from {detached} tools"
+
+    @mcp_server.tool(tags=["admin"])
+    def assign_role_to_users(
+        role_name: str,
+        user_ids: Annotated[list[str], "Identifiers of existing users"],
+    ) -> Annotated[str, "The assigned role."]:
+        """Assign a role to many users at once"""
+        logger.info(
+            "assign_role_to_users called role_name=%s, users_count=%s",
+            role_name,
+            len(user_ids),
+        )
+        with SessionLocal() as db:
+            assigned = crud.assign_role_to_users(
+                db, role_name=role_name, user_ids=user_ids
+            )
+        return f"Role with name='{role_name}' assigned to {assigned} of {len(user_ids)} users"
+
     ########################################################
     # Service management
     ########################################################
@@ -172,11 +284,47 @@ def register(mcp_server):
             str,
             "Authorization method when requires_authorization is True. Allowed: 'Basic' or 'Bearer'",
         ] = "",
+        asynchronous: Annotated[
+            bool,
+            "Return a job id immediately and register in the background; "
+            "check progress with get_job_status",
+        ] = False,
     ) -> Annotated[str, "The created/updated service with tools."]:
         """Register or update an MCP service endpoint into MCP Registry; tools are auto-discovered from the service."""
         logger.info(
-            f"add_service called service_name={service_name} endpoint={endpoint}"
+            "add_service called service_name=%s endpoint=%s", service_name, endpoint
         )
+        if asynchronous:
+
+            async def register_service(job):
+                await jobs.set_step(job, "discovering")
+                tools, service_description = await crud.discover_service(
+                    endpoint, description
+                )
+
+                await jobs.set_step(job, "saving")
+
+                def save():
+                    with SessionLocal() as db:
+                        crud.add_discovered_service(
+                            db,
+                            service_name=service_name,
+                            endpoint=endpoint,
+                            description=service_description,
+                            requires_authorization=requires_authorization,
+                            method_authorization=method_authorization,
+                            tools=tools,
+                        )
+
+                await asyncio.to_thread(save)
+
+                await jobs.set_step(job, "notifying")
+                await notify_agents("new service")
+                return {"service_name": service_name, "tools_count": len(tools)}
+
+            job = await jobs.submit("add_service", register_service)
+            return f"Job with id='{job.job_id}' queued to add service with name='{service_name}'"
+
         with SessionLocal() as db:
             service = await crud.create_or_update_service(
                 db,
@@ -188,76 +336,90 @@ def register(mcp_server):
             )
 
             logger.info(
-                f"add_service succeeded service_name={service.service_name}, tools_count={len(service.tools)}"
+                "add_service succeeded service_name=%s, tools_count=%s",
+                service.service_name,
+                len(service.tools),
             )
 
-            # reread hook
-        if envs.AGENT_REREAD_HOOK:
-            logger.info("Let know agent that we have new service")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(envs.AGENT_REREAD_HOOK)
-                response.raise_for_status()
-                logger.info(f"Agent reread hook called response={response.text}")
+        await notify_agents("new service")
 
         # return only breif output to not littering into the context
         return f"Create service with name='{service.service_name}'"
 
     @mcp_server.tool
-    def list_services() -> Annotated[
-        list[dict[str, str]], "List of services with their endpoint and description."
+    async def list_services(
+        role_name: Annotated[
+            str, "Only list services with tools usable by this role"
+        ] = "",
+        user_id: Annotated[
+            str, "Only list services with tools usable by this user's role"
+        ] = "",
+    ) -> Annotated[
+        list[dict[str, Any]],
+        "List of services with their endpoint, description and last health probe "
+        "(healthy, latency_ms; null until probed). "
+        "When filtered by role or user, includes tools_count of usable tools.",
     ]:
         """List stored MCP services in the MCP Registry.
         Helpful when need to find services that serve necessary tool.
         """
-        with SessionLocal() as db:
-            items = crud.list_services_brief(db)
-            logger.info(f"list_services returned count={len(items)}")
-            return items
+        items = await catalog_reads.do(
+            ("list_services", role_name, user_id),
+            lambda: catalog_store.list_services(
+                role_name=role_name or None, user_id=user_id or None
+            ),
+        )
+        logger.info("list_services returned count=%d", len(items))
+        # Copies: coalesced callers share the listed items
+        return [
+            {**item, **health_prober.annotate(item["service_name"])} for item in items
+        ]
 
     @mcp_server.tool(tags=["admin"])
     async def remove_service(
         service_name: Annotated[str, "The MCP service name to remove"],
     ) -> Annotated[str, "Status message of the operation"]:
         """Remove a stored MCP service by unique name from MCP Registry"""
-        logger.info(f"remove_service called service_name={service_name}")
+        logger.info("remove_service called service_name=%s", service_name)
         with SessionLocal() as db:
             crud.delete_service(db, service_name)
-            logger.info(f"remove_service result service_name={service_name}")
+            logger.info("remove_service result service_name=%s", service_name)
 
-        # reread hook
-        if envs.AGENT_REREAD_HOOK:
-            logger.info("Let know agent that we have removed service")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(envs.AGENT_REREAD_HOOK)
-                response.raise_for_status()
-                logger.info(f"Agent reread hook called response={response.text}")
+        await notify_agents("removed service")
 
         return f"Service with name='{service_name}' removed"
 
+    @mcp_server.tool(tags=["admin"])
+    async def get_job_status(
+        job_id: Annotated[str, "Job id returned by an asynchronous operation"],
+    ) -> Annotated[
+        dict[str, Any],
+        "Job kind, status (queued/running/succeeded/failed), current step, "
+        "error and result",
+    ]:
+        """Return the progress of a background job such as an asynchronous add_service"""
+        job = await jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Job with id '{job_id}' not found")
+        return job.to_dict()
+
     @mcp_server.tool
-    def get_tools(service_name: str) -> list[dict[str, Any]]:
+    async def get_tools(service_name: str) -> list[dict[str, Any]]:
         """Return stored tools for a MCP service in the MCP Registry identified by unique service name."""
-        logger.info(f"get_tools called service_name={service_name}")
-        with SessionLocal() as db:
-            tools = crud.get_tools(db, service_name=service_name)
-            items = [
-                {
-                    "id": t.id,
-                    "name": t.name,
-                    "description": t.description,
-                    "roles": [r.name for r in (t.roles or [])],
-                }
-                for t in tools
-            ]
-            logger.info(f"get_tools returned count={len(items)}")
-            return items
+        logger.info("get_tools called service_name=%s", service_name)
+        items = await catalog_reads.do(
+            ("get_tools", service_name),
+            lambda: catalog_store.get_tools(service_name=service_name),
+        )
+        logger.info("get_tools returned count=%d", len(items))
+        return items
 
     ########################################################
     # Authorization management
     ########################################################
 
     @mcp_server.tool
-    def authorize_user_to_service(
+    async def authorize_user_to_service(
         service_name: Annotated[str, "The MCP service name to authorize the user for"],
         user_id: Annotated[str, "The user identifier to be authorized"],
         token: Annotated[
@@ -266,12 +428,53 @@ def register(mcp_server):
     ) -> Annotated[str, "Status message of the authorization operation"]:
         """Authorize a user for a specific MCP service by setting an authorization token."""
         logger.info(
-            f"authorize_user_to_service called service_name={service_name}, user_id={user_id}"
+            "authorize_user_to_service called service_name=%s, user_id=%s",
+            service_name,
+            user_id,
         )
-        with SessionLocal() as db:
-            # Ensure user exists; create if not
-            crud.get_or_create_user(db, user_id=user_id)
+
+        def set_token(db):
+            # Creates the user if missing
             crud.set_user_service_token(
-                db, user_id=user_id, service_name=service_name, token=token
+                db,
+                user_id=user_id,
+                service_name=service_name,
+                token=token,
+                commit=False,
             )
+
+        await write_queue.run(set_token)
         return "Authorization token is set, please repeat your original request"
+
+    ########################################################
+    # Gateway
+    ########################################################
+
+    if envs.GATEWAY_ENABLED:
+
+        @mcp_server.tool
+        async def call_tool(
+            service_name: Annotated[str, "The MCP service providing the tool"],
+            tool_name: Annotated[str, "The tool to call"],
+            user_id: Annotated[str, "The user on whose behalf the tool is called"],
+            arguments: Annotated[
+                dict[str, Any] | None, "Arguments passed to the tool"
+            ] = None,
+        ) -> Annotated[list[ContentBlock], "Content returned by the tool"]:
+            """Call a tool of a registered MCP service on behalf of a user.
+            The user's role must allow the tool; the user's stored token is sent
+            to services that require authorization.
+            """
+            logger.info(
+                "call_tool called service_name=%s, tool_name=%s, user_id=%s",
+                service_name,
+                tool_name,
+                user_id,
+            )
+            result = await gateway.call_tool(
+                user_id=user_id,
+                service_name=service_name,
+                tool_name=tool_name,
+                arguments=arguments,
+            )
+            return result.content
@@ -0,0 +1,435 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from contextlib import contextmanager
+from typing import Any
+
+from fastapi import HTTPException
+from fastmcp.server.middleware import Middleware
+from sqlalchemy import event
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow discovery
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = tuple[str, ...]
+
+
+def _format_labels(names: tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter per label set.
+
+    With `collect`, values are read from the callable at exposition time
+    instead (for counts kept elsewhere, e.g. cache hits).
+    """
+
+    type_name = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        collect: Callable[[], dict[Labels, float]] | None = None,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._collect = collect
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._snapshot().get(labels, 0)
+
+    def _snapshot(self) -> dict[Labels, float]:
+        if self._collect is not None:
+            return self._collect()
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._snapshot().items())
+        ]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, per label set."""
+
+    type_name = "gauge"
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """Cumulative histogram of observations (e.g. latencies in seconds)."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (non-cumulative, +Inf last), sum
+        self._series: dict[Labels, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Observe the duration of the block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = {
+                labels: (list(counts), total[0])
+                for labels, (counts, total) in self._series.items()
+            }
+        lines = []
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_requests = REGISTRY.register(
+    Counter(
+        "registry_http_requests_total",
+        "HTTP requests by route, method and status code.",
+        ("route", "method", "status"),
+    )
+)
+http_duration = REGISTRY.register(
+    Histogram(
+        "registry_http_request_duration_seconds",
+        "HTTP request latency by route and method.",
+        ("route", "method"),
+    )
+)
+tool_calls = REGISTRY.register(
+    Counter(
+        "registry_mcp_tool_calls_total",
+        "MCP tool calls by tool and outcome (ok or error).",
+        ("tool", "outcome"),
+    )
+)
+tool_duration = REGISTRY.register(
+    Histogram(
+        "registry_mcp_tool_duration_seconds",
+        "MCP tool call latency by tool.",
+        ("tool",),
+    )
+)
+db_connects = REGISTRY.register(
+    Counter(
+        "registry_db_pool_connects_total", "New DBAPI connections opened by the pool."
+    )
+)
+db_checkouts = REGISTRY.register(
+    Counter(
+        "registry_db_pool_checkouts_total", "Connections checked out from the pool."
+    )
+)
+db_checked_out = REGISTRY.register(
+    Gauge(
+        "registry_db_pool_checked_out",
+        "Connections currently checked out (sessions holding a connection).",
+    )
+)
+discovery_duration = REGISTRY.register(
+    Histogram(
+        "registry_discovery_duration_seconds",
+        "Service discovery latency by endpoint and operation (tools, description).",
+        ("endpoint", "operation"),
+    )
+)
+discovery_failures = REGISTRY.register(
+    Counter(
+        "registry_discovery_failures_total",
+        "Failed service discoveries by endpoint and operation.",
+        ("endpoint", "operation"),
+    )
+)
+reread_hook_duration = REGISTRY.register(
+    Histogram(
+        "registry_reread_hook_duration_seconds",
+        "Latency of AGENT_REREAD_HOOK deliveries.",
+    )
+)
+reread_hook_failures = REGISTRY.register(
+    Counter(
+        "registry_reread_hook_failures_total", "Failed AGENT_REREAD_HOOK deliveries."
+    )
+)
+loop_lag = REGISTRY.register(
+    Histogram(
+        "registry_event_loop_lag_seconds",
+        "Delay of event loop ticks beyond their scheduled time.",
+    )
+)
+loop_blocks = REGISTRY.register(
+    Counter(
+        "registry_event_loop_blocks_total",
+        "Times the event loop was blocked longer than the threshold.",
+    )
+)
+log_records_dropped = REGISTRY.register(
+    Counter(
+        "registry_log_records_dropped_total",
+        "Log records dropped because the logging queue was full.",
+    )
+)
+log_records_sampled_out = REGISTRY.register(
+    Counter(
+        "registry_log_records_sampled_out_total",
+        "INFO/DEBUG log records skipped by LOG_SAMPLE_RATES sampling.",
+    )
+)
+rate_limited = REGISTRY.register(
+    Counter(
+        "registry_rate_limited_total",
+        "Requests rejected by per-client rate limits, by route or tool.",
+        ("route",),
+    )
+)
+requests_shed = REGISTRY.register(
+    Counter(
+        "registry_requests_shed_total",
+        "Requests shed under overload by route or tool and reason "
+        "(loop_lag, queue_full, queue_timeout).",
+        ("route", "reason"),
+    )
+)
+limiter_wait = REGISTRY.register(
+    Histogram(
+        "registry_concurrency_limiter_wait_seconds",
+        "Time expensive tool calls waited for a concurrency slot.",
+    )
+)
+
+_caches: dict[str, Any] = {}
+
+
+def _collect_caches(attribute: str) -> dict[Labels, float]:
+    return {(name,): getattr(cache, attribute) for name, cache in _caches.items()}
+
+
+def _collect_hit_ratios() -> dict[Labels, float]:
+    ratios = {}
+    for name, cache in _caches.items():
+        total = cache.hits + cache.misses
+        ratios[(name,)] = cache.hits / total if total else 0.0
+    return ratios
+
+
+REGISTRY.register(
+    Counter(
+        "registry_cache_hits_total",
+        "Cache hits by cache.",
+        ("cache",),
+        collect=lambda: _collect_caches("hits"),
+    )
+)
+REGISTRY.register(
+    Counter(
+        "registry_cache_misses_total",
+        "Cache misses by cache.",
+        ("cache",),
+        collect=lambda: _collect_caches("misses"),
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "registry_cache_hit_ratio",
+        "Share of cache lookups served from the cache since startup.",
+        ("cache",),
+        collect=_collect_hit_ratios,
+    )
+)
+
+
+def watch_cache(name: str, cache: Any) -> None:
+    """Expose the `hits` and `misses` counters of a cache under `name`."""
+    _caches[name] = cache
+
+
+def instrument_engine(engine) -> None:
+    """Count pool connects and checkouts of a SQLAlchemy engine."""
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        db_connects.inc()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        db_checkouts.inc()
+        db_checked_out.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        db_checked_out.inc(amount=-1)
+
+
+def timed_route(route: str, handler: Callable) -> Callable:
+    """Wrap an HTTP route handler to count requests and observe latency."""
+
+    @functools.wraps(handler)
+    async def wrapper(request):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status_code
+            return response
+        except HTTPException as exc:
+            status = exc.status_code
+            raise
+        finally:
+            http_duration.observe(time.perf_counter() - start, route, request.method)
+            http_requests.inc(route, request.method, str(status))
+
+    return wrapper
+
+
+class ToolMetricsMiddleware(Middleware):
+    """Counts MCP tool calls and observes their latency.
+
+    Calls to names the server does not know are labelled "other", so
+    clients cannot add label values of their choosing. The known names are
+    read once, on the first call: all tools are registered before the server
+    starts serving.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self._tool_names: frozenset[str] | None = None
+
+    async def on_call_tool(self, context, call_next):
+        if self._tool_names is None:
+            self._tool_names = frozenset(await self.server.get_tools())
+        name = context.message.name
+        if name not in self._tool_names:
+            name = "other"
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await call_next(context)
+            outcome = "ok"
+            return result
+        finally:
+            tool_duration.observe(time.perf_counter() - start, name)
+            tool_calls.inc(name, outcome)
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "REGISTRY",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "ToolMetricsMiddleware",
+    "instrument_engine",
+    "timed_route",
+    "watch_cache",
+]
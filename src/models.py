@@ -1,5 +1,14 @@
 from datetime import datetime, timezone
-from sqlalchemy import Integer, String, DateTime, ForeignKey, UniqueConstraint, Boolean
+from sqlalchemy import (
+    Float,
+    Integer,
+    String,
+    DateTime,
+    ForeignKey,
+    UniqueConstraint,
+    Boolean,
+    Text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from storage import Base
 from constants import DEFAULT_SYSTEM_PROMPT_MAX_LENGTH
@@ -29,7 +38,10 @@ class MCPService(Base):
     )
 
     tools: Mapped[list["MCPTool"]] = relationship(
-        "MCPTool", cascade="all, delete-orphan", back_populates="service"
+        "MCPTool",
+        cascade="all, delete-orphan",
+        back_populates="service",
+        passive_deletes=True,
     )
 
 
@@ -37,8 +49,10 @@ class MCPTool(Base):
     __tablename__ = "mcp_tools"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    service_name: Mapped[str] = mapped_column(
-        ForeignKey("mcp_services.service_name", ondelete="CASCADE"),
+    # Reference service by integer surrogate key: narrow indexes and joins,
+    # and the service can be renamed without rewriting its tools
+    service_id: Mapped[int] = mapped_column(
+        ForeignKey("mcp_services.id", ondelete="CASCADE"),
         nullable=False,
         index=True,
     )
@@ -52,10 +66,11 @@ class MCPTool(Base):
         "MCPRole",
         secondary="mcp_tool_roles",
         back_populates="tools",
+        passive_deletes=True,
     )
 
     __table_args__ = (
-        UniqueConstraint("service_name", "name", name="uq_tool_per_service"),
+        UniqueConstraint("service_id", "name", name="uq_tool_per_service"),
     )
 
 
@@ -68,14 +83,25 @@ class MCPRole(Base):
     default_system_prompt: Mapped[str] = mapped_column(
         String(DEFAULT_SYSTEM_PROMPT_MAX_LENGTH), default="", nullable=False
     )
+    # Optional parent role; a role inherits all tools usable by its ancestors
+    parent_id: Mapped[int | None] = mapped_column(
+        Integer,
+        ForeignKey("mcp_roles.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
+    parent: Mapped["MCPRole | None"] = relationship("MCPRole", remote_side=[id])
 
     # Reverse relationships
     tools: Mapped[list["MCPTool"]] = relationship(
         "MCPTool",
         secondary="mcp_tool_roles",
         back_populates="roles",
+        passive_deletes=True,
+    )
+    users: Mapped[list["MCPUser"]] = relationship(
+        "MCPUser", back_populates="role", passive_deletes=True
     )
-    users: Mapped[list["MCPUser"]] = relationship("MCPUser", back_populates="role")
 
 
 class MCPToolRole(Base):
@@ -100,6 +126,33 @@ class MCPToolRole(Base):
     __table_args__ = (UniqueConstraint("tool_id", "role_id", name="uq_role_per_tool"),)
 
 
+class MCPRoleClosure(Base):
+    """Transitive closure of the role hierarchy (`MCPRole.parent_id`).
+
+    Holds one row per (ancestor, descendant) pair, including each role paired
+    with itself at depth 0, so the tools usable by a role are the tools
+    attached to any of its ancestors and resolve with a single indexed join.
+    Rows are maintained by crud on role create/re-parent/remove; CASCADE
+    deletes drop the rows of a deleted role.
+    """
+
+    __tablename__ = "mcp_role_closure"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    ancestor_id: Mapped[int] = mapped_column(
+        ForeignKey("mcp_roles.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    descendant_id: Mapped[int] = mapped_column(
+        ForeignKey("mcp_roles.id", ondelete="CASCADE"), nullable=False
+    )
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Also serves lookups of a role's ancestors by descendant_id
+        UniqueConstraint("descendant_id", "ancestor_id", name="uq_role_closure"),
+    )
+
+
 class MCPUser(Base):
     __tablename__ = "mcp_users"
 
@@ -111,7 +164,10 @@ class MCPUser(Base):
 
     # Tokens relationship
     tokens: Mapped[list["UserAccessToken"]] = relationship(
-        "UserAccessToken", cascade="all, delete-orphan", back_populates="user"
+        "UserAccessToken",
+        cascade="all, delete-orphan",
+        back_populates="user",
+        passive_deletes=True,
     )
 
     # Optional single role for the user
@@ -135,9 +191,9 @@ class UserAccessToken(Base):
         nullable=False,
         index=True,
     )
-    # Reference service by stable service_name to avoid endpoint churn
-    service_name: Mapped[str] = mapped_column(
-        ForeignKey("mcp_services.service_name", ondelete="CASCADE"),
+    # Reference service by its stable integer surrogate key
+    service_id: Mapped[int] = mapped_column(
+        ForeignKey("mcp_services.id", ondelete="CASCADE"),
         nullable=False,
         index=True,
     )
@@ -161,7 +217,77 @@ class UserAccessToken(Base):
 
     __table_args__ = (
         # One token per user per service
-        UniqueConstraint(
-            "user_id_fk", "service_name", name="uq_token_per_user_service"
-        ),
+        UniqueConstraint("user_id_fk", "service_id", name="uq_token_per_user_service"),
+    )
+
+
+class MCPChangeLog(Base):
+    """Committed changes, written with the change itself.
+
+    The version is the catalog version: clients that saw version N fetch the
+    rows with version > N. Rows are written without one and versioned after
+    commit from MCPChangeVersion by `changes.publish`, rather than ordered by
+    the id, which is assigned at insert time and so may commit out of order.
+    `data` is the JSON-encoded `changes.Change.data`; it never holds
+    token values. Only the last CHANGE_LOG_RETENTION rows are kept.
+    """
+
+    __tablename__ = "mcp_change_log"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+    entity: Mapped[str] = mapped_column(String(32), nullable=False)
+    action: Mapped[str] = mapped_column(String(16), nullable=False)
+    data: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
     )
+
+
+class MCPChangeVersion(Base):
+    """Single-row counter of the last catalog version handed out.
+
+    The transaction versioning committed change log rows bumps it and holds
+    the row lock until it commits, so versions become visible in the order
+    they were handed out: a reader that sees version N has also seen every
+    version below N.
+    """
+
+    __tablename__ = "mcp_change_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class MCPJob(Base):
+    """State of a background job (`jobs.Job`), so any worker can report it.
+
+    `result` is the JSON-encoded job result; times are Unix timestamps.
+    """
+
+    __tablename__ = "mcp_jobs"
+
+    job_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(64), nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False)
+    step: Mapped[str] = mapped_column(String(64), default="", nullable=False)
+    error: Mapped[str] = mapped_column(Text, default="", nullable=False)
+    result: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+
+
+class MCPServiceHealth(Base):
+    """Last health probe result per service (`health.ServiceHealth`).
+
+    Written by the one worker that probes, read by the others.
+    """
+
+    __tablename__ = "mcp_service_health"
+
+    service_name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    healthy: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    latency_ms: Mapped[float | None] = mapped_column(Float, nullable=True)
+    checked_at: Mapped[float] = mapped_column(Float, nullable=False)
+    last_seen: Mapped[float | None] = mapped_column(Float, nullable=True)
+    error: Mapped[str] = mapped_column(Text, default="", nullable=False)
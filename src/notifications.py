@@ -0,0 +1,31 @@
+import logging
+
+import httpx
+
+import envs
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+
+async def notify_agents(reason: str) -> None:
+    """Call the AGENT_REREAD_HOOK, if configured, so agents re-read the catalog.
+
+    `reason` only completes the log line, e.g. "new service".
+    """
+    if not envs.AGENT_REREAD_HOOK:
+        return
+    logger.info("Let know agent that we have %s", reason)
+    try:
+        with metrics.reread_hook_duration.time(), tracing.span("reread_hook"):
+            async with httpx.AsyncClient() as client:
+                response = await client.get(envs.AGENT_REREAD_HOOK)
+                response.raise_for_status()
+    except Exception:
+        metrics.reread_hook_failures.inc()
+        raise
+    logger.info("Agent reread hook called response=%s", response.text)
+
+
+__all__ = ["notify_agents"]
@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased, sessionmaker
+
+import changes
+import models
+
+logger = logging.getLogger(__name__)
+
+
+class PermissionIndex:
+    """In-memory role x tool permission matrix for O(1) authorization checks.
+
+    Each role holds a Python int used as a bitset over tools; tools are
+    resolved from (service_name, tool_name) and users from user_id with plain
+    dict lookups, so `can_use` never touches the database once loaded. Tools
+    get dense bit positions, reused after their service is removed, so the
+    bitsets grow with the number of tools rather than with their ids. Besides
+    the bits of its own attachments, every role keeps effective bits: the OR
+    over its ancestors in the role hierarchy.
+
+    The index is loaded on first use and kept current from committed changes,
+    which are all applied incrementally; only a follower's replica reload
+    makes it load again. Async callers should `await ensure_loaded()` before
+    `can_use`, so that loading runs in a thread instead of on the event loop.
+    """
+
+    def __init__(self, session_factory: sessionmaker):
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = 0
+        # service_name -> tool name -> tool id
+        self._service_tools: dict[str, dict[str, int]] = {}
+        # tool id -> bit position
+        self._tool_bits: dict[int, int] = {}
+        self._free_bits: list[int] = []
+        self._role_bits: dict[str, int] = {}
+        self._role_ancestors: dict[str, list[str]] = {}
+        self._effective_bits: dict[str, int] = {}
+        self._user_roles: dict[str, str] = {}
+
+    async def ensure_loaded(self) -> None:
+        """Load the index in a thread if it is not loaded yet."""
+        if not self._loaded:
+            await asyncio.to_thread(self.load)
+
+    def can_use(self, user_id: str, service_name: str, tool_name: str) -> bool:
+        """Return whether the user's role is attached to the service's tool."""
+        if not self._loaded:
+            self.load()
+        role_name = self._user_roles.get(user_id)
+        if role_name is None:
+            return False
+        tool_id = self._service_tools.get(service_name, {}).get(tool_name)
+        if tool_id is None:
+            return False
+        bit = self._tool_bits[tool_id]
+        return (self._effective_bits.get(role_name, 0) >> bit) & 1 == 1
+
+    def load(self) -> None:
+        """(Re)build the index from the database with four queries."""
+        version = self._version
+        with self.session_factory() as db:
+            tools = db.execute(
+                select(
+                    models.MCPService.service_name,
+                    models.MCPTool.name,
+                    models.MCPTool.id,
+                ).join(
+                    models.MCPService, models.MCPService.id == models.MCPTool.service_id
+                )
+            ).all()
+            attachments = db.execute(
+                select(models.MCPRole.name, models.MCPToolRole.tool_id).join(
+                    models.MCPRole, models.MCPRole.id == models.MCPToolRole.role_id
+                )
+            ).all()
+            descendant = aliased(models.MCPRole)
+            lineage = db.execute(
+                select(descendant.name, models.MCPRole.name)
+                .select_from(models.MCPRoleClosure)
+                .join(descendant, descendant.id == models.MCPRoleClosure.descendant_id)
+                .join(
+                    models.MCPRole,
+                    models.MCPRole.id == models.MCPRoleClosure.ancestor_id,
+                )
+            ).all()
+            users = db.execute(
+                select(models.MCPUser.user_id, models.MCPRole.name).join(
+                    models.MCPRole, models.MCPRole.id == models.MCPUser.role_id_fk
+                )
+            ).all()
+
+        service_tools: dict[str, dict[str, int]] = {}
+        tool_bits: dict[int, int] = {}
+        for service_name, tool_name, tool_id in tools:
+            service_tools.setdefault(service_name, {})[tool_name] = tool_id
+            tool_bits[tool_id] = len(tool_bits)
+        role_bits: dict[str, int] = {}
+        for role_name, tool_id in attachments:
+            role_bits[role_name] = role_bits.get(role_name, 0) | (
+                1 << tool_bits[tool_id]
+            )
+        role_ancestors: dict[str, list[str]] = {}
+        for role_name, ancestor_name in lineage:
+            role_ancestors.setdefault(role_name, []).append(ancestor_name)
+
+        with self._lock:
+            self._service_tools = service_tools
+            self._tool_bits = tool_bits
+            self._free_bits = []
+            self._role_bits = role_bits
+            self._role_ancestors = role_ancestors
+            self._effective_bits = {}
+            self._refresh_effective(role_ancestors)
+            self._user_roles = dict(users)
+            # A change committed while loading may be missing from the data
+            self._loaded = version == self._version
+        logger.info(
+            "Permission index loaded tools=%d, roles=%d, users=%d",
+            len(tool_bits),
+            len(role_bits),
+            len(users),
+        )
+
+    def apply(self, change: changes.Change) -> None:
+        """Apply a committed change to the index.
+
+        An added service's tools are read before taking the lock, so a slow
+        query does not hold up the listeners of other commits; the read is
+        repeated if another change was applied in the meantime.
+        """
+        service_tools = None
+        while change.entity == "service" and change.action == "added":
+            version = self._version
+            service_tools = (
+                self._read_service_tools(change.data["service_name"])
+                if self._loaded
+                else []
+            )
+            with self._lock:
+                if version == self._version:
+                    self._apply(change, service_tools)
+                    return
+        with self._lock:
+            self._apply(change, service_tools)
+
+    def _apply(
+        self, change: changes.Change, service_tools: list[tuple[str, int]] | None
+    ) -> None:
+        self._version += 1
+        if not self._loaded:
+            return
+        data = change.data
+        if change.entity == "tool_roles":
+            if data.get("tool_ids"):
+                tool_ids = data["tool_ids"]
+            else:
+                tool_ids = self._service_tools.get(
+                    data.get("service_name"), {}
+                ).values()
+            mask = self._mask(tool_ids)
+            bits = self._role_bits.get(data["role_name"], 0)
+            if change.action == "added":
+                bits |= mask
+            else:
+                bits &= ~mask
+            self._role_bits[data["role_name"]] = bits
+            self._refresh_effective(
+                role_name
+                for role_name, ancestors in self._role_ancestors.items()
+                if data["role_name"] in ancestors
+            )
+        elif change.entity == "user":
+            for user_id in data["user_ids"]:
+                if data.get("role_name"):
+                    self._user_roles[user_id] = data["role_name"]
+                else:
+                    # New users and users whose role was removed
+                    self._user_roles.pop(user_id, None)
+        elif change.entity == "service":
+            self._remove_service(data["service_name"])
+            if change.action == "added":
+                self._add_service(data["service_name"], service_tools)
+        elif change.entity == "role":
+            self._apply_role(change)
+        elif change.entity == "replica":
+            self._loaded = False
+
+    def _mask(self, tool_ids) -> int:
+        mask = 0
+        for tool_id in tool_ids:
+            bit = self._tool_bits.get(tool_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def _read_service_tools(self, service_name: str) -> list[tuple[str, int]]:
+        # A new service has no role attachments yet, only its tools are read
+        with self.session_factory() as db:
+            return db.execute(
+                select(models.MCPTool.name, models.MCPTool.id)
+                .join(
+                    models.MCPService, models.MCPService.id == models.MCPTool.service_id
+                )
+                .where(models.MCPService.service_name == service_name)
+            ).all()
+
+    def _add_service(self, service_name: str, tools: list[tuple[str, int]]) -> None:
+        if not tools:
+            return
+        self._service_tools[service_name] = dict(tools)
+        for _, tool_id in tools:
+            self._tool_bits[tool_id] = (
+                self._free_bits.pop() if self._free_bits else len(self._tool_bits)
+            )
+
+    def _remove_service(self, service_name: str) -> None:
+        tool_ids = self._service_tools.pop(service_name, {}).values()
+        if not tool_ids:
+            return
+        mask = self._mask(tool_ids)
+        for tool_id in tool_ids:
+            self._free_bits.append(self._tool_bits.pop(tool_id))
+        # Freed bits are cleared everywhere before they are reused
+        for role_name, bits in self._role_bits.items():
+            self._role_bits[role_name] = bits & ~mask
+        for role_name, bits in self._effective_bits.items():
+            self._effective_bits[role_name] = bits & ~mask
+
+    def _apply_role(self, change: changes.Change) -> None:
+        data = change.data
+        role_name = data["role_name"]
+        if change.action == "added":
+            parent_name = data.get("parent_role_name")
+            self._role_ancestors[role_name] = [role_name] + (
+                self._role_ancestors.get(parent_name, [parent_name])
+                if parent_name
+                else []
+            )
+            self._refresh_effective([role_name])
+            return
+        if change.action == "updated" and "parent_role_name" not in data:
+            return
+
+        # The role and the roles inheriting from it keep the ancestors within
+        # that subtree and take the new parent's ancestors (or none)
+        subtree = {
+            name
+            for name, ancestors in self._role_ancestors.items()
+            if role_name in ancestors
+        }
+        inherited = []
+        if change.action == "updated" and data["parent_role_name"]:
+            parent_name = data["parent_role_name"]
+            inherited = self._role_ancestors.get(parent_name, [parent_name])
+        if change.action == "removed":
+            subtree.discard(role_name)
+            self._role_ancestors.pop(role_name, None)
+            self._role_bits.pop(role_name, None)
+            self._effective_bits.pop(role_name, None)
+            # Users holding the role are left without one (ON DELETE SET NULL)
+            self._user_roles = {
+                user_id: name
+                for user_id, name in self._user_roles.items()
+                if name != role_name
+            }
+        for name in subtree:
+            self._role_ancestors[name] = [
+                ancestor
+                for ancestor in self._role_ancestors[name]
+                if ancestor in subtree
+            ] + inherited
+        self._refresh_effective(subtree)
+
+    def _refresh_effective(self, role_names) -> None:
+        for role_name in role_names:
+            bits = 0
+            for ancestor_name in self._role_ancestors.get(role_name, [role_name]):
+                bits |= self._role_bits.get(ancestor_name, 0)
+            self._effective_bits[role_name] = bits
+
+
+__all__ = ["PermissionIndex"]
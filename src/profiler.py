@@ -0,0 +1,118 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class SamplingProfiler:
+    """Stack-sampling profiler over every thread of the process.
+
+    Every `interval_seconds` the stacks of all threads (the event loop and
+    worker threads alike) are read with `sys._current_frames` from a
+    separate thread; the profiled code is not instrumented, so the overhead
+    is the sampling itself. The result is in the collapsed-stack format
+    (`thread;outer;...;inner count` per line) read by flamegraph.pl and
+    speedscope. One profile runs at a time.
+    """
+
+    def __init__(self, *, interval_seconds: float = 0.005, max_seconds: float = 60):
+        self.interval_seconds = interval_seconds
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float) -> str:
+        """Sample for `seconds` (capped at max_seconds) and return collapsed stacks.
+
+        Blocks the calling thread; raises ProfilerBusyError if a profile is
+        already running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            return self._sample(min(seconds, self.max_seconds))
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float) -> str:
+        me = threading.get_ident()
+        stacks: Counter[str] = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(self.interval_seconds)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class RequestProfiler:
+    """cProfile for single requests that opt in, keeping the latest reports.
+
+    Only the event loop thread is profiled, so work the request hands to
+    `asyncio.to_thread` is not included; other requests served concurrently
+    on the loop are. One request is profiled at a time.
+    """
+
+    def __init__(self, *, history: int = 20, top: int = 40):
+        self.top = top
+        self._reports: deque[dict[str, Any]] = deque(maxlen=history)
+        self._busy = False
+
+    async def run(self, name: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await fn() under cProfile; runs it unprofiled if another profile is active."""
+        if self._busy:
+            return await fn()
+        self._busy = True
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return await fn()
+        finally:
+            profile.disable()
+            self._busy = False
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(
+                self.top
+            )
+            self._reports.append(
+                {
+                    "name": name,
+                    "timestamp": time.time(),
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                    "stats": out.getvalue(),
+                }
+            )
+
+    def reports(self) -> list[dict[str, Any]]:
+        """Return the kept reports, newest first."""
+        return list(reversed(self._reports))
+
+
+__all__ = ["ProfilerBusyError", "RequestProfiler", "SamplingProfiler"]
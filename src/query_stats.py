@@ -0,0 +1,202 @@
+import functools
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+import sqlalchemy
+from fastmcp.server.middleware import Middleware
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Frames in these directories are not reported as the call site of a statement
+_LIBRARY_DIRS = (
+    os.path.dirname(sqlalchemy.__file__),
+    sysconfig.get_paths()["stdlib"],
+)
+_current: ContextVar["QueryScope | None"] = ContextVar("query_scope", default=None)
+
+
+@dataclass
+class QueryScope:
+    """Statements run within one request or tool call."""
+
+    name: str
+    statements: int = 0
+    seconds: float = 0.0
+    # Executions per statement text; a statement repeated many times within
+    # one scope is usually a query per row (N+1)
+    repeats: Counter = field(default_factory=Counter)
+    n_plus_one: list[str] = field(default_factory=list)
+
+
+@dataclass
+class _ScopeTotals:
+    calls: int = 0
+    statements: int = 0
+    max_statements: int = 0
+    seconds: float = 0.0
+    over_budget: int = 0
+    n_plus_one: int = 0
+
+
+def _call_site() -> str:
+    """Return the innermost frame issuing a statement, e.g. 'crud.py:42 in f'."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename != __file__ and not filename.startswith(_LIBRARY_DIRS):
+            return (
+                f"{os.path.basename(filename)}:{frame.f_lineno} "
+                f"in {frame.f_code.co_name}"
+            )
+        frame = frame.f_back
+    return "unknown"
+
+
+class QueryStats:
+    """Counts SQL statements and their time per request or tool call.
+
+    Engine events attribute every statement to the scope opened by `track`
+    (HTTP routes and MCP tool calls each open one; the scope is carried into
+    `asyncio.to_thread` workers by the context). Statements slower than
+    `slow_query_ms` are logged with their call site; a statement run
+    `n_plus_one_threshold` times in one scope is flagged as a likely N+1, and
+    a scope running more than `budget` statements is logged when it ends.
+    Aggregates per scope name are returned by `stats`.
+    """
+
+    def __init__(
+        self,
+        *,
+        slow_query_ms: float = 100.0,
+        n_plus_one_threshold: int = 10,
+        budget: int = 20,
+    ):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.budget = budget
+        self._totals: dict[str, _ScopeTotals] = {}
+        self._lock = threading.Lock()
+
+    def install(self, engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._on_error)
+
+    @contextmanager
+    def track(self, name: str) -> Iterator[QueryScope]:
+        scope = QueryScope(name)
+        token = _current.set(scope)
+        try:
+            yield scope
+        finally:
+            _current.reset(token)
+            self._finish(scope)
+
+    def tracked(self, name: str, handler: Callable) -> Callable:
+        """Wrap an async handler so its statements are tracked under `name`."""
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            with self.track(name):
+                return await handler(*args, **kwargs)
+
+        return wrapper
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Return per-scope call and statement totals, busiest scopes first."""
+        with self._lock:
+            totals = sorted(self._totals.items(), key=lambda item: -item[1].statements)
+            return {
+                name: {
+                    "calls": t.calls,
+                    "statements": t.statements,
+                    "avg_statements": round(t.statements / t.calls, 2),
+                    "max_statements": t.max_statements,
+                    "seconds": round(t.seconds, 6),
+                    "over_budget": t.over_budget,
+                    "n_plus_one": t.n_plus_one,
+                }
+                for name, t in totals
+            }
+
+    def _finish(self, scope: QueryScope) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(scope.name, _ScopeTotals())
+            totals.calls += 1
+            totals.statements += scope.statements
+            totals.max_statements = max(totals.max_statements, scope.statements)
+            totals.seconds += scope.seconds
+            totals.n_plus_one += len(scope.n_plus_one)
+            if self.budget and scope.statements > self.budget:
+                totals.over_budget += 1
+        if self.budget and scope.statements > self.budget:
+            logger.warning(
+                "Query budget exceeded by %s: %s statements (budget %s), %.1fms",
+                scope.name,
+                scope.statements,
+                self.budget,
+                scope.seconds * 1000,
+            )
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @staticmethod
+    def _on_error(context) -> None:
+        # A failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.connection.info.get(
+            "query_start"
+        ):
+            context.connection.info["query_start"].pop()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        if elapsed * 1000 >= self.slow_query_ms:
+            logger.warning(
+                "Slow query %.1fms at %s: %s",
+                elapsed * 1000,
+                _call_site(),
+                " ".join(statement.split())[:500],
+            )
+        scope = _current.get()
+        if scope is None:
+            return
+        scope.statements += 1
+        scope.seconds += elapsed
+        scope.repeats[statement] += 1
+        if scope.repeats[statement] == self.n_plus_one_threshold:
+            site = _call_site()
+            scope.n_plus_one.append(site)
+            logger.warning(
+                "Possible N+1 in %s at %s: statement ran %s times: %s",
+                scope.name,
+                site,
+                self.n_plus_one_threshold,
+                " ".join(statement.split())[:200],
+            )
+
+
+class QueryScopeMiddleware(Middleware):
+    """Tracks the statements of each MCP tool call as scope `tool <name>`."""
+
+    def __init__(self, query_stats: QueryStats):
+        self.query_stats = query_stats
+
+    async def on_call_tool(self, context, call_next):
+        with self.query_stats.track(f"tool {context.message.name}"):
+            return await call_next(context)
+
+
+__all__ = ["QueryScope", "QueryScopeMiddleware", "QueryStats"]
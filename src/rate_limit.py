@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any
+
+from fastmcp.exceptions import ToolError
+from fastmcp.server.dependencies import get_http_request
+from fastmcp.server.middleware import Middleware
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedError(Exception):
+    """The client used up its request budget; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class OverloadedError(Exception):
+    """The request was shed to protect latency; `reason` says why."""
+
+    def __init__(self, reason: str, retry_after: float = 1.0):
+        super().__init__(f"Server overloaded ({reason}), retry later")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """Token bucket per key: `rate` requests per second, bursts of `burst`.
+
+    Buckets of the `max_keys` most recently seen keys are kept; a key seen
+    again after eviction starts with a full bucket.
+    """
+
+    def __init__(self, *, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        # key -> [tokens, monotonic time of the last update]
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """Take a token for key; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+
+class ConcurrencyLimiter:
+    """Runs at most `limit` calls at once; others wait in a bounded queue.
+
+    A call is rejected at once when `max_queue` calls are already waiting,
+    and after `max_wait_seconds` in the queue: a call that waited that long
+    would miss its caller's deadline anyway, and running it would only delay
+    the calls behind it.
+    """
+
+    def __init__(self, *, limit: int, max_queue: int, max_wait_seconds: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise OverloadedError("queue_full")
+            self.waiting += 1
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(), timeout=self.max_wait_seconds
+                )
+            except TimeoutError:
+                raise OverloadedError("queue_timeout") from None
+            finally:
+                self.waiting -= 1
+                metrics.limiter_wait.observe(time.perf_counter() - start)
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+        }
+
+
+class AdmissionControl:
+    """Rate limits and load shedding in front of agent routes and MCP tools.
+
+    - With `rate` > 0, each client (client address, together with the
+      user_id of requests that name one) gets a token bucket of `rate`
+      requests per second and bursts of `burst`; requests beyond it are
+      rejected (HTTP 429). The address is part of the key so that a caller
+      naming another user's user_id cannot use up that user's requests.
+    - With `address_rate` > 0, each client address also gets a bucket of
+      `address_rate` requests per second and bursts of `address_burst`,
+      shared by all user_ids it names, so that rotating user_ids does not
+      lift the limit.
+    - With `shed_loop_lag_seconds` > 0, requests are shed (HTTP 503) while
+      the event loop lags more than that, i.e. while new requests wait that
+      long before being served (needs the loop monitor).
+    - With `expensive_concurrency` > 0, `EXPENSIVE_TOOLS` share a cap of
+      that many concurrent calls (see ConcurrencyLimiter).
+
+    Rejections are counted in /metrics.
+    """
+
+    # Tools that call remote services: discovery and gateway calls
+    EXPENSIVE_TOOLS = frozenset({"add_service", "call_tool"})
+
+    def __init__(
+        self,
+        *,
+        rate: float = 0,
+        burst: float = 20,
+        address_rate: float = 0,
+        address_burst: float = 200,
+        shed_loop_lag_seconds: float = 0,
+        loop_monitor=None,
+        expensive_concurrency: int = 0,
+        expensive_queue: int = 100,
+        expensive_max_wait_seconds: float = 1.0,
+    ):
+        self.limiter = TokenBucketLimiter(rate=rate, burst=burst) if rate > 0 else None
+        self.address_limiter = (
+            TokenBucketLimiter(rate=address_rate, burst=address_burst)
+            if address_rate > 0
+            else None
+        )
+        self.shed_loop_lag_seconds = shed_loop_lag_seconds
+        self.loop_monitor = loop_monitor
+        self.expensive = (
+            ConcurrencyLimiter(
+                limit=expensive_concurrency,
+                max_queue=expensive_queue,
+                max_wait_seconds=expensive_max_wait_seconds,
+            )
+            if expensive_concurrency > 0
+            else None
+        )
+
+    @property
+    def checks(self) -> bool:
+        """Whether `admit` can reject anything; when not, callers skip it."""
+        return self.rate_limits or (
+            self.shed_loop_lag_seconds > 0 and self.loop_monitor is not None
+        )
+
+    @property
+    def rate_limits(self) -> bool:
+        """Whether `admit` needs the client keys; when not, callers pass ""."""
+        return self.limiter is not None or self.address_limiter is not None
+
+    def admit(self, route: str, client: str, address: str = "") -> None:
+        """Raise OverloadedError or RateLimitedError if the request must be rejected.
+
+        `client` keys the per-client bucket and `address` the per-address one.
+        """
+        if (
+            self.shed_loop_lag_seconds > 0
+            and self.loop_monitor is not None
+            and self.loop_monitor.last_lag > self.shed_loop_lag_seconds
+        ):
+            metrics.requests_shed.inc(route, "loop_lag")
+            raise OverloadedError("loop_lag")
+        for limiter, key in ((self.address_limiter, address), (self.limiter, client)):
+            if limiter is None:
+                continue
+            retry_after = limiter.acquire(key)
+            if retry_after:
+                metrics.rate_limited.inc(route)
+                raise RateLimitedError(retry_after)
+
+    def slot(self, route: str, tool_name: str):
+        """Context manager holding a concurrency slot for an expensive tool."""
+        if self.expensive is None or tool_name not in self.EXPENSIVE_TOOLS:
+            return nullcontext()
+        return self._expensive_slot(route)
+
+    @asynccontextmanager
+    async def _expensive_slot(self, route: str):
+        try:
+            async with self.expensive.slot():
+                yield
+        except OverloadedError as exc:
+            metrics.requests_shed.inc(route, exc.reason)
+            raise
+
+    def stats(self) -> dict[str, Any] | None:
+        return self.expensive.stats() if self.expensive is not None else None
+
+
+def retry_after_header(exc: RateLimitedError | OverloadedError) -> dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+
+
+class AdmissionMiddleware(Middleware):
+    """Applies AdmissionControl to MCP tool calls.
+
+    Admin tools are not rate limited, but the expensive ones count against
+    the concurrency cap. Rejections are returned as tool errors.
+    """
+
+    def __init__(self, server, admission: AdmissionControl):
+        self.server = server
+        self.admission = admission
+
+    async def on_call_tool(self, context, call_next):
+        name = context.message.name
+        route = f"tool {name}"
+        try:
+            tool = await self.server.get_tool(name)
+            if "admin" not in tool.tags and self.admission.checks:
+                client, address = (
+                    self._client_keys(context)
+                    if self.admission.rate_limits
+                    else ("", "")
+                )
+                self.admission.admit(route, client, address)
+            async with self.admission.slot(route, name):
+                return await call_next(context)
+        except (RateLimitedError, OverloadedError) as exc:
+            logger.warning("Rejected tool %s: %s", name, exc)
+            raise ToolError(str(exc)) from None
+
+    @staticmethod
+    def _client_keys(context) -> tuple[str, str]:
+        try:
+            request = get_http_request()
+        except RuntimeError:
+            host = ""
+        else:
+            host = request.client.host if request.client else ""
+        user_id = (context.message.arguments or {}).get("user_id")
+        if user_id:
+            return f"user:{user_id}@{host}", host
+        return f"client:{host}", host
+
+
+__all__ = [
+    "AdmissionControl",
+    "AdmissionMiddleware",
+    "ConcurrencyLimiter",
+    "OverloadedError",
+    "RateLimitedError",
+    "TokenBucketLimiter",
+    "retry_after_header",
+]
@@ -0,0 +1,495 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any
+
+import httpx
+from fastmcp import Client as FastMCPClient
+from fastmcp.exceptions import ToolError
+from fastmcp.server.middleware import Middleware
+from fastmcp.tools.tool import ToolResult
+from sqlalchemy import (
+    DateTime,
+    Table,
+    and_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session, sessionmaker
+
+import changes
+import models
+from storage import Base
+
+logger = logging.getLogger(__name__)
+
+# Parents before children, so foreign keys resolve while rows are applied
+CATALOG_TABLES = (
+    "mcp_services",
+    "mcp_roles",
+    "mcp_tools",
+    "mcp_role_closure",
+    "mcp_tool_roles",
+)
+REPLICATED_TABLES = CATALOG_TABLES + ("mcp_users", "user_access_tokens")
+
+# Columns referencing the same table; set in a second pass
+_SELF_REFERENCES = {"mcp_roles": "parent_id"}
+# Users looked up on a follower are registered locally with their own ids;
+# such rows are replaced by the primary's row for the same user_id
+_NATURAL_KEYS = {"mcp_users": "user_id"}
+_CHUNK = 500
+
+
+def _table(name: str) -> Table:
+    return Base.metadata.tables[name]
+
+
+def _chunks(values: list) -> list[list]:
+    return [values[i : i + _CHUNK] for i in range(0, len(values), _CHUNK)]
+
+
+def _dump(db: Session, name: str, where=None) -> list[dict[str, Any]]:
+    table = _table(name)
+    stmt = select(table).order_by(table.c.id)
+    if where is not None:
+        stmt = stmt.where(where)
+    return [
+        {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in row.items()
+        }
+        for row in db.execute(stmt).mappings()
+    ]
+
+
+def build_changes(db: Session, *, since: int | None = None) -> dict[str, Any]:
+    """Return what a follower needs to catch up from version `since` (primary side).
+
+    Versions are change log versions, as for /catalog/changes. Each catalog
+    change is sent as `scopes`: the current rows of a table matching `where`
+    (column -> values), e.g. the tools of an added service or the
+    attachments of one role to the tools it was attached to. Removing a role
+    sends the role closure table whole, since the roles that inherited from
+    it are no longer known. Changed users and their tokens are sent under
+    `upserts`. `changes` lists the log entries so the follower can notify its
+    own listeners. Without `since`, or when the log no longer reaches back to
+    it, every replicated table is sent under `tables` (`full` is True).
+    """
+    changes.publish(db)
+    oldest, version = db.execute(
+        select(
+            func.min(models.MCPChangeLog.version),
+            func.max(models.MCPChangeLog.version),
+        )
+    ).one()
+    version = version or 0
+    if since is None or since > version or (oldest is not None and since < oldest - 1):
+        return {
+            "version": version,
+            "full": True,
+            "changes": [],
+            "tables": {name: _dump(db, name) for name in REPLICATED_TABLES},
+            "scopes": [],
+            "upserts": {},
+        }
+
+    entries = [
+        {"entity": row.entity, "action": row.action, "data": json.loads(row.data)}
+        for row in db.execute(
+            select(models.MCPChangeLog)
+            .where(
+                models.MCPChangeLog.version > since,
+                models.MCPChangeLog.version <= version,
+            )
+            .order_by(models.MCPChangeLog.version)
+        ).scalars()
+    ]
+    tables = {}
+    scopes = []
+    if any(entry["entity"] == "replica" for entry in entries):
+        # This registry reloaded its own replica; there are no finer changes
+        tables = {name: _dump(db, name) for name in CATALOG_TABLES}
+    else:
+        wheres, whole = _catalog_scopes(db, entries)
+        tables = {name: _dump(db, name) for name in whole}
+        scopes = [
+            {
+                "table": name,
+                "where": where,
+                "rows": _dump(db, name, _where(name, where)),
+            }
+            for name, where in wheres
+        ]
+
+    user_ids: set[str] = set()
+    token_user_ids: set[str] = set()
+    for entry in entries:
+        if entry["entity"] == "user":
+            user_ids.update(entry["data"]["user_ids"])
+        elif entry["entity"] == "token":
+            token_user_ids.add(entry["data"]["user_id"])
+    user_ids |= token_user_ids
+    upserts = {}
+    if user_ids:
+        users = _table("mcp_users")
+        tokens = _table("user_access_tokens")
+        upserts["mcp_users"] = []
+        upserts["user_access_tokens"] = []
+        for chunk in _chunks(sorted(user_ids)):
+            upserts["mcp_users"] += _dump(db, "mcp_users", users.c.user_id.in_(chunk))
+        for chunk in _chunks(sorted(token_user_ids)):
+            upserts["user_access_tokens"] += _dump(
+                db,
+                "user_access_tokens",
+                tokens.c.user_id_fk.in_(
+                    select(users.c.id).where(users.c.user_id.in_(chunk))
+                ),
+            )
+    return {
+        "version": version,
+        "full": False,
+        "changes": entries,
+        "tables": tables,
+        "scopes": scopes,
+        "upserts": upserts,
+    }
+
+
+def _where(name: str, where: dict[str, list]):
+    table = _table(name)
+    return and_(*(table.c[column].in_(values) for column, values in where.items()))
+
+
+def _catalog_scopes(
+    db: Session, entries: list[dict[str, Any]]
+) -> tuple[list[tuple[str, dict[str, list]]], set[str]]:
+    """Return the (table, where) scopes touched by catalog entries, and the tables sent whole."""
+    services = _table("mcp_services")
+    tools = _table("mcp_tools")
+    roles = _table("mcp_roles")
+    closure = _table("mcp_role_closure")
+    scopes: dict[str, tuple[str, dict[str, list]]] = {}
+    whole: set[str] = set()
+
+    def add(table: str, **where: list) -> None:
+        if all(values and None not in values for values in where.values()):
+            scopes.setdefault(
+                json.dumps([table, where], sort_keys=True), (table, where)
+            )
+
+    def service_tool_ids(service_id: int | None) -> list[int]:
+        if service_id is None:
+            return []
+        return list(
+            db.scalars(select(tools.c.id).where(tools.c.service_id == service_id))
+        )
+
+    for entry in entries:
+        data = entry["data"]
+        if entry["entity"] == "service":
+            service_id = db.scalar(
+                select(services.c.id).where(
+                    services.c.service_name == data["service_name"]
+                )
+            )
+            add("mcp_services", service_name=[data["service_name"]])
+            add("mcp_tools", service_id=[service_id])
+            add("mcp_tool_roles", tool_id=service_tool_ids(service_id))
+        elif entry["entity"] == "role":
+            add("mcp_roles", name=[data["role_name"]])
+            if entry["action"] == "removed":
+                whole.add("mcp_role_closure")
+            elif entry["action"] == "added" or "parent_role_name" in data:
+                role_id = db.scalar(
+                    select(roles.c.id).where(roles.c.name == data["role_name"])
+                )
+                subtree = list(
+                    db.scalars(
+                        select(closure.c.descendant_id).where(
+                            closure.c.ancestor_id == role_id
+                        )
+                    )
+                )
+                add("mcp_role_closure", descendant_id=subtree)
+        elif entry["entity"] == "tool_roles":
+            role_id = db.scalar(
+                select(roles.c.id).where(roles.c.name == data["role_name"])
+            )
+            tool_ids = data.get("tool_ids") or service_tool_ids(
+                db.scalar(
+                    select(services.c.id).where(
+                        services.c.service_name == data.get("service_name")
+                    )
+                )
+            )
+            add("mcp_tool_roles", role_id=[role_id], tool_id=tool_ids)
+    scopes = [scope for scope in scopes.values() if scope[0] not in whole]
+    return scopes, whole
+
+
+def apply_changes(db: Session, payload: dict[str, Any]) -> None:
+    """Apply a `build_changes` payload to the local database (follower side).
+
+    Tables under `tables`, and the rows of each scope, are made identical to
+    the primary's (stale rows are deleted, relying on the same cascades as on
+    the primary); rows under `upserts` are inserted or updated by id. Ids are
+    kept, so references between rows stay valid. Local change listeners are
+    notified with the primary's changes once the transaction commits.
+    """
+    for name in REPLICATED_TABLES:
+        table = _table(name)
+        if name in payload["tables"]:
+            rows = payload["tables"][name]
+            local_ids = set(db.execute(select(table.c.id)).scalars())
+            stale = sorted(local_ids - {row["id"] for row in rows})
+            for chunk in _chunks(stale):
+                db.execute(delete(table).where(table.c.id.in_(chunk)))
+            _upsert(db, table, rows, local_ids.difference(stale))
+        for scope in payload.get("scopes", []):
+            if scope["table"] != name:
+                continue
+            rows = scope["rows"]
+            local_ids = set(
+                db.execute(
+                    select(table.c.id).where(_where(name, scope["where"]))
+                ).scalars()
+            )
+            stale = sorted(local_ids - {row["id"] for row in rows})
+            for chunk in _chunks(stale):
+                db.execute(delete(table).where(table.c.id.in_(chunk)))
+            _upsert(db, table, rows, None)
+        if payload["upserts"].get(name):
+            _upsert(db, table, payload["upserts"][name], None)
+
+    if payload["full"]:
+        changes.record(db, "replica", "reloaded")
+    for entry in payload["changes"]:
+        changes.record(db, entry["entity"], entry["action"], **entry["data"])
+    db.commit()
+
+
+def _upsert(
+    db: Session, table: Table, rows: list[dict[str, Any]], existing: set[int] | None
+) -> None:
+    if not rows:
+        return
+    datetime_columns = [c.name for c in table.columns if isinstance(c.type, DateTime)]
+    rows = [
+        {
+            **row,
+            **{
+                name: datetime.fromisoformat(row[name])
+                for name in datetime_columns
+                if row.get(name) is not None
+            },
+        }
+        for row in rows
+    ]
+    ids = [row["id"] for row in rows]
+    if existing is None:
+        existing = set()
+        for chunk in _chunks(ids):
+            existing.update(
+                db.execute(select(table.c.id).where(table.c.id.in_(chunk))).scalars()
+            )
+
+    natural_key = _NATURAL_KEYS.get(table.name)
+    if natural_key:
+        # Local rows whose id and natural key do not pair up as on the primary
+        incoming = {row["id"]: row[natural_key] for row in rows}
+        local: dict[int, Any] = {}
+        for chunk in _chunks(rows):
+            local.update(
+                db.execute(
+                    select(table.c.id, table.c[natural_key]).where(
+                        table.c.id.in_([row["id"] for row in chunk])
+                        | table.c[natural_key].in_([row[natural_key] for row in chunk])
+                    )
+                ).all()
+            )
+        mismatched = sorted(i for i, key in local.items() if incoming.get(i) != key)
+        for chunk in _chunks(mismatched):
+            db.execute(delete(table).where(table.c.id.in_(chunk)))
+        existing = existing.difference(mismatched)
+
+    self_reference = _SELF_REFERENCES.get(table.name)
+    first_pass = (
+        [{**row, self_reference: None} for row in rows] if self_reference else rows
+    )
+    inserts = [row for row in first_pass if row["id"] not in existing]
+    updates = [row for row in first_pass if row["id"] in existing]
+    if inserts:
+        db.execute(insert(table), inserts)
+    if updates:
+        columns = [c.name for c in table.columns if c.name != "id"]
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values({name: bindparam(name) for name in columns}),
+            [
+                {"row_id": row["id"], **{name: row[name] for name in columns}}
+                for row in updates
+            ],
+        )
+    if self_reference:
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values({self_reference: bindparam("reference")}),
+            [{"row_id": row["id"], "reference": row[self_reference]} for row in rows],
+        )
+
+
+class Follower:
+    """Keeps the local database a replica of a primary registry.
+
+    Pulls `/replication/changes` from the primary every `interval_seconds` and
+    applies it locally, so all reads are served from the local database.
+    Writes are forwarded to the primary (see ForwardWritesMiddleware and
+    `forward_http`) and followed by an immediate sync, so a client reads its
+    own writes.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        *,
+        primary_url: str,
+        replication_token: str,
+        interval_seconds: float = 2.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.session_factory = session_factory
+        self.primary_url = primary_url.rstrip("/")
+        self.replication_token = replication_token
+        self.interval_seconds = interval_seconds
+        self.transport = transport
+        self.version: int | None = None
+        self.syncs = 0
+        self._lock: asyncio.Lock | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def sync_once(self) -> None:
+        """Fetch and apply the primary's changes since the last applied version."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            params = {} if self.version is None else {"since": self.version}
+            async with self._client() as client:
+                response = await client.get(
+                    "/replication/changes",
+                    params=params,
+                    headers={"Authorization": f"Bearer {self.replication_token}"},
+                )
+                response.raise_for_status()
+            payload = response.json()
+
+            def apply():
+                with self.session_factory() as db:
+                    apply_changes(db, payload)
+
+            await asyncio.to_thread(apply)
+            self.version = payload["version"]
+            self.syncs += 1
+
+    async def forward_http(self, path: str, data: dict[str, Any]) -> httpx.Response:
+        """POST a write to the primary's HTTP API, then sync."""
+        async with self._client() as client:
+            response = await client.post(path, json=data)
+            response.raise_for_status()
+        await self.sync_once()
+        return response
+
+    async def forward_tool(self, name: str, arguments: dict[str, Any]) -> ToolResult:
+        """Call an MCP tool on the primary, then sync."""
+        async with FastMCPClient(f"{self.primary_url}/mcp/") as client:
+            result = await client.call_tool_mcp(name, arguments)
+        if result.isError:
+            raise ToolError(
+                " ".join(getattr(block, "text", "") for block in result.content)
+            )
+        await self.sync_once()
+        return ToolResult(
+            content=result.content, structured_content=result.structuredContent
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "primary_url": self.primary_url,
+            "version": self.version,
+            "syncs": self.syncs,
+        }
+
+    def _client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.primary_url, transport=self.transport, timeout=30
+        )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync_once()
+            except Exception:
+                logger.exception("Sync from primary %s failed", self.primary_url)
+            await asyncio.sleep(self.interval_seconds)
+
+
+class ForwardWritesMiddleware(Middleware):
+    """Forwards calls of writing MCP tools from a follower to the primary.
+
+    Only the tools in FORWARDED_TOOLS are forwarded; all other tools
+    (listings, the gateway) run locally.
+    """
+
+    FORWARDED_TOOLS = frozenset(
+        {
+            "create_role",
+            "set_role_parent",
+            "remove_role",
+            "set_role_system_prompt",
+            "assign_role_to_user",
+            "remove_role_from_user",
+            "attach_role_to_tool",
+            "detach_role_from_tool",
+            "attach_role_to_tools",
+            "detach_role_from_tools",
+            "assign_role_to_users",
+            "add_service",
+            "remove_service",
+            "authorize_user_to_service",
+            # Jobs of forwarded tools run on the primary
+            "get_job_status",
+        }
+    )
+
+    def __init__(self, follower: Follower):
+        self.follower = follower
+
+    async def on_call_tool(self, context, call_next):
+        name = context.message.name
+        if name in self.FORWARDED_TOOLS:
+            logger.info("Forwarding tool %s to primary", name)
+            return await self.follower.forward_tool(
+                name, context.message.arguments or {}
+            )
+        return await call_next(context)
+
+
+__all__ = [
+    "CATALOG_TABLES",
+    "REPLICATED_TABLES",
+    "Follower",
+    "ForwardWritesMiddleware",
+    "apply_changes",
+    "build_changes",
+]
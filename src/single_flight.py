@@ -0,0 +1,54 @@
+import asyncio
+from collections.abc import Callable, Hashable
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one execution.
+
+    The first caller for a key starts the function in a worker thread; callers
+    arriving with the same key while it is in flight await the same result
+    instead of running it again. A cancelled caller stops waiting, but the
+    call goes on for the others. Nothing is cached: once the call finishes,
+    the next caller for the key runs it anew. Results are shared between the
+    coalesced callers, so they must not be mutated.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Return fn(), sharing one execution among concurrent callers of key."""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            # The shared call runs as its own task, so cancelling any caller,
+            # the first one included, leaves it running for the others
+            task = asyncio.ensure_future(asyncio.to_thread(fn))
+            self._in_flight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Marks the exception as retrieved when every caller was cancelled
+            task.exception()
+
+    def stats(self) -> dict[str, Any]:
+        """Return call counters; `coalesced` calls shared another call's result."""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.calls - self.executions,
+            "in_flight": len(self._in_flight),
+        }
+
+
+__all__ = ["SingleFlight"]
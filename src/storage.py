@@ -3,7 +3,7 @@ from typing import Callable, Tuple
 from sqlalchemy import inspect, text
 from constants import DEFAULT_SYSTEM_PROMPT_MAX_LENGTH
 
-from sqlalchemy import create_engine
+from sqlalchemy import DateTime, create_engine, event
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 
@@ -16,12 +16,24 @@ def _default_database_url() -> str:
     return os.getenv("DATABASE_URL", "sqlite:///./dev.db")
 
 
-def get_engine_and_sessionmaker() -> Tuple[object, sessionmaker]:
-    database_url = _default_database_url()
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def get_engine_and_sessionmaker(
+    database_url: str | None = None,
+) -> Tuple[object, sessionmaker]:
+    database_url = database_url or _default_database_url()
     connect_args = {}
     if database_url.startswith("sqlite"):
         connect_args = {"check_same_thread": False}
     engine = create_engine(database_url, echo=False, connect_args=connect_args)
+    if database_url.startswith("sqlite"):
+        # SQLite ignores FK constraints (and so ON DELETE CASCADE / SET NULL)
+        # unless enabled per connection; deletions in crud rely on them.
+        event.listen(engine, "connect", _enable_sqlite_foreign_keys)
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
     return engine, SessionLocal
 
@@ -40,9 +52,200 @@ def init_db(engine) -> None:
                         f"ALTER TABLE mcp_roles ADD COLUMN default_system_prompt VARCHAR({DEFAULT_SYSTEM_PROMPT_MAX_LENGTH}) NOT NULL DEFAULT ''"
                     )
                 )
+        if "parent_id" not in cols:
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "ALTER TABLE mcp_roles ADD COLUMN parent_id INTEGER "
+                        "REFERENCES mcp_roles (id) ON DELETE SET NULL"
+                    )
+                )
+                conn.execute(
+                    text("CREATE INDEX ix_mcp_roles_parent_id ON mcp_roles (parent_id)")
+                )
     except Exception:
         # Do not crash startup if inspection/DDL fails; assume fresh DB
         pass
+    _migrate_service_foreign_keys(engine)
+    _migrate_change_versions(engine)
+    # Every role is its own ancestor in the role closure table; backfill the
+    # rows for roles created before role inheritance existed
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO mcp_role_closure (ancestor_id, descendant_id, depth) "
+                "SELECT id, id, 0 FROM mcp_roles WHERE id NOT IN "
+                "(SELECT descendant_id FROM mcp_role_closure)"
+            )
+        )
+
+
+def _migrate_change_versions(engine) -> None:
+    """Version change log rows from the commit-ordered counter.
+
+    Logs written before the counter existed are versioned by id, and the
+    counter starts after their last version.
+    """
+    insp = inspect(engine)
+    columns = [c.get("name") for c in insp.get_columns("mcp_change_log")]
+    with engine.begin() as conn:
+        if "version" not in columns:
+            conn.execute(text("ALTER TABLE mcp_change_log ADD COLUMN version INTEGER"))
+            conn.execute(text("UPDATE mcp_change_log SET version = id"))
+            conn.execute(
+                text(
+                    "CREATE INDEX ix_mcp_change_log_version ON mcp_change_log (version)"
+                )
+            )
+        if conn.execute(text("SELECT id FROM mcp_change_version")).first() is None:
+            conn.execute(
+                text(
+                    "INSERT INTO mcp_change_version (id, version) "
+                    "SELECT 1, COALESCE(MAX(version), 0) FROM mcp_change_log"
+                )
+            )
+
+
+# Suffix of the pre-migration tables while MySQL copies rows out of them
+_LEGACY_SUFFIX = "_legacy"
+# Tables re-keyed by _migrate_service_foreign_keys, referencing tables first
+_REKEYED_TABLES = ("mcp_tool_roles", "user_access_tokens", "mcp_tools")
+
+
+def _migrate_service_foreign_keys(engine) -> None:
+    """Re-key tools and tokens from `mcp_services.service_name` to `mcp_services.id`.
+
+    Databases created before the integer surrogate keys have a `service_name`
+    column on `mcp_tools` and `user_access_tokens`. Constraints cannot be
+    altered portably (SQLite), so the affected tables are recreated in the new
+    shape. Tool ids are preserved, which keeps `mcp_tool_roles` rows valid.
+
+    SQLite and PostgreSQL run DDL transactionally: the tables are read,
+    dropped, recreated and refilled in one transaction, so a failure leaves the
+    old schema untouched. MySQL commits implicitly on every DDL statement, so
+    there the rows never leave the database (see _migrate_by_copy).
+    """
+    insp = inspect(engine)
+    interrupted = insp.has_table(f"mcp_tools{_LEGACY_SUFFIX}")
+    columns = [c.get("name") for c in insp.get_columns("mcp_tools")]
+    if "service_id" in columns and not interrupted:
+        return
+    if engine.dialect.name == "mysql" or interrupted:
+        _migrate_by_copy(engine)
+        return
+
+    tables = Base.metadata.tables
+    tools = tables["mcp_tools"]
+    tool_roles = tables["mcp_tool_roles"]
+    tokens = tables["user_access_tokens"]
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            # pysqlite does not open a transaction for DDL on its own
+            conn.exec_driver_sql("BEGIN")
+        tool_rows = (
+            conn.execute(
+                text(
+                    "SELECT t.id, s.id AS service_id, t.name, t.description "
+                    "FROM mcp_tools t JOIN mcp_services s ON s.service_name = t.service_name"
+                )
+            )
+            .mappings()
+            .all()
+        )
+        tool_role_rows = (
+            conn.execute(text("SELECT id, tool_id, role_id FROM mcp_tool_roles"))
+            .mappings()
+            .all()
+        )
+        token_rows = (
+            conn.execute(
+                text(
+                    "SELECT k.id, k.user_id_fk, s.id AS service_id, k.token, "
+                    "k.created_at, k.updated_at FROM user_access_tokens k "
+                    "JOIN mcp_services s ON s.service_name = k.service_name"
+                ).columns(created_at=DateTime, updated_at=DateTime)
+            )
+            .mappings()
+            .all()
+        )
+
+        for table in (tool_roles, tokens, tools):
+            table.drop(conn)
+        Base.metadata.create_all(conn, tables=[tools, tool_roles, tokens])
+
+        for table, rows in (
+            (tools, tool_rows),
+            (tool_roles, tool_role_rows),
+            (tokens, token_rows),
+        ):
+            if rows:
+                conn.execute(table.insert(), [dict(row) for row in rows])
+            if conn.dialect.name == "postgresql":
+                # Explicit ids do not advance the serial sequence
+                conn.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                        f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+                    )
+                )
+
+
+def _migrate_by_copy(engine) -> None:
+    """Re-key by renaming the old tables to `*_legacy` and copying rows in SQL.
+
+    The new tables are filled from the legacy ones in one transaction and the
+    legacy tables are dropped last. Each step can be repeated, so a migration
+    interrupted at any point resumes from the legacy tables on the next start.
+    """
+    tables = Base.metadata.tables
+    legacy = {f"{name}{_LEGACY_SUFFIX}" for name in _REKEYED_TABLES}
+    existing = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        # mcp_tools is renamed last: once its legacy table exists, all are
+        if f"mcp_tools{_LEGACY_SUFFIX}" not in existing:
+            for name in _REKEYED_TABLES:
+                if f"{name}{_LEGACY_SUFFIX}" not in existing:
+                    conn.execute(
+                        text(f"ALTER TABLE {name} RENAME TO {name}{_LEGACY_SUFFIX}")
+                    )
+            existing |= legacy
+        Base.metadata.create_all(
+            conn, tables=[tables[name] for name in reversed(_REKEYED_TABLES)]
+        )
+
+    copies = {
+        "mcp_tools": (
+            "INSERT INTO mcp_tools (id, service_id, name, description) "
+            "SELECT t.id, s.id, t.name, t.description "
+            f"FROM mcp_tools{_LEGACY_SUFFIX} t "
+            "JOIN mcp_services s ON s.service_name = t.service_name "
+            "WHERE t.id NOT IN (SELECT id FROM mcp_tools)"
+        ),
+        "mcp_tool_roles": (
+            "INSERT INTO mcp_tool_roles (id, tool_id, role_id) "
+            f"SELECT id, tool_id, role_id FROM mcp_tool_roles{_LEGACY_SUFFIX} "
+            "WHERE id NOT IN (SELECT id FROM mcp_tool_roles)"
+        ),
+        "user_access_tokens": (
+            "INSERT INTO user_access_tokens "
+            "(id, user_id_fk, service_id, token, created_at, updated_at) "
+            "SELECT k.id, k.user_id_fk, s.id, k.token, k.created_at, k.updated_at "
+            f"FROM user_access_tokens{_LEGACY_SUFFIX} k "
+            "JOIN mcp_services s ON s.service_name = k.service_name "
+            "WHERE k.id NOT IN (SELECT id FROM user_access_tokens)"
+        ),
+    }
+    with engine.begin() as conn:
+        for name in reversed(_REKEYED_TABLES):
+            # A legacy table is only dropped once all rows were copied
+            if f"{name}{_LEGACY_SUFFIX}" in existing:
+                conn.execute(text(copies[name]))
+
+    with engine.begin() as conn:
+        for name in _REKEYED_TABLES:
+            if f"{name}{_LEGACY_SUFFIX}" in existing:
+                conn.execute(text(f"DROP TABLE {name}{_LEGACY_SUFFIX}"))
 
 
 def get_db_session(SessionLocal: sessionmaker) -> Callable:
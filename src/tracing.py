@@ -0,0 +1,288 @@
+import atexit
+import functools
+import inspect
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging.handlers import RotatingFileHandler
+from typing import Any
+
+from fastmcp.server.middleware import Middleware
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Trace:
+    name: str
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    timestamp: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    spans: list[dict[str, Any]] = field(default_factory=list)
+    ids: Iterator[int] = field(default_factory=lambda: itertools.count(1))
+
+    def add(
+        self,
+        name: str,
+        span_id: int,
+        parent_id: int | None,
+        start: float,
+        end: float,
+        attributes: dict[str, Any],
+        error: str | None = None,
+    ) -> None:
+        # list.append is atomic, so spans may be added from worker threads
+        self.spans.append(
+            {
+                "name": name,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "start_ms": round((start - self.started) * 1000, 3),
+                "duration_ms": round((end - start) * 1000, 3),
+                "attributes": attributes,
+                "error": error,
+            }
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        spans = sorted(self.spans, key=lambda span: (span["start_ms"], span["span_id"]))
+        root = next((span for span in spans if span["span_id"] == 0), None)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "duration_ms": root["duration_ms"] if root else 0.0,
+            "spans": spans,
+        }
+
+
+# The sampled trace being recorded and the id of the innermost open span.
+# Copied into asyncio.to_thread workers, so their spans join the trace.
+_active: ContextVar[tuple[_Trace, int] | None] = ContextVar("trace", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """Record the block as a child of the current span; a no-op when not tracing."""
+    active = _active.get()
+    if active is None:
+        yield
+        return
+    trace, parent_id = active
+    span_id = next(trace.ids)
+    token = _active.set((trace, span_id))
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as exc:
+        error = repr(exc)
+        raise
+    finally:
+        _active.reset(token)
+        trace.add(
+            name, span_id, parent_id, start, time.perf_counter(), attributes, error
+        )
+
+
+def record(name: str, start: float, end: float, **attributes: Any) -> None:
+    """Add an already finished span (perf_counter times) under the current span."""
+    active = _active.get()
+    if active is not None:
+        trace, parent_id = active
+        trace.add(name, next(trace.ids), parent_id, start, end, attributes)
+
+
+def traced(name: str) -> Callable:
+    """Decorate a function (sync or async) to run in a span named `name`."""
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _active.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _active.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Tracer:
+    """Samples requests and records their spans in process.
+
+    A trace starts at an HTTP route or MCP tool call; `sample_rate` of them
+    (0 to 1) are recorded. Within a sampled trace, `span`/`traced` blocks,
+    SQL statements and session commits become spans with their offsets and
+    durations, so the time of a slow call can be broken down without a
+    tracing backend. The last `buffer_size` traces are kept for
+    /debug/traces, and each trace is also appended as a JSON line to
+    `file_path` (rotated at `max_bytes`, keeping `backup_count` files) when
+    one is configured. The file is written through a bounded queue by a
+    writer thread, like the logs, so requests never wait on disk.
+    """
+
+    def __init__(
+        self,
+        *,
+        sample_rate: float = 0.0,
+        buffer_size: int = 100,
+        file_path: str = "",
+        max_bytes: int = 10_000_000,
+        backup_count: int = 3,
+    ):
+        self.sample_rate = sample_rate
+        self._traces: deque[dict[str, Any]] = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._file_handler = None
+        self._file_listener = None
+        if file_path:
+            # Traces are serialized and written by the listener thread
+            target = RotatingFileHandler(
+                file_path, maxBytes=max_bytes, backupCount=backup_count
+            )
+            target.setFormatter(_JsonLineFormatter())
+            self._file_handler, self._file_listener = log_setup.queued(target)
+
+    def close(self) -> None:
+        """Write the queued traces to the trace file and stop its writer."""
+        if self._file_listener is not None:
+            atexit.unregister(self._file_listener.stop)
+            self._file_listener.stop()
+            self._file_listener.handlers[0].close()
+            self._file_handler = self._file_listener = None
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[None]:
+        """Start a trace (if sampled) or a child span inside an ongoing one."""
+        if _active.get() is not None:
+            with span(name, **attributes):
+                yield
+            return
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            yield
+            return
+        trace = _Trace(name)
+        token = _active.set((trace, 0))
+        error = None
+        try:
+            yield
+        except BaseException as exc:
+            error = repr(exc)
+            raise
+        finally:
+            _active.reset(token)
+            trace.add(
+                name, 0, None, trace.started, time.perf_counter(), attributes, error
+            )
+            self._finish(trace)
+
+    def traced(self, name: str, handler: Callable) -> Callable:
+        """Wrap an async handler so each call may start a trace."""
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            with self.trace(name):
+                return await handler(*args, **kwargs)
+
+        return wrapper
+
+    def install(self, engine) -> None:
+        """Record SQL statements on `engine` and session commits as spans."""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before_execute(conn, cursor, statement, parameters, context, many):
+            if _active.get() is not None:
+                conn.info.setdefault("trace_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after_execute(conn, cursor, statement, parameters, context, many):
+            if _active.get() is not None and conn.info.get("trace_start"):
+                record(
+                    "sql",
+                    conn.info["trace_start"].pop(),
+                    time.perf_counter(),
+                    statement=" ".join(statement.split())[:200],
+                )
+
+        @event.listens_for(engine, "handle_error")
+        def _on_error(context):
+            if context.connection is not None and context.connection.info.get(
+                "trace_start"
+            ):
+                context.connection.info["trace_start"].pop()
+
+        if not event.contains(Session, "before_commit", _before_commit):
+            event.listen(Session, "before_commit", _before_commit)
+            event.listen(Session, "after_commit", _after_commit)
+
+    def traces(self, *, limit: int = 20, min_ms: float = 0.0) -> list[dict[str, Any]]:
+        """Return the most recent traces, newest first."""
+        with self._lock:
+            traces = list(self._traces)
+        traces = [t for t in reversed(traces) if t["duration_ms"] >= min_ms]
+        return traces[:limit]
+
+    def _finish(self, trace: _Trace) -> None:
+        data = trace.to_dict()
+        with self._lock:
+            self._traces.append(data)
+        if self._file_handler is not None:
+            self._file_handler.handle(
+                logging.LogRecord(__name__, logging.INFO, __file__, 0, data, None, None)
+            )
+
+
+class _JsonLineFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg)
+
+
+def _before_commit(session) -> None:
+    if _active.get() is not None:
+        session.info["trace_commit_start"] = time.perf_counter()
+
+
+def _after_commit(session) -> None:
+    start = session.info.pop("trace_commit_start", None)
+    if start is not None:
+        record("db.commit", start, time.perf_counter())
+
+
+class TracingMiddleware(Middleware):
+    """Starts a trace (if sampled) for each MCP tool call."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def on_call_tool(self, context, call_next):
+        with self.tracer.trace(f"tool {context.message.name}"):
+            return await call_next(context)
+
+
+__all__ = ["Tracer", "TracingMiddleware", "record", "span", "traced"]
@@ -0,0 +1,65 @@
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def supervise(*, workers: int, host: str, port: int, argv: list[str]) -> int:
+    """Run `workers` server processes sharing one listen socket until stopped.
+
+    The socket is bound here and inherited by each worker (`python argv...`
+    with WORKER_FD and WORKER_INDEX set), so the kernel spreads connections
+    over the workers. A worker that exits is restarted. SIGTERM or SIGINT
+    stops the workers; returns the exit status for the supervisor process.
+    """
+    sock = socket.create_server((host, port), backlog=2048)
+    sock.set_inheritable(True)
+    fd = sock.fileno()
+
+    def spawn(index: int) -> subprocess.Popen:
+        env = {**os.environ, "WORKER_FD": str(fd), "WORKER_INDEX": str(index)}
+        return subprocess.Popen([sys.executable, *argv], env=env, pass_fds=(fd,))
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = {index: spawn(index) for index in range(workers)}
+    logger.info("Started %s workers on %s:%s", workers, host, port)
+    while not stopping:
+        time.sleep(0.5)
+        for index, process in processes.items():
+            if stopping or process.poll() is None:
+                continue
+            logger.warning(
+                "Worker %s exited with %s, restarting", index, process.returncode
+            )
+            # Spread restarts of a worker that keeps crashing at startup
+            time.sleep(1)
+            processes[index] = spawn(index)
+
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+    for index, process in processes.items():
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            logger.warning("Worker %s did not stop in time, killing it", index)
+            process.kill()
+            process.wait()
+    sock.close()
+    return 0
+
+
+__all__ = ["supervise"]
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from sqlalchemy.orm import Session, sessionmaker
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# A write intent receives an open session, performs its changes without
+# committing (crud functions accept `commit=False`) and returns a plain value.
+WriteIntent = Callable[[Session], T]
+
+
+class WriteQueue:
+    """Optional single-writer task that group-commits write intents.
+
+    Handlers submit intents and await the result. When enabled, one background
+    task drains the queue and applies up to `max_batch` intents collected within
+    `max_delay_ms` in a single transaction, resolving each caller's future once
+    the batch is committed. If any intent in a batch fails, the batch is rolled
+    back and its intents are replayed one transaction each, so a failure only
+    surfaces to its own caller.
+
+    When disabled, intents run inline in their own session and transaction,
+    which is the behaviour handlers had before the queue existed.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        *,
+        enabled: bool = False,
+        max_batch: int = 100,
+        max_delay_ms: float = 5.0,
+    ):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.batches = 0
+        self.intents = 0
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def run(self, intent: WriteIntent[T]) -> T:
+        """Apply the intent and return its result once it is committed."""
+        if not self.enabled:
+            with self.session_factory() as db:
+                result = intent(db)
+                db.commit()
+                return result
+
+        loop = asyncio.get_running_loop()
+        self._ensure_started(loop)
+        future = loop.create_future()
+        await self._queue.put((intent, future))
+        return await future
+
+    def _ensure_started(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._writer(self._queue))
+
+    async def _writer(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except TimeoutError:
+                    break
+
+            # Database work runs in a thread so the event loop keeps accepting
+            # intents for the next batch while this one commits.
+            try:
+                results = await asyncio.to_thread(
+                    self._apply, [intent for intent, _ in batch]
+                )
+            except Exception as exc:
+                # Opening a session or rolling back failed: the outcome of the
+                # batch is unknown, fail its callers and keep serving the queue
+                logger.exception("Write batch of %d failed", len(batch))
+                results = [(False, exc)] * len(batch)
+            self.batches += 1
+            self.intents += len(batch)
+            for (_, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _apply(self, intents: list[WriteIntent]) -> list[tuple[bool, Any]]:
+        with self.session_factory() as db:
+            try:
+                results = [(True, intent(db)) for intent in intents]
+                db.commit()
+                return results
+            except Exception as exc:  # noqa: BLE001
+                db.rollback()
+                if len(intents) == 1:
+                    return [(False, exc)]
+                logger.info(
+                    "Write batch of %d failed (%s), replaying intents one by one",
+                    len(intents),
+                    exc,
+                )
+
+        results = []
+        for intent in intents:
+            with self.session_factory() as db:
+                try:
+                    result = intent(db)
+                    db.commit()
+                    results.append((True, result))
+                except Exception as exc:  # noqa: BLE001
+                    db.rollback()
+                    results.append((False, exc))
+        return results
+
+
+__all__ = ["WriteIntent", "WriteQueue"]
@@ -0,0 +1,47 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy.orm import Session
+
+import models  # noqa: F401
+from query_stats import QueryStats
+from storage import Base, get_engine_and_sessionmaker
+
+# `main` opens DATABASE_URL at import: point it at a throwaway database
+# instead of the working directory's dev.db
+_database_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_database_dir.name}/test.db"
+
+
+@pytest.fixture
+def db_engine():
+    engine, _ = get_engine_and_sessionmaker("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(db_engine):
+    with Session(bind=db_engine) as session:
+        yield session
+
+
+@pytest.fixture
+def max_queries(db_engine):
+    """`with max_queries(n): ...` fails if the block runs more than n statements."""
+    query_stats = QueryStats(budget=0)
+    query_stats.install(db_engine)
+
+    @contextmanager
+    def check(limit: int):
+        with query_stats.track("test") as scope:
+            yield scope
+        assert scope.statements <= limit, (
+            f"{scope.statements} statements ran, at most {limit} expected:\n"
+            + "\n".join(f"{n}x {s}" for s, n in scope.repeats.items())
+        )
+
+    return check
@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+import bootstrap
+import crud
+import models
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    bootstrap.role_cache.clear()
+    bootstrap.user_cache.clear()
+    SessionLocal = sessionmaker(bind=db_engine, autoflush=False)
+    with SessionLocal() as db:
+        for name, requires_authorization in (("open", False), ("secure", True)):
+            service = models.MCPService(
+                service_name=name,
+                endpoint=f"http://{name}:8000",
+                description=f"{name} service",
+                requires_authorization=requires_authorization,
+                method_authorization="Bearer" if requires_authorization else "",
+            )
+            db.add(service)
+            db.add(models.MCPTool(service=service, name=f"{name}_tool"))
+        db.add(
+            models.MCPService(
+                service_name="hidden",
+                endpoint="http://hidden:8000",
+                description="hidden service",
+                requires_authorization=False,
+            )
+        )
+        db.add(models.MCPUser(user_id="alice"))
+        db.commit()
+        crud.create_role(db, role_name="agent", default_system_prompt="Be helpful")
+        crud.attach_role_to_tools(db, role_name="agent", service_name="open")
+        crud.attach_role_to_tools(db, role_name="agent", service_name="secure")
+        crud.assign_role_to_user(db, user_id="alice", role_name="agent")
+    yield SessionLocal
+
+
+def _statements(engine):
+    statements = []
+    event.listen(
+        engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+    return statements
+
+
+def test_bootstrap_bundle(session_factory):
+    bundle = bootstrap.get_bundle(session_factory, user_id="alice")
+
+    assert bundle["role"] == "agent"
+    assert bundle["default_system_prompt"] == "Be helpful"
+    assert set(bundle["services"]) == {"open", "secure"}
+    assert bundle["services"]["open"]["authorized"] is True
+    assert bundle["services"]["secure"]["authorized"] is False
+    assert [t["name"] for t in bundle["services"]["secure"]["tools"]] == ["secure_tool"]
+
+
+def test_bootstrap_bundle_is_cached_and_invalidated(session_factory, db_engine):
+    bootstrap.get_bundle(session_factory, user_id="alice")
+    statements = _statements(db_engine)
+
+    bootstrap.get_bundle(session_factory, user_id="alice")
+    assert statements == []
+
+    with session_factory() as db:
+        crud.set_user_service_token(
+            db, user_id="alice", service_name="secure", token="secret"
+        )
+    statements.clear()
+    bundle = bootstrap.get_bundle(session_factory, user_id="alice")
+    assert bundle["services"]["secure"]["authorized"] is True
+    # Only the user part is reloaded; the role part stays cached
+    assert len(statements) == 2
+
+
+def test_bootstrap_registers_unknown_user(session_factory):
+    bundle = bootstrap.get_bundle(session_factory, user_id="bob")
+    assert bundle == {
+        "user_id": "bob",
+        "role": "",
+        "default_system_prompt": "",
+        "services": {},
+    }
+    with session_factory() as db:
+        assert [u.user_id for u in crud.list_users(db)] == ["alice", "bob"]
@@ -0,0 +1,215 @@
+import time
+
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.orm import sessionmaker
+
+import changes
+import crud
+import models
+from catalog import CatalogStore
+from permissions import PermissionIndex
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    SessionLocal = sessionmaker(bind=db_engine, autoflush=False)
+    with SessionLocal() as db:
+        for name in ("svc1", "svc2"):
+            service = models.MCPService(
+                service_name=name,
+                endpoint=f"http://{name}:8000",
+                description=f"{name} service",
+                requires_authorization=False,
+            )
+            db.add_all(
+                models.MCPTool(service=service, name=f"tool{i}", description="tool")
+                for i in range(3)
+            )
+        db.commit()
+        crud.create_role(db, role_name="agent")
+        crud.create_role(db, role_name="intern", parent_role_name="agent")
+        crud.attach_role_to_tools(db, role_name="agent", tool_ids=[1, 4])
+        crud.attach_role_to_tool(db, role_name="intern", tool_id=2)
+    yield SessionLocal
+
+
+@pytest.fixture
+def store(session_factory):
+    store = CatalogStore(session_factory, enabled=True)
+    changes.subscribe(store.apply)
+    yield store
+    changes._listeners.remove(store.apply)
+
+
+def test_store_matches_database_reads(store, session_factory):
+    disabled = CatalogStore(session_factory)
+    for role_name in ("agent", "intern", "missing"):
+        assert store.list_services(role_name=role_name) == disabled.list_services(
+            role_name=role_name
+        )
+        assert store.tools_for_role(role_name=role_name) == disabled.tools_for_role(
+            role_name=role_name
+        )
+    assert store.list_services() == disabled.list_services()
+    for service_name in ("svc1", "svc2", "missing"):
+        assert store.get_tools(service_name=service_name) == disabled.get_tools(
+            service_name=service_name
+        )
+
+
+def test_store_follows_committed_changes(store, session_factory, db_engine):
+    store.load()
+    statements = []
+    event.listen(
+        db_engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+    with session_factory() as db:
+        crud.attach_role_to_tools(db, role_name="agent", service_name="svc2")
+        crud.detach_role_from_tool(db, role_name="agent", tool_id=1)
+    writes = len(statements)
+
+    assert [t["id"] for t in store.tools_for_role(role_name="intern")] == [2, 4, 5, 6]
+    assert store.get_tools(service_name="svc1")[0]["roles"] == []
+    assert len(statements) == writes
+
+    with session_factory() as db:
+        crud.delete_service(db, "svc2")
+    assert [s["service_name"] for s in store.list_services()] == ["svc1"]
+    assert store.stats()["tools"] == 3
+    assert store.stats()["memory_bytes"] > 0
+
+
+def test_store_applies_service_and_role_changes_without_loading(
+    store, session_factory, mocker
+):
+    store.load()
+    load = mocker.spy(store, "load")
+    disabled = CatalogStore(session_factory)
+    with session_factory() as db:
+        crud.add_discovered_service(
+            db,
+            service_name="svc3",
+            endpoint="http://svc3:8000",
+            description="svc3 service",
+            requires_authorization=False,
+            method_authorization="",
+            tools=[{"name": "search", "description": "tool"}],
+        )
+        crud.create_role(db, role_name="trainee", parent_role_name="intern")
+        crud.attach_role_to_tools(db, role_name="trainee", service_name="svc3")
+        crud.set_role_parent(db, role_name="intern", parent_role_name=None)
+        crud.delete_service(db, "svc1")
+        crud.remove_role(db, role_name="intern")
+        crud.get_or_create_user(db, user_id="alice")
+        crud.assign_role_to_user(db, user_id="alice", role_name="trainee")
+    for role_name in ("agent", "intern", "trainee"):
+        assert store.list_services(role_name=role_name) == disabled.list_services(
+            role_name=role_name
+        )
+        assert store.tools_for_role(role_name=role_name) == disabled.tools_for_role(
+            role_name=role_name
+        )
+    assert store.list_services() == disabled.list_services()
+    for service_name in ("svc1", "svc2", "svc3"):
+        assert store.get_tools(service_name=service_name) == disabled.get_tools(
+            service_name=service_name
+        )
+    assert store.list_services(user_id="alice") == disabled.list_services(
+        user_id="alice"
+    )
+    assert store.list_services(user_id="bob") == []
+    assert store.stats()["services"] == 2
+    load.assert_not_called()
+
+
+def test_store_swaps_in_updated_snapshots(store, session_factory, mocker):
+    columns = store.load()
+    tool_ids = list(columns.tool_ids)
+    locked = []
+
+    def session():
+        locked.append(store._lock.locked())
+        return session_factory()
+
+    mocker.patch.object(store, "session_factory", side_effect=session)
+    with session_factory() as db:
+        crud.add_discovered_service(
+            db,
+            service_name="svc3",
+            endpoint="http://svc3:8000",
+            description="svc3 service",
+            requires_authorization=False,
+            method_authorization="",
+            tools=[{"name": "search", "description": "tool"}],
+        )
+        crud.create_role(db, role_name="trainee", parent_role_name="intern")
+        crud.delete_service(db, "svc1")
+
+    # Rows are read without the lock and readers keep the snapshot they hold
+    assert locked and not any(locked)
+    assert store._columns is not columns
+    assert list(columns.tool_ids) == tool_ids
+    assert len(columns.service_ids) == len(columns.service_names) == 2
+    assert "trainee" not in columns.role_ids
+    assert columns.service_names[0] == "svc1"
+    assert [s["service_name"] for s in store.list_services()] == ["svc2", "svc3"]
+
+
+def test_store_and_index_stay_within_bounds(db_engine):
+    # A small version of the scale claims: about 100 bytes per tool in the
+    # store, millisecond reads and microsecond permission checks
+    SessionLocal = sessionmaker(bind=db_engine, autoflush=False)
+    with SessionLocal() as db:
+        db.execute(
+            insert(models.MCPService),
+            [
+                {
+                    "id": service_id,
+                    "service_name": f"svc{service_id}",
+                    "endpoint": f"http://svc{service_id}:8000",
+                    "description": "service",
+                    "requires_authorization": False,
+                }
+                for service_id in range(1, 101)
+            ],
+        )
+        db.execute(
+            insert(models.MCPTool),
+            [
+                {
+                    "id": tool_id,
+                    "service_id": (tool_id - 1) // 100 + 1,
+                    "name": f"tool{tool_id % 100}",
+                    "description": "tool",
+                }
+                for tool_id in range(1, 10_001)
+            ],
+        )
+        db.add(models.MCPUser(user_id="alice"))
+        db.commit()
+        crud.create_role(db, role_name="agent")
+        crud.attach_role_to_tools(
+            db, role_name="agent", tool_ids=list(range(1, 10_001, 2))
+        )
+        crud.assign_role_to_user(db, user_id="alice", role_name="agent")
+
+    store = CatalogStore(SessionLocal, enabled=True)
+    store.load()
+    assert store.stats()["memory_bytes"] < 10_000 * 100
+    start = time.perf_counter()
+    assert len(store.list_services(role_name="agent")) == 100
+    assert len(store.tools_for_role(role_name="agent")) == 5_000
+    assert time.perf_counter() - start < 0.1
+
+    index = PermissionIndex(SessionLocal)
+    index.load()
+    # Dense bit positions: one bit per tool
+    assert max(bits.bit_length() for bits in index._effective_bits.values()) <= 10_000
+    start = time.perf_counter()
+    allowed = sum(
+        index.can_use("alice", f"svc{tool_id // 100 + 1}", f"tool{tool_id % 100}")
+        for tool_id in range(10_000)
+    )
+    assert allowed == 5_000
+    assert time.perf_counter() - start < 0.25
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import changes
+import crud
+import models
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    return sessionmaker(bind=db_engine, autoflush=False)
+
+
+@pytest.fixture
+def received(monkeypatch):
+    # mark_current() starts counting this process's changes; undo it afterwards
+    monkeypatch.setattr(changes, "_local", None)
+    received = []
+    changes.subscribe(received.append)
+    yield received
+    changes._listeners.remove(received.append)
+
+
+def _commit_elsewhere(db_engine, entity, action, **data):
+    # What another process sharing the database leaves in the change log
+    with db_engine.begin() as conn:
+        conn.execute(
+            insert(models.MCPChangeLog),
+            {
+                "entity": entity,
+                "action": action,
+                "data": json.dumps(data),
+            },
+        )
+
+
+def test_poller_dispatches_changes_of_other_processes(
+    db_engine, session_factory, received
+):
+    _commit_elsewhere(db_engine, "user", "added", user_ids=["before"])
+    poller = changes.ChangePoller(session_factory)
+    poller.mark_current()
+    _commit_elsewhere(db_engine, "user", "added", user_ids=["u1"])
+    _commit_elsewhere(db_engine, "token", "updated", user_id="u1", service_name="s")
+
+    assert poller.poll_once() == 2
+    assert received == [
+        changes.Change("user", "added", {"user_ids": ["u1"]}),
+        changes.Change("token", "updated", {"user_id": "u1", "service_name": "s"}),
+    ]
+    assert poller.poll_once() == 0
+    assert poller.stats() == {"version": 3, "polls": 2, "applied": 2}
+
+
+def test_poller_skips_changes_of_its_own_process(db_engine, session_factory, received):
+    poller = changes.ChangePoller(session_factory)
+    poller.mark_current()
+    with session_factory() as db:
+        crud.get_or_create_user(db, user_id="u1")
+    # Dispatched once, at commit
+    assert received == [changes.Change("user", "added", {"user_ids": ["u1"]})]
+
+    # The same change by another process is not mistaken for the local one
+    _commit_elsewhere(db_engine, "user", "added", user_ids=["u1"])
+    assert poller.poll_once() == 1
+    assert len(received) == 2
+
+
+def test_poller_dispatches_change_matching_rolled_back_one(
+    db_engine, session_factory, received
+):
+    poller = changes.ChangePoller(session_factory)
+    poller.mark_current()
+    with session_factory() as db:
+        crud.get_or_create_user(db, user_id="u1", commit=False)
+        # The commit fails after the change was logged
+        changes._log_changes(db)
+        db.rollback()
+    _commit_elsewhere(db_engine, "user", "added", user_ids=["u1"])
+
+    assert poller.poll_once() == 1
+    assert received == [changes.Change("user", "added", {"user_ids": ["u1"]})]
+
+
+def test_poller_reloads_everything_when_behind_retained_log(
+    db_engine, session_factory, received
+):
+    poller = changes.ChangePoller(session_factory)
+    poller.mark_current()
+    for i in range(3):
+        _commit_elsewhere(db_engine, "user", "added", user_ids=[f"u{i}"])
+    with session_factory() as db:
+        changes.publish(db)
+    with db_engine.begin() as conn:
+        conn.execute(
+            models.MCPChangeLog.__table__.delete().where(
+                models.MCPChangeLog.version <= 2
+            )
+        )
+
+    assert poller.poll_once() == 1
+    assert received == [changes.Change("replica", "reloaded")]
+    assert poller.version == 3
+
+
+def test_changes_are_versioned_after_commit(db_engine, session_factory):
+    statements = []
+    event.listen(
+        db_engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+    with session_factory() as db:
+        crud.get_or_create_user(db, user_id="u1")
+        crud.get_or_create_user(db, user_id="u2")
+    # Writers do not touch the counter
+    assert not any("mcp_change_version" in statement for statement in statements)
+
+    with session_factory() as db:
+        assert list(db.scalars(select(models.MCPChangeLog.version))) == [None, None]
+        changes.publish(db)
+        assert list(db.scalars(select(models.MCPChangeLog.version))) == [1, 2]
+        assert db.scalar(select(models.MCPChangeVersion.version)) == 2
+        crud.get_or_create_user(db, user_id="u3")
+        changes.publish(db)
+        changes.publish(db)
+        assert list(db.scalars(select(models.MCPChangeLog.version))) == [1, 2, 3]
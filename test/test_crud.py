@@ -0,0 +1,406 @@
+import inspect
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, func, select
+
+import changes
+import crud
+import models
+
+
+@contextmanager
+def _count_statements(engine):
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+
+def _seed(db, tools_count=3, users_count=3):
+    service = models.MCPService(
+        service_name="svc1",
+        endpoint="http://localhost:8000",
+        description="Test MCP service",
+        requires_authorization=False,
+    )
+    db.add(service)
+    db.add_all(
+        models.MCPTool(service=service, name=f"tool{i}") for i in range(tools_count)
+    )
+    db.add_all(models.MCPUser(user_id=f"user{i}") for i in range(users_count))
+    db.commit()
+    crud.create_role(db, role_name="admin")
+
+
+def test_attach_role_to_tools_by_service(db):
+    _seed(db)
+    assert crud.attach_role_to_tools(db, role_name="admin", service_name="svc1") == 3
+    # Already attached tools are skipped
+    assert crud.attach_role_to_tools(db, role_name="admin", service_name="svc1") == 0
+    assert len(crud.list_tools_by_role(db, role_name="admin")) == 3
+
+
+def test_attach_and_detach_role_by_tool_ids(db):
+    _seed(db)
+    tool_ids = [t.id for t in crud.get_tools(db, service_name="svc1")]
+    assert crud.attach_role_to_tools(db, role_name="admin", tool_ids=tool_ids[:2]) == 2
+    assert crud.detach_role_from_tools(db, role_name="admin", tool_ids=tool_ids) == 2
+    assert crud.list_tools_by_role(db, role_name="admin") == []
+
+
+def test_bulk_role_operations_validate_arguments(db):
+    _seed(db)
+    with pytest.raises(ValueError):
+        crud.attach_role_to_tools(db, role_name="admin")
+    with pytest.raises(ValueError):
+        crud.detach_role_from_tools(
+            db, role_name="admin", tool_ids=[1], service_name="svc1"
+        )
+    with pytest.raises(ValueError):
+        crud.attach_role_to_tools(db, role_name="missing", service_name="svc1")
+
+
+def test_assign_role_to_users_skips_unknown_users(db):
+    _seed(db)
+    assigned = crud.assign_role_to_users(
+        db, role_name="admin", user_ids=["user0", "user1", "unknown"]
+    )
+    assert assigned == 2
+    roles = {u.user_id: u.role.name if u.role else "" for u in crud.list_users(db)}
+    assert roles == {"user0": "admin", "user1": "admin", "user2": ""}
+
+
+@pytest.mark.parametrize("rows", [5, 200])
+def test_remove_role_uses_constant_statements(db, db_engine, rows):
+    _seed(db, tools_count=rows, users_count=rows)
+    crud.attach_role_to_tools(db, role_name="admin", service_name="svc1")
+    crud.assign_role_to_users(
+        db, role_name="admin", user_ids=[f"user{i}" for i in range(rows)]
+    )
+
+    with _count_statements(db_engine) as statements:
+        crud.remove_role(db, role_name="admin")
+    # Role lookup, the DELETE and the change log row; the role has no
+    # ancestors to unlink
+    assert len(statements) == 3
+
+    assert db.scalar(select(func.count()).select_from(models.MCPToolRole)) == 0
+    assert (
+        db.scalar(select(func.count()).where(models.MCPUser.role_id_fk.is_not(None)))
+        == 0
+    )
+    with pytest.raises(ValueError):
+        crud.remove_role(db, role_name="admin")
+
+
+@pytest.mark.parametrize("rows", [5, 200])
+def test_delete_service_uses_constant_statements(db, db_engine, rows):
+    _seed(db, tools_count=rows, users_count=rows)
+    crud.attach_role_to_tools(db, role_name="admin", service_name="svc1")
+    for i in range(rows):
+        db.add(models.UserAccessToken(user_id_fk=i + 1, service_id=1, token="t"))
+    db.commit()
+
+    with _count_statements(db_engine) as statements:
+        assert crud.delete_service(db, "svc1") is True
+    # The DELETE and the change log row
+    assert len(statements) == 2
+
+    for model in (models.MCPTool, models.MCPToolRole, models.UserAccessToken):
+        assert db.scalar(select(func.count()).select_from(model)) == 0
+    assert crud.delete_service(db, "svc1") is False
+
+
+def test_list_services_for_role_counts_accessible_tools(db):
+    _seed(db, tools_count=4)
+    db.add(
+        models.MCPService(
+            service_name="svc2",
+            endpoint="http://localhost:8001",
+            description="Service without role tools",
+            requires_authorization=False,
+        )
+    )
+    db.commit()
+    tool_ids = [t.id for t in crud.get_tools(db, service_name="svc1")]
+    crud.attach_role_to_tools(db, role_name="admin", tool_ids=tool_ids[:3])
+    crud.assign_role_to_user(db, user_id="user0", role_name="admin")
+
+    expected = [
+        {
+            "service_name": "svc1",
+            "endpoint": "http://localhost:8000",
+            "description": "Test MCP service",
+            "tools_count": 3,
+        }
+    ]
+    assert crud.list_services_for_role(db, role_name="admin") == expected
+    assert crud.list_services_for_role(db, user_id="user0") == expected
+    assert crud.list_services_for_role(db, user_id="user1") == []
+    with pytest.raises(ValueError):
+        crud.list_services_for_role(db)
+
+
+def test_role_inherits_tools_from_ancestors(db):
+    _seed(db, tools_count=3)
+    crud.create_role(db, role_name="reader", parent_role_name="admin")
+    crud.create_role(db, role_name="intern", parent_role_name="reader")
+    crud.attach_role_to_tool(db, role_name="admin", tool_id=1)
+    crud.attach_role_to_tool(db, role_name="reader", tool_id=2)
+    crud.attach_role_to_tool(db, role_name="intern", tool_id=1)
+
+    def tool_ids(role_name):
+        return [t.id for t in crud.list_tools_by_role(db, role_name=role_name)]
+
+    assert tool_ids("admin") == [1]
+    assert tool_ids("reader") == [1, 2]
+    assert tool_ids("intern") == [1, 2]
+    catalog = crud.get_role_catalog(db, role_name="intern")
+    assert [t["id"] for t in catalog["services"]["svc1"]["tools"]] == [1, 2]
+    assert crud.list_services_for_role(db, role_name="intern")[0]["tools_count"] == 2
+
+    with pytest.raises(ValueError):
+        crud.set_role_parent(db, role_name="admin", parent_role_name="intern")
+
+    # Re-parenting moves the whole subtree
+    crud.create_role(db, role_name="guest")
+    crud.attach_role_to_tool(db, role_name="guest", tool_id=3)
+    assert crud.set_role_parent(db, role_name="reader", parent_role_name="guest")
+    assert tool_ids("intern") == [1, 2, 3]
+    assert tool_ids("reader") == [2, 3]
+
+    crud.remove_role(db, role_name="reader")
+    assert tool_ids("intern") == [1]
+    parents = {r.name: r.parent for r in crud.list_roles(db)}
+    assert parents["intern"] is None
+
+
+def test_catalog_changes_since_version(db, monkeypatch):
+    _seed(db, tools_count=2)
+    full = crud.get_catalog_changes(db)
+    assert full["full"] is True
+    assert [t["name"] for t in full["services"]["svc1"]["tools"]] == ["tool0", "tool1"]
+    assert full["roles"] == [{"name": "admin", "parent_role_name": ""}]
+
+    version = full["version"]
+    crud.attach_role_to_tool(db, role_name="admin", tool_id=1)
+    crud.create_role(db, role_name="reader", parent_role_name="admin")
+    crud.assign_role_to_user(db, user_id="user0", role_name="admin")
+    delta = crud.get_catalog_changes(db, since=version)
+    assert delta["full"] is False
+    # User changes are not part of the catalog
+    assert [(c["entity"], c["action"]) for c in delta["changes"]] == [
+        ("tool_roles", "added"),
+        ("role", "added"),
+    ]
+    assert delta["changes"][0]["tool_ids"] == [1]
+    assert delta["changes"][1]["parent_role_name"] == "admin"
+    assert crud.get_catalog_changes(db, since=delta["version"])["changes"] == []
+
+    # Versions the log no longer holds fall back to a full snapshot
+    monkeypatch.setattr(changes, "_PRUNE_EVERY", 1)
+    monkeypatch.setattr(changes.envs, "CHANGE_LOG_RETENTION", 1)
+    crud.create_role(db, role_name="guest")
+    assert crud.get_catalog_changes(db, since=version)["full"] is True
+
+
+def _budget(name, call, budget):
+    return pytest.param(call, budget, id=name)
+
+
+# Statement budgets per crud function; each must hold regardless of row
+# counts. Calls run against _seed(db, 50, 50) with "admin" attached to every
+# tool and assigned to user0, and an empty "guest" role.
+QUERY_BUDGETS = [
+    _budget("list_services_brief", lambda db: crud.list_services_brief(db), 1),
+    _budget(
+        "list_services_for_role",
+        lambda db: crud.list_services_for_role(db, role_name="admin"),
+        1,
+    ),
+    _budget(
+        "list_services_for_role",
+        lambda db: crud.list_services_for_role(db, user_id="user0"),
+        1,
+    ),
+    _budget("get_tools", lambda db: crud.get_tools(db, service_name="svc1"), 2),
+    _budget(
+        "list_tools_by_role",
+        lambda db: crud.list_tools_by_role(db, role_name="admin"),
+        1,
+    ),
+    _budget(
+        "get_role_catalog", lambda db: crud.get_role_catalog(db, role_name="admin"), 2
+    ),
+    _budget("get_user_access", lambda db: crud.get_user_access(db, user_id="user0"), 2),
+    _budget(
+        "get_service_connection",
+        lambda db: crud.get_service_connection(
+            db, service_name="svc1", user_id="user0"
+        ),
+        1,
+    ),
+    _budget("get_catalog_snapshot", lambda db: crud.get_catalog_snapshot(db), 3),
+    _budget(
+        "get_catalog_changes",
+        lambda db: crud.get_catalog_changes(db, since=0),
+        8,
+    ),
+    _budget("list_users", lambda db: [u.role for u in crud.list_users(db)], 1),
+    _budget("list_roles", lambda db: [r.parent for r in crud.list_roles(db)], 1),
+    _budget(
+        "get_role_for_user",
+        lambda db: crud.get_role_for_user(db, user_id="user0"),
+        1,
+    ),
+    _budget(
+        "get_role_default_system_prompt",
+        lambda db: crud.get_role_default_system_prompt(db, role_name="admin"),
+        1,
+    ),
+    _budget(
+        "get_user_service_token",
+        lambda db: crud.get_user_service_token(
+            db, user_id="user0", service_name="svc1"
+        ),
+        1,
+    ),
+    _budget(
+        "get_service_auth_method",
+        lambda db: crud.get_service_auth_method(db, service_name="svc1"),
+        1,
+    ),
+    _budget(
+        "get_service_requires_authorization",
+        lambda db: crud.get_service_requires_authorization(db, service_name="svc1"),
+        1,
+    ),
+    _budget(
+        "get_or_create_user", lambda db: crud.get_or_create_user(db, user_id="user0"), 1
+    ),
+    _budget(
+        "get_or_create_user", lambda db: crud.get_or_create_user(db, user_id="new"), 4
+    ),
+    _budget(
+        "set_user_service_token",
+        lambda db: crud.set_user_service_token(
+            db, user_id="user0", service_name="svc1", token="t"
+        ),
+        6,
+    ),
+    _budget(
+        "add_discovered_service",
+        lambda db: crud.add_discovered_service(
+            db,
+            service_name="svc2",
+            endpoint="http://localhost:8002",
+            description="Discovered",
+            requires_authorization=False,
+            method_authorization="",
+            tools=[{"name": f"tool{i}"} for i in range(50)],
+        ),
+        5,
+    ),
+    _budget(
+        "delete_service",
+        lambda db: crud.delete_service(db, "svc1"),
+        2,
+    ),
+    _budget(
+        "create_role",
+        lambda db: crud.create_role(db, role_name="intern", parent_role_name="admin"),
+        7,
+    ),
+    _budget(
+        "remove_role",
+        lambda db: crud.remove_role(db, role_name="admin"),
+        3,
+    ),
+    _budget(
+        "set_role_parent",
+        lambda db: crud.set_role_parent(
+            db, role_name="guest", parent_role_name="admin"
+        ),
+        7,
+    ),
+    _budget(
+        "set_role_default_system_prompt",
+        lambda db: crud.set_role_default_system_prompt(
+            db, role_name="admin", default_system_prompt="Be brief"
+        ),
+        3,
+    ),
+    _budget(
+        "attach_role_to_tool",
+        lambda db: crud.attach_role_to_tool(db, role_name="guest", tool_id=1),
+        5,
+    ),
+    _budget(
+        "detach_role_from_tool",
+        lambda db: crud.detach_role_from_tool(db, role_name="admin", tool_id=1),
+        5,
+    ),
+    _budget(
+        "attach_role_to_tools",
+        lambda db: crud.attach_role_to_tools(
+            db, role_name="guest", service_name="svc1"
+        ),
+        3,
+    ),
+    _budget(
+        "detach_role_from_tools",
+        lambda db: crud.detach_role_from_tools(
+            db, role_name="admin", service_name="svc1"
+        ),
+        3,
+    ),
+    _budget(
+        "assign_role_to_user",
+        lambda db: crud.assign_role_to_user(db, user_id="user1", role_name="guest"),
+        4,
+    ),
+    _budget(
+        "assign_role_to_users",
+        lambda db: crud.assign_role_to_users(
+            db, role_name="admin", user_ids=[f"user{i}" for i in range(50)]
+        ),
+        4,
+    ),
+    _budget(
+        "remove_role_from_user",
+        lambda db: crud.remove_role_from_user(db, user_id="user0", role_name="admin"),
+        4,
+    ),
+]
+
+
+def test_every_crud_function_has_a_budget():
+    budgeted = {param.id for param in QUERY_BUDGETS}
+    public = {
+        name
+        for name, fn in inspect.getmembers(crud, inspect.isfunction)
+        if fn.__module__ == crud.__name__
+        and not name.startswith("_")
+        # The async ones discover over the network, then call the others
+        and not inspect.iscoroutinefunction(fn)
+    }
+    assert public - budgeted == set()
+
+
+@pytest.mark.parametrize("call, budget", QUERY_BUDGETS)
+def test_crud_query_budgets(db, max_queries, call, budget):
+    _seed(db, tools_count=50, users_count=50)
+    crud.attach_role_to_tools(db, role_name="admin", service_name="svc1")
+    crud.assign_role_to_user(db, user_id="user0", role_name="admin")
+    crud.create_role(db, role_name="guest")
+    db.expire_all()
+
+    with max_queries(budget):
+        call(db)
@@ -0,0 +1,149 @@
+import pytest
+from fastmcp import Client, FastMCP
+
+import crud
+import models
+from gateway import Gateway, UpstreamPool
+from permissions import PermissionIndex
+from storage import Base, get_engine_and_sessionmaker
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # File-based: connection details are loaded from a worker thread
+    engine, SessionLocal = get_engine_and_sessionmaker(f"sqlite:///{tmp_path}/db")
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        service = models.MCPService(
+            service_name="svc1",
+            endpoint="http://svc1:8000/mcp",
+            description="svc1",
+            requires_authorization=True,
+            method_authorization="Bearer",
+        )
+        db.add_all(models.MCPTool(service=service, name=n) for n in ("echo", "admin"))
+        db.commit()
+        crud.create_role(db, role_name="agent")
+        crud.get_or_create_user(db, user_id="alice")
+        crud.get_or_create_user(db, user_id="bob")
+        crud.attach_role_to_tool(db, role_name="agent", tool_id=1)
+        crud.assign_role_to_user(db, user_id="alice", role_name="agent")
+        crud.assign_role_to_user(db, user_id="bob", role_name="agent")
+        crud.set_user_service_token(
+            db, user_id="alice", service_name="svc1", token="secret"
+        )
+    yield SessionLocal
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_call_tool_enforces_roles_and_injects_token(session_factory):
+    upstream = FastMCP("svc1")
+
+    @upstream.tool
+    def echo(text: str) -> str:
+        return text
+
+    connections = []
+
+    def client_factory(endpoint, headers):
+        connections.append((endpoint, headers))
+        return Client(upstream)
+
+    gateway = Gateway(
+        session_factory,
+        PermissionIndex(session_factory),
+        client_factory=client_factory,
+    )
+    for text in ("hello", "again"):
+        result = await gateway.call_tool(
+            user_id="alice",
+            service_name="svc1",
+            tool_name="echo",
+            arguments={"text": text},
+        )
+        assert result.content[0].text == text
+    # One pooled session with the user's token
+    assert connections == [("http://svc1:8000/mcp", {"Authorization": "Bearer secret"})]
+
+    with pytest.raises(PermissionError):
+        await gateway.call_tool(user_id="alice", service_name="svc1", tool_name="admin")
+    with pytest.raises(PermissionError):
+        # Allowed tool, but no token stored for the service
+        await gateway.call_tool(
+            user_id="bob", service_name="svc1", tool_name="echo", arguments={}
+        )
+    await gateway.pool.close()
+
+
+class _FakeClient:
+    def __init__(self, fail_connect=False, fail_call=False):
+        self.fail_connect = fail_connect
+        self.fail_call = fail_call
+        self.connected = False
+        self.calls = 0
+
+    async def __aenter__(self):
+        if self.fail_connect:
+            raise ConnectionError("connect failed")
+        self.connected = True
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.connected = False
+
+    def is_connected(self):
+        return self.connected
+
+    async def call_tool(self, name, arguments):
+        self.calls += 1
+        if self.fail_call:
+            raise ConnectionError("session broken")
+        return name
+
+
+@pytest.mark.asyncio
+async def test_call_tool_retries_connects_but_not_sent_calls(session_factory):
+    clients = [
+        _FakeClient(fail_connect=True),
+        _FakeClient(fail_call=True),
+        _FakeClient(),
+    ]
+    factory = iter(clients)
+    gateway = Gateway(
+        session_factory,
+        PermissionIndex(session_factory),
+        client_factory=lambda endpoint, headers: next(factory),
+    )
+    call = {"user_id": "alice", "service_name": "svc1", "tool_name": "echo"}
+
+    # The failed connect is retried, the failed call is not
+    with pytest.raises(ConnectionError, match="session broken"):
+        await gateway.call_tool(**call)
+    assert clients[1].calls == 1
+    # The broken session was discarded
+    assert await gateway.call_tool(**call) == "echo"
+    await gateway.pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_closes_evicted_sessions_once_idle():
+    pool = UpstreamPool(lambda endpoint, headers: _FakeClient(), max_sessions=1)
+
+    first = await pool.acquire("http://a", {})
+    second = await pool.acquire("http://b", {})
+    # Over the limit, but both are in use
+    assert first.is_connected() and second.is_connected()
+
+    await pool.release(first)
+    assert not first.is_connected()
+    assert pool.stats() == {"sessions": 1, "connects": 2, "in_use": 1}
+    await pool.release(second)
+    assert second.is_connected()
+    assert pool._connecting == {}
+
+    failing = UpstreamPool(lambda endpoint, headers: _FakeClient(fail_connect=True))
+    with pytest.raises(ConnectionError):
+        await failing.acquire("http://a", {})
+    assert failing._connecting == {}
+    await pool.close()
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+import models
+from health import HealthProber
+from storage import Base, get_engine_and_sessionmaker
+
+
+@pytest.mark.asyncio
+async def test_probe_all_records_liveness(tmp_path, mocker):
+    # File-based: endpoints are loaded from a worker thread
+    engine, SessionLocal = get_engine_and_sessionmaker(f"sqlite:///{tmp_path}/db")
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all(
+            models.MCPService(
+                service_name=name,
+                endpoint=f"http://{name}:8000",
+                description=name,
+                requires_authorization=False,
+            )
+            for name in ("up", "down", "slow")
+        )
+        db.commit()
+
+    async def ping(endpoint):
+        if "down" in endpoint:
+            raise ConnectionError("refused")
+        if "slow" in endpoint:
+            await asyncio.sleep(1)
+
+    prober = HealthProber(SessionLocal, timeout_seconds=0.05)
+    mocker.patch.object(prober._client, "ping", side_effect=ping)
+    await prober.probe_all()
+
+    assert prober.annotate("up")["healthy"] is True
+    assert prober.annotate("up")["latency_ms"] >= 0
+    assert prober.annotate("down") == {"healthy": False, "latency_ms": None}
+    assert prober.is_down("slow")
+    assert not prober.is_down("unknown")
+    assert prober.annotate("unknown") == {"healthy": None, "latency_ms": None}
+    assert prober.stats()["down"]["error"] == "refused"
+
+    # Another worker serves the stored results without probing
+    other_worker = HealthProber(SessionLocal)
+    await other_worker.refresh()
+    assert other_worker.stats() == prober.stats()
+
+    with SessionLocal() as db:
+        db.query(models.MCPService).filter_by(service_name="down").delete()
+        db.commit()
+    await prober.probe_all()
+    assert "down" not in prober.stats()
+    await other_worker.refresh()
+    assert "down" not in other_worker.stats()
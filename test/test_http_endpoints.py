@@ -1,7 +1,7 @@
 import pytest
 
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock
+from unittest.mock import ANY, MagicMock
 
 from src.main import mcp_server
 
@@ -46,6 +46,123 @@ async def test_list_services(mocker):
             "test_service": {
                 "transport": "streamable_http",
                 "url": "http://localhost:8000",
+                "healthy": None,
+                "latency_ms": None,
             }
         }
     }
+
+
+@pytest.mark.asyncio
+async def test_list_services_for_role(mocker):
+    patch = mocker.patch(
+        "src.http_endpoints.crud.list_services_for_role",
+        return_value=[
+            {
+                "service_name": "test_service",
+                "endpoint": "http://localhost:8000",
+                "description": "Test MCP service",
+                "tools_count": 2,
+            }
+        ],
+    )
+    response = client.get("/list_services", params={"role": "admin"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "services": {
+            "test_service": {
+                "transport": "streamable_http",
+                "url": "http://localhost:8000",
+                "healthy": None,
+                "latency_ms": None,
+                "tools_count": 2,
+            }
+        }
+    }
+    patch.assert_called_once_with(ANY, role_name="admin", user_id=None)
+
+
+@pytest.mark.asyncio
+async def test_bootstrap(mocker):
+    bundle = {
+        "user_id": "test_user",
+        "role": "agent",
+        "default_system_prompt": "",
+        "services": {},
+    }
+    patch = mocker.patch("src.http_endpoints.bootstrap.get_bundle", return_value=bundle)
+    response = client.post("/bootstrap", json={"user_id": "test_user"})
+    assert response.status_code == 200
+    assert response.json() == bundle
+    patch.assert_called_once_with(ANY, user_id="test_user")
+
+
+@pytest.mark.asyncio
+async def test_authorize_check(mocker):
+    from main import permission_index
+
+    mocker.patch.object(
+        permission_index, "can_use", side_effect=lambda user, service, tool: tool == "a"
+    )
+    response = client.post(
+        "/authorize_check",
+        json={
+            "checks": [
+                {"user_id": "u", "service_name": "s", "tool_name": "a"},
+                {"user_id": "u", "service_name": "s", "tool_name": "b"},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {"allowed": [True, False]}
+
+
+@pytest.mark.asyncio
+async def test_list_services_healthy_only(mocker):
+    from main import health_prober
+
+    mocker.patch(
+        "src.http_endpoints.crud.list_services_brief",
+        return_value=[
+            {"service_name": name, "endpoint": f"http://{name}", "description": ""}
+            for name in ("up", "down", "unknown")
+        ],
+    )
+    mocker.patch.object(health_prober, "is_down", side_effect=lambda s: s == "down")
+    response = client.get("/list_services", params={"healthy_only": "true"})
+    assert response.status_code == 200
+    assert list(response.json()["services"]) == ["up", "unknown"]
+
+
+@pytest.mark.asyncio
+async def test_catalog_changes(mocker):
+    delta = {"version": 7, "full": False, "changes": []}
+    patch = mocker.patch(
+        "src.http_endpoints.crud.get_catalog_changes", return_value=delta
+    )
+    response = client.get("/catalog/changes", params={"since": "5"})
+    assert response.status_code == 200
+    assert response.json() == delta
+    patch.assert_called_once_with(ANY, since=5)
+
+    assert client.get("/catalog/changes", params={"since": "x"}).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_replication_changes(mocker):
+    assert client.get("/replication/changes").status_code == 404
+
+    mocker.patch("src.http_endpoints.envs.REPLICATION_TOKEN", "secret")
+    patch = mocker.patch(
+        "src.http_endpoints.replication.build_changes",
+        return_value={"version": 3, "full": False},
+    )
+    assert client.get("/replication/changes").status_code == 401
+    response = client.get(
+        "/replication/changes",
+        params={"since": "2"},
+        headers={"Authorization": "Bearer secret"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"version": 3, "full": False}
+    patch.assert_called_once_with(ANY, since=2)
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from jobs import JobPool
+from storage import Base, get_engine_and_sessionmaker
+
+
+async def _wait_finished(job):
+    for _ in range(100):
+        if job.status in ("succeeded", "failed"):
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_jobs_report_progress_and_errors():
+    pool = JobPool(max_workers=1)
+    release = asyncio.Event()
+
+    async def work(job):
+        await pool.set_step(job, "working")
+        await release.wait()
+        return {"done": True}
+
+    async def fail(job):
+        raise ValueError("boom")
+
+    first = await pool.submit("work", work)
+    second = await pool.submit("fail", fail)
+    await asyncio.sleep(0.01)
+    # One worker: the second job waits for the first
+    assert (first.status, first.step, second.status) == ("running", "working", "queued")
+
+    release.set()
+    await _wait_finished(second)
+    assert (await pool.get(first.job_id)).to_dict()["result"] == {"done": True}
+    assert (second.status, second.error) == ("failed", "boom")
+    assert await pool.get("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_history_is_bounded():
+    pool = JobPool(max_workers=2, max_history=2)
+
+    async def work(job):
+        return None
+
+    submitted = [await pool.submit("work", work) for _ in range(3)]
+    await _wait_finished(submitted[-1])
+    await pool.submit("work", work)
+    assert await pool.get(submitted[0].job_id) is None
+
+
+@pytest.mark.asyncio
+async def test_stored_jobs_are_visible_to_other_workers(tmp_path):
+    # File-based: job state is stored from a worker thread
+    engine, SessionLocal = get_engine_and_sessionmaker(f"sqlite:///{tmp_path}/db")
+    Base.metadata.create_all(bind=engine)
+    pool = JobPool(max_workers=1, max_history=1, session_factory=SessionLocal)
+    other_worker = JobPool(session_factory=SessionLocal)
+    release = asyncio.Event()
+
+    async def work(job):
+        await pool.set_step(job, "working")
+        await release.wait()
+        return {"done": True}
+
+    job = await pool.submit("work", work)
+    seen = await other_worker.get(job.job_id)
+    assert seen.status in ("queued", "running")
+    for _ in range(100):
+        if (await other_worker.get(job.job_id)).step == "working":
+            break
+        await asyncio.sleep(0.01)
+    assert (await other_worker.get(job.job_id)).status == "running"
+
+    release.set()
+    await _wait_finished(job)
+    seen = await other_worker.get(job.job_id)
+    assert (seen.status, seen.result) == ("succeeded", {"done": True})
+    assert await other_worker.get("missing") is None
+
+    # Finished jobs beyond max_history are dropped from the table too
+    await _wait_finished(await pool.submit("work", work))
+    await pool.submit("work", work)
+    assert await other_worker.get(job.job_id) is None
+    engine.dispose()
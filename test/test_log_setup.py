@@ -0,0 +1,63 @@
+import logging
+import queue
+
+import metrics
+from log_setup import (
+    DroppingQueueHandler,
+    SamplingFilter,
+    parse_sample_rates,
+    redact,
+)
+
+
+def test_redact_secrets():
+    assert redact("returned token=abc123, method=Bearer") == (
+        "returned token=***, method=Bearer"
+    )
+    assert redact('{"token": "abc", "user_id": "u1"}') == (
+        '{"token": "***", "user_id": "u1"}'
+    )
+    assert redact("Authorization: Bearer eyJhbGci") == "Authorization: Bearer ***"
+    assert redact("tools_count=3 password=hunter2") == "tools_count=3 password=***"
+    assert redact("refresh_token=abc") == "refresh_token=***"
+
+
+def test_redact_keeps_names_containing_secret_keys():
+    for message in (
+        "max_tokens=5",
+        "max_token=5",
+        "input_token: 7",
+        "nosecret=1",
+        '{"token_count": 4}',
+    ):
+        assert redact(message) == message
+
+
+def _record(name, level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 1, "msg %s", ("x",), None)
+
+
+def test_sampling_filter_keeps_warnings_and_unlisted_loggers(mocker):
+    sampling = SamplingFilter(parse_sample_rates("http_endpoints=0, mcp_endpoints=1"))
+    before = metrics.log_records_sampled_out.value()
+
+    assert not sampling.filter(_record("http_endpoints"))
+    assert not sampling.filter(_record("http_endpoints.child"))
+    assert sampling.filter(_record("http_endpoints", logging.WARNING))
+    assert sampling.filter(_record("mcp_endpoints"))
+    assert sampling.filter(_record("crud"))
+    assert metrics.log_records_sampled_out.value() == before + 2
+
+
+def test_queue_handler_drops_when_full_without_formatting():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    before = metrics.log_records_dropped.value()
+    first = _record("crud")
+    handler.emit(first)
+    handler.emit(_record("crud"))
+
+    assert metrics.log_records_dropped.value() == before + 1
+    queued = handler.queue.get_nowait()
+    assert queued is first
+    # Formatting is left to the listener thread
+    assert queued.args == ("x",)
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+import pytest
+
+from loop_monitor import LoopMonitor
+
+
+def _blocking_call():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_captures_stack_of_blocking_call():
+    monitor = LoopMonitor(interval_seconds=0.01, threshold_seconds=0.05)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        _blocking_call()
+        await asyncio.sleep(0.1)
+    finally:
+        monitor.stop()
+
+    stats = monitor.stats()
+    assert stats["blocks"] == 1
+    assert stats["max_lag_ms"] >= 250
+    [block] = stats["recent_blocks"]
+    assert "in _blocking_call" in block["stack"]
+    assert 250 <= block["duration_ms"] < 400
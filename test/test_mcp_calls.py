@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from fastmcp import Client
@@ -41,7 +43,11 @@ async def test_list_services(mocker):
     patch = mocker.patch(
         "src.mcp_endpoints.crud.list_services_brief",
         return_value=[
-            {"endpoint": "http://localhost:8000", "description": "Test MCP service"}
+            {
+                "service_name": "svc1",
+                "endpoint": "http://localhost:8000",
+                "description": "Test MCP service",
+            }
         ],
     )
     async with Client(mcp_server) as client:
@@ -49,10 +55,15 @@ async def test_list_services(mocker):
             "list_services",
             arguments={},
         )
-    assert (
-        result.content[0].text
-        == '[{"endpoint":"http://localhost:8000","description":"Test MCP service"}]'
-    )
+    assert result.structured_content["result"] == [
+        {
+            "service_name": "svc1",
+            "endpoint": "http://localhost:8000",
+            "description": "Test MCP service",
+            "healthy": None,
+            "latency_ms": None,
+        }
+    ]
 
     patch.assert_called_once_with(ANY)
 
@@ -69,3 +80,57 @@ async def test_remove_service(mocker):
         )
     assert result.content[0].text == "Service with name='svc1' removed"
     patch.assert_called_once_with(ANY, "svc1")
+
+
+@pytest.mark.asyncio
+async def test_attach_role_to_tools(mocker):
+    patch = mocker.patch("src.mcp_endpoints.crud.attach_role_to_tools", return_value=3)
+    async with Client(mcp_server) as client:
+        result = await client.call_tool(
+            "attach_role_to_tools",
+            arguments={"role_name": "admin", "service_name": "svc1"},
+        )
+    assert result.content[0].text == "Role with name='admin' attached to 3 tools"
+    patch.assert_called_once_with(
+        ANY, role_name="admin", tool_ids=None, service_name="svc1"
+    )
+
+
+@pytest.mark.asyncio
+async def test_add_service_asynchronous(mocker):
+    mocker.patch(
+        "src.mcp_endpoints.crud.discover_service",
+        return_value=([{"name": "tool1", "description": ""}], "Test MCP service"),
+    )
+    save_patch = mocker.patch("src.mcp_endpoints.crud.add_discovered_service")
+    async with Client(mcp_server) as client:
+        result = await client.call_tool(
+            "add_service",
+            arguments={
+                "service_name": "svc1",
+                "endpoint": "http://localhost:8000",
+                "description": "",
+                "requires_authorization": False,
+                "asynchronous": True,
+            },
+        )
+        job_id = result.content[0].text.split("'")[1]
+        for _ in range(100):
+            status = (
+                await client.call_tool("get_job_status", arguments={"job_id": job_id})
+            ).data
+            if status["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.01)
+
+    assert status["step"] == "notifying"
+    assert status["result"] == {"service_name": "svc1", "tools_count": 1}
+    save_patch.assert_called_once_with(
+        ANY,
+        service_name="svc1",
+        endpoint="http://localhost:8000",
+        description="Test MCP service",
+        requires_authorization=False,
+        method_authorization="",
+        tools=[{"name": "tool1", "description": ""}],
+    )
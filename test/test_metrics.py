@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from fastmcp import Client
+from fastmcp.exceptions import ToolError
+
+from metrics import Counter, Histogram, Registry, ToolMetricsMiddleware, tool_calls
+from src.main import mcp_server
+
+
+def test_render_exposition_format():
+    registry = Registry()
+    requests = registry.register(
+        Counter("requests_total", "Requests.", ("route", "status"))
+    )
+    latency = registry.register(
+        Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    )
+    requests.inc("/a", "200")
+    requests.inc("/a", "200")
+    latency.observe(0.05, "/a")
+    latency.observe(0.5, "/a")
+    latency.observe(5, "/a")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a",status="200"} 2',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 2',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+        'latency_seconds_sum{route="/a"} 5.55',
+        'latency_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_metrics_endpoint_counts_routes():
+    client = TestClient(mcp_server.http_app())
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'registry_http_requests_total{route="/health",method="GET",status="200"}'
+        in response.text
+    )
+    assert 'registry_cache_hit_ratio{cache="bootstrap_role"}' in response.text
+    assert "registry_db_pool_checkouts_total" in response.text
+
+
+@pytest.mark.asyncio
+async def test_unknown_tool_names_are_labelled_other():
+    async with Client(mcp_server) as client:
+        with pytest.raises(ToolError):
+            await client.call_tool("no_such_tool_1", {})
+        with pytest.raises(ToolError):
+            await client.call_tool("no_such_tool_2", {})
+    assert tool_calls.value("other", "error") >= 2
+    assert tool_calls.value("no_such_tool_1", "error") == 0
+
+
+@pytest.mark.asyncio
+async def test_tool_names_are_read_once(mocker):
+    server = mocker.Mock()
+    server.get_tools = mocker.AsyncMock(return_value={"list_roles": None})
+    middleware = ToolMetricsMiddleware(server)
+
+    async def call_next(context):
+        return "ok"
+
+    for name in ("list_roles", "list_roles", "unlisted_tool"):
+        message = SimpleNamespace(name=name)
+        await middleware.on_call_tool(SimpleNamespace(message=message), call_next)
+    server.get_tools.assert_awaited_once()
+    assert tool_calls.value("list_roles", "ok") >= 2
+    assert tool_calls.value("unlisted_tool", "ok") == 0
@@ -0,0 +1,168 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+import changes
+import crud
+import models
+from permissions import PermissionIndex
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    SessionLocal = sessionmaker(bind=db_engine, autoflush=False)
+    with SessionLocal() as db:
+        service = models.MCPService(
+            service_name="svc1",
+            endpoint="http://svc1:8000",
+            description="svc1",
+            requires_authorization=False,
+        )
+        db.add_all(models.MCPTool(service=service, name=f"tool{i}") for i in range(3))
+        db.add(models.MCPUser(user_id="alice"))
+        db.commit()
+        crud.create_role(db, role_name="agent")
+        crud.attach_role_to_tools(db, role_name="agent", tool_ids=[1, 2])
+        crud.assign_role_to_user(db, user_id="alice", role_name="agent")
+    yield SessionLocal
+
+
+@pytest.fixture
+def index(session_factory):
+    index = PermissionIndex(session_factory)
+    changes.subscribe(index.apply)
+    yield index
+    changes._listeners.remove(index.apply)
+
+
+def test_can_use_checks_without_database(index, db_engine):
+    index.load()
+    statements = []
+    event.listen(
+        db_engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+
+    assert index.can_use("alice", "svc1", "tool0") is True
+    assert index.can_use("alice", "svc1", "tool2") is False
+    assert index.can_use("bob", "svc1", "tool0") is False
+    assert index.can_use("alice", "svc2", "tool0") is False
+    assert statements == []
+
+
+def test_index_follows_committed_changes(index, session_factory):
+    index.load()
+    with session_factory() as db:
+        crud.attach_role_to_tools(db, role_name="agent", service_name="svc1")
+        assert index.can_use("alice", "svc1", "tool2") is True
+
+        crud.detach_role_from_tool(db, role_name="agent", tool_id=1)
+        assert index.can_use("alice", "svc1", "tool0") is False
+
+        crud.remove_role_from_user(db, user_id="alice", role_name="agent")
+        assert index.can_use("alice", "svc1", "tool1") is False
+
+        crud.assign_role_to_user(db, user_id="alice", role_name="agent")
+        crud.delete_service(db, "svc1")
+        assert index.can_use("alice", "svc1", "tool1") is False
+
+
+def test_index_resolves_inherited_tools(index, session_factory):
+    with session_factory() as db:
+        crud.create_role(db, role_name="intern", parent_role_name="agent")
+        crud.assign_role_to_user(db, user_id="alice", role_name="intern")
+        assert index.can_use("alice", "svc1", "tool0") is True
+
+        crud.attach_role_to_tool(db, role_name="agent", tool_id=3)
+        assert index.can_use("alice", "svc1", "tool2") is True
+
+        crud.set_role_parent(db, role_name="intern", parent_role_name=None)
+        assert index.can_use("alice", "svc1", "tool0") is False
+
+
+def test_index_applies_catalog_and_role_changes_without_reloading(
+    index, session_factory, mocker
+):
+    index.load()
+    load = mocker.spy(index, "load")
+    with session_factory() as db:
+        crud.add_discovered_service(
+            db,
+            service_name="svc2",
+            endpoint="http://svc2:8000",
+            description="svc2",
+            requires_authorization=False,
+            method_authorization="",
+            tools=[{"name": "search"}],
+        )
+        crud.create_role(db, role_name="intern", parent_role_name="agent")
+        crud.attach_role_to_tools(db, role_name="intern", service_name="svc2")
+        crud.assign_role_to_users(db, role_name="intern", user_ids=["alice", "bob"])
+        assert index.can_use("alice", "svc2", "search") is True
+        assert index.can_use("alice", "svc1", "tool0") is True
+        assert index.can_use("bob", "svc2", "search") is False
+
+        crud.remove_role(db, role_name="agent")
+        assert index.can_use("alice", "svc1", "tool0") is False
+        assert index.can_use("alice", "svc2", "search") is True
+
+        # Bits of removed tools are reused by new ones
+        crud.delete_service(db, "svc1")
+        crud.add_discovered_service(
+            db,
+            service_name="svc3",
+            endpoint="http://svc3:8000",
+            description="svc3",
+            requires_authorization=False,
+            method_authorization="",
+            tools=[{"name": "fetch"}],
+        )
+        assert index.can_use("alice", "svc3", "fetch") is False
+        # svc3's tool got the bit freed by svc1, not a fifth one
+        assert max(index._tool_bits.values()) < 4
+    load.assert_not_called()
+
+
+def test_added_service_is_read_outside_the_lock(index, session_factory, mocker):
+    index.load()
+    read = index._read_service_tools
+    locked = []
+
+    def read_service_tools(service_name):
+        locked.append(index._lock.locked())
+        if len(locked) == 1:
+            # Another commit is applied meanwhile: the read is repeated
+            index.apply(changes.Change("user", "added", {"user_ids": ["bob"]}))
+        return read(service_name)
+
+    mocker.patch.object(index, "_read_service_tools", side_effect=read_service_tools)
+    with session_factory() as db:
+        crud.add_discovered_service(
+            db,
+            service_name="svc2",
+            endpoint="http://svc2:8000",
+            description="svc2",
+            requires_authorization=False,
+            method_authorization="",
+            tools=[{"name": "search"}],
+        )
+    assert locked == [False, False]
+    assert index._service_tools["svc2"].keys() == {"search"}
+
+
+@pytest.mark.asyncio
+async def test_ensure_loaded_loads_off_the_event_loop(index, mocker):
+    threads = []
+
+    def load():
+        threads.append(threading.get_ident())
+        index._loaded = True
+
+    mocker.patch.object(index, "load", side_effect=load)
+
+    await index.ensure_loaded()
+    await index.ensure_loaded()
+
+    assert len(threads) == 1
+    assert threads[0] != threading.get_ident()
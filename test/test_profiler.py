@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from profiler import ProfilerBusyError, RequestProfiler, SamplingProfiler
+from src.main import mcp_server
+
+
+def _spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler_collapses_stacks_of_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    worker.start()
+    try:
+        stacks = SamplingProfiler(interval_seconds=0.001).profile(0.1)
+    finally:
+        stop.set()
+        worker.join()
+
+    spinner = [line for line in stacks.splitlines() if line.startswith("spinner;")]
+    assert spinner
+    assert any("_spin (test_profiler.py:" in line for line in spinner)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in spinner)
+
+
+def test_sampling_profiler_runs_one_profile_at_a_time():
+    profiler = SamplingProfiler()
+    thread = threading.Thread(target=profiler.profile, args=(0.2,))
+    thread.start()
+    time.sleep(0.05)
+    with pytest.raises(ProfilerBusyError):
+        profiler.profile(0.1)
+    thread.join()
+
+
+@pytest.mark.asyncio
+async def test_request_profiler_keeps_reports():
+    profiler = RequestProfiler(history=1)
+
+    async def handler():
+        return sum(range(1000))
+
+    assert await profiler.run("first", handler) == 499500
+    assert await profiler.run("second", handler) == 499500
+    [report] = profiler.reports()
+    assert report["name"] == "second"
+    assert "function calls" in report["stats"]
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/debug/stats",
+        "/debug/queries",
+        "/debug/traces",
+        "/debug/profile",
+        "/debug/profile/requests",
+    ],
+)
+def test_debug_routes_require_admin_token(mocker, path):
+    client = TestClient(mcp_server.http_app())
+    assert client.get(path).status_code == 404
+
+    mocker.patch("src.http_endpoints.envs.ADMIN_TOKEN", "secret")
+    assert client.get(path).status_code == 401
+    assert (
+        client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    )
+
+
+def test_profile_routes_require_admin_token(mocker):
+    client = TestClient(mcp_server.http_app())
+    assert client.get("/debug/profile").status_code == 404
+
+    mocker.patch("src.http_endpoints.envs.ADMIN_TOKEN", "secret")
+    admin = {"Authorization": "Bearer secret"}
+    assert client.get("/debug/profile", params={"seconds": "0.01"}).status_code == 401
+    response = client.get("/debug/profile", params={"seconds": "0.05"}, headers=admin)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    assert client.get("/health", headers={**admin, "X-Profile": "1"}).status_code == 200
+    reports = client.get("/debug/profile/requests", headers=admin).json()["reports"]
+    assert reports[0]["name"] == "http /health"
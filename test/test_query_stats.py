@@ -0,0 +1,56 @@
+import logging
+
+from fastapi.testclient import TestClient
+
+import models
+from query_stats import QueryStats
+from src.main import mcp_server
+
+
+def test_flags_n_plus_one_and_budget(db, db_engine, caplog):
+    service = models.MCPService(
+        service_name="svc1",
+        endpoint="http://localhost:8000",
+        description="Test MCP service",
+        requires_authorization=False,
+    )
+    db.add(service)
+    db.add_all(models.MCPTool(service=service, name=f"tool{i}") for i in range(5))
+    db.commit()
+    db.expire_all()
+    query_stats = QueryStats(n_plus_one_threshold=3, budget=4)
+    query_stats.install(db_engine)
+
+    with (
+        caplog.at_level(logging.WARNING, logger="query_stats"),
+        query_stats.track("lazy") as scope,
+    ):
+        # One lazy load of `roles` per tool
+        for tool in db.query(models.MCPTool).all():
+            _ = tool.roles
+
+    assert scope.statements == 6
+    assert len(scope.n_plus_one) == 1
+    assert "test_query_stats.py" in scope.n_plus_one[0]
+    assert "Possible N+1 in lazy" in caplog.text
+    assert "Query budget exceeded by lazy: 6 statements" in caplog.text
+    assert query_stats.stats()["lazy"] == {
+        "calls": 1,
+        "statements": 6,
+        "avg_statements": 6.0,
+        "max_statements": 6,
+        "seconds": query_stats.stats()["lazy"]["seconds"],
+        "over_budget": 1,
+        "n_plus_one": 1,
+    }
+
+
+def test_debug_queries_endpoint(mocker):
+    mocker.patch("src.http_endpoints.envs.ADMIN_TOKEN", "secret")
+    client = TestClient(mcp_server.http_app())
+    client.get("/list_users")
+    stats = client.get(
+        "/debug/queries", headers={"Authorization": "Bearer secret"}
+    ).json()
+    assert stats["http /list_users"]["calls"] >= 1
+    assert stats["http /list_users"]["max_statements"] >= 1
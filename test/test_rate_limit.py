@@ -0,0 +1,221 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+from fastmcp import Client
+from fastmcp.exceptions import ToolError
+
+# The instance the HTTP routes use (they import it from `main`)
+from main import admission
+from rate_limit import (
+    AdmissionControl,
+    ConcurrencyLimiter,
+    OverloadedError,
+    RateLimitedError,
+    TokenBucketLimiter,
+)
+from src.main import admission as tool_admission
+from src.main import mcp_server
+
+
+def test_token_bucket_allows_burst_then_refills(mocker):
+    now = mocker.patch("rate_limit.time.monotonic", return_value=100.0)
+    limiter = TokenBucketLimiter(rate=2, burst=3)
+
+    assert [limiter.acquire("u1") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("u1") == pytest.approx(0.5)
+    # Other clients have their own bucket
+    assert limiter.acquire("u2") == 0
+
+    now.return_value = 100.5
+    assert limiter.acquire("u1") == 0
+    assert limiter.acquire("u1") > 0
+
+
+def test_token_bucket_evicts_least_recently_seen_keys():
+    limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=2)
+    limiter.acquire("u1")
+    limiter.acquire("u2")
+    limiter.acquire("u3")
+
+    # u1 was evicted and starts over with a full bucket
+    assert limiter.acquire("u1") == 0
+    assert limiter.acquire("u3") > 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_rejects_when_queue_full_or_wait_too_long():
+    limiter = ConcurrencyLimiter(limit=1, max_queue=1, max_wait_seconds=0.05)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert limiter.stats() == {"limit": 1, "in_flight": 1, "waiting": 1}
+
+    with pytest.raises(OverloadedError) as exc:
+        async with limiter.slot():
+            pass
+    assert exc.value.reason == "queue_full"
+
+    with pytest.raises(OverloadedError) as exc:
+        await waiter
+    assert exc.value.reason == "queue_timeout"
+
+    release.set()
+    await holder
+    async with limiter.slot():
+        assert limiter.stats()["in_flight"] == 1
+
+
+def test_admission_sheds_while_loop_lags():
+    monitor = MagicMock(last_lag=0.3)
+    control = AdmissionControl(shed_loop_lag_seconds=0.2, loop_monitor=monitor)
+
+    with pytest.raises(OverloadedError):
+        control.admit("/token", "user:u1")
+    monitor.last_lag = 0.01
+    control.admit("/token", "user:u1")
+
+
+def test_agent_route_rate_limited_per_user(mocker):
+    mocker.patch.object(admission, "limiter", TokenBucketLimiter(rate=0.01, burst=1))
+    mocker.patch(
+        "src.http_endpoints.crud.get_role_default_system_prompt", return_value=""
+    )
+    client = TestClient(mcp_server.http_app())
+
+    response = client.post("/role_for_user", json={"user_id": "u1"})
+    assert response.status_code != 429
+    response = client.post("/role_for_user", json={"user_id": "u1"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert client.post("/role_for_user", json={"user_id": "u2"}).status_code != 429
+    # Not an agent route
+    assert client.get("/health").status_code == 200
+
+
+def test_agent_route_rate_limit_keys_on_address(mocker):
+    mocker.patch.object(admission, "limiter", TokenBucketLimiter(rate=0.01, burst=1))
+    mocker.patch(
+        "src.http_endpoints.crud.get_role_default_system_prompt", return_value=""
+    )
+    app = mcp_server.http_app()
+    victim = TestClient(app, client=("10.0.0.1", 5000))
+    spoofer = TestClient(app, client=("10.0.0.2", 5000))
+
+    assert spoofer.post("/role_for_user", json={"user_id": "u1"}).status_code != 429
+    assert spoofer.post("/role_for_user", json={"user_id": "u1"}).status_code == 429
+    # Naming u1 from another address does not use up u1's requests
+    assert victim.post("/role_for_user", json={"user_id": "u1"}).status_code != 429
+
+
+def test_agent_route_rate_limited_per_address(mocker):
+    mocker.patch.object(
+        admission, "address_limiter", TokenBucketLimiter(rate=0.01, burst=2)
+    )
+    mocker.patch(
+        "src.http_endpoints.crud.get_role_default_system_prompt", return_value=""
+    )
+    app = mcp_server.http_app()
+    client = TestClient(app, client=("10.0.0.1", 5000))
+
+    assert client.post("/role_for_user", json={"user_id": "u1"}).status_code != 429
+    assert client.post("/role_for_user", json={"user_id": "u2"}).status_code != 429
+    # Rotating user_ids does not lift the address's limit
+    assert client.post("/role_for_user", json={"user_id": "u3"}).status_code == 429
+    other = TestClient(app, client=("10.0.0.2", 5000))
+    assert other.post("/role_for_user", json={"user_id": "u3"}).status_code != 429
+
+
+def test_admission_checks_only_when_configured():
+    assert not AdmissionControl().checks
+    assert not AdmissionControl(shed_loop_lag_seconds=0.2).checks
+    assert AdmissionControl(rate=1).checks
+    assert AdmissionControl(address_rate=1).rate_limits
+    assert AdmissionControl(shed_loop_lag_seconds=0.2, loop_monitor=MagicMock()).checks
+
+
+def test_agent_route_shed_with_503(mocker):
+    mocker.patch.object(admission, "shed_loop_lag_seconds", 0.1)
+    mocker.patch.object(admission, "loop_monitor", MagicMock(last_lag=1.0))
+    client = TestClient(mcp_server.http_app())
+
+    response = client.get("/list_services")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_expensive_tool_rejected_over_concurrency_cap(mocker):
+    limiter = ConcurrencyLimiter(limit=1, max_queue=0, max_wait_seconds=1)
+    mocker.patch.object(tool_admission, "expensive", limiter)
+    release = asyncio.Event()
+
+    async def create_or_update_service(*args, **kwargs):
+        await release.wait()
+        return MagicMock(service_name="svc1", tools=[])
+
+    mocker.patch(
+        "src.mcp_endpoints.crud.create_or_update_service",
+        side_effect=create_or_update_service,
+    )
+    arguments = {
+        "service_name": "svc1",
+        "endpoint": "http://localhost:8000",
+        "description": "Test MCP service",
+        "requires_authorization": False,
+    }
+    async with Client(mcp_server) as client:
+        first = asyncio.create_task(client.call_tool("add_service", arguments))
+        for _ in range(100):
+            if limiter.in_flight:
+                break
+            await asyncio.sleep(0.01)
+        with pytest.raises(ToolError, match="queue_full"):
+            await client.call_tool("add_service", arguments)
+        # Cheap tools are not capped
+        await client.call_tool("list_services", {})
+        release.set()
+        await first
+
+
+@pytest.mark.asyncio
+async def test_agent_tool_rate_limited_per_user(mocker):
+    mocker.patch.object(
+        tool_admission, "limiter", TokenBucketLimiter(rate=0.01, burst=1)
+    )
+    mocker.patch("src.mcp_endpoints.crud.set_user_service_token")
+    arguments = {"service_name": "svc1", "user_id": "u1", "token": "t"}
+    async with Client(mcp_server) as client:
+        await client.call_tool("authorize_user_to_service", arguments)
+        with pytest.raises(ToolError, match="Rate limit exceeded"):
+            await client.call_tool("authorize_user_to_service", arguments)
+
+
+@pytest.mark.asyncio
+async def test_agent_tool_rate_limited_per_address(mocker):
+    mocker.patch.object(
+        tool_admission, "address_limiter", TokenBucketLimiter(rate=0.01, burst=1)
+    )
+    mocker.patch("src.mcp_endpoints.crud.set_user_service_token")
+    async with Client(mcp_server) as client:
+        await client.call_tool(
+            "authorize_user_to_service",
+            {"service_name": "svc1", "user_id": "u1", "token": "t"},
+        )
+        with pytest.raises(ToolError, match="Rate limit exceeded"):
+            await client.call_tool(
+                "authorize_user_to_service",
+                {"service_name": "svc1", "user_id": "u2", "token": "t"},
+            )
+
+
+def test_rate_limited_error_message():
+    assert str(RateLimitedError(2.5)) == "Rate limit exceeded, retry in 2.5s"
@@ -0,0 +1,169 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import changes
+import crud
+from replication import Follower, ForwardWritesMiddleware, build_changes
+from storage import Base, get_engine_and_sessionmaker
+
+
+def _database(path):
+    # File-based: the follower applies changes from a worker thread
+    engine, SessionLocal = get_engine_and_sessionmaker(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return SessionLocal
+
+
+@pytest.fixture
+def primary(tmp_path):
+    return _database(tmp_path / "primary.db")
+
+
+@pytest.fixture
+def follower(tmp_path, primary):
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/replication/changes"
+        assert request.headers["Authorization"] == "Bearer secret"
+        since = request.url.params.get("since")
+        with primary() as db:
+            return httpx.Response(
+                200, json=build_changes(db, since=int(since) if since else None)
+            )
+
+    return Follower(
+        _database(tmp_path / "follower.db"),
+        primary_url="http://primary",
+        replication_token="secret",
+        transport=httpx.MockTransport(handler),
+    )
+
+
+@pytest.mark.asyncio
+async def test_follower_mirrors_primary(primary, follower):
+    with primary() as db:
+        crud.add_discovered_service(
+            db,
+            service_name="svc",
+            endpoint="http://svc:8000",
+            description="Service",
+            requires_authorization=True,
+            method_authorization="Bearer",
+            tools=[{"name": "read"}, {"name": "write"}],
+        )
+        crud.create_role(db, role_name="base")
+        crud.create_role(db, role_name="admin", parent_role_name="base")
+        read_id = crud.get_tools(db, service_name="svc")[0].id
+        crud.attach_role_to_tool(db, role_name="base", tool_id=read_id)
+        crud.get_or_create_user(db, user_id="alice")
+        crud.assign_role_to_user(db, user_id="alice", role_name="admin")
+
+    await follower.sync_once()
+    with follower.session_factory() as db:
+        assert crud.list_services_for_role(db, user_id="alice")[0]["tools_count"] == 1
+        assert [r.name for r in crud.list_roles(db)] == ["base", "admin"]
+        assert crud.list_roles(db)[1].parent.name == "base"
+
+    received = []
+    changes.subscribe(received.append)
+    try:
+        with primary() as db:
+            crud.set_user_service_token(
+                db, user_id="alice", service_name="svc", token="t0k"
+            )
+            crud.detach_role_from_tool(db, role_name="base", tool_id=read_id)
+            version = crud.get_catalog_changes(db)["version"]
+        # Users registered on the follower are replaced by the primary's rows
+        with follower.session_factory() as db:
+            crud.get_or_create_user(db, user_id="zed")
+            crud.get_or_create_user(db, user_id="bob")
+        with primary() as db:
+            crud.get_or_create_user(db, user_id="bob")
+        received.clear()
+
+        await follower.sync_once()
+    finally:
+        changes._listeners.remove(received.append)
+
+    assert follower.version > version
+    assert {(c.entity, c.action) for c in received} == {
+        ("token", "updated"),
+        ("tool_roles", "removed"),
+        ("user", "added"),
+    }
+    with follower.session_factory() as db:
+        assert crud.get_user_service_token(db, user_id="alice", service_name="svc") == (
+            "t0k"
+        )
+        assert crud.list_services_for_role(db, user_id="alice") == []
+        assert sorted(u.user_id for u in crud.list_users(db)) == ["alice", "bob"]
+
+
+@pytest.mark.asyncio
+async def test_follower_applies_rows_named_by_changes(primary, follower):
+    with primary() as db:
+        for name in ("svc1", "svc2"):
+            crud.add_discovered_service(
+                db,
+                service_name=name,
+                endpoint=f"http://{name}:8000",
+                description=name,
+                requires_authorization=False,
+                method_authorization="",
+                tools=[{"name": f"tool{i}"} for i in range(3)],
+            )
+        crud.create_role(db, role_name="base")
+        crud.create_role(db, role_name="agent", parent_role_name="base")
+        version = build_changes(db)["version"]
+    await follower.sync_once()
+
+    with primary() as db:
+        crud.attach_role_to_tools(db, role_name="agent", tool_ids=[1, 2])
+        payload = build_changes(db, since=version)
+        assert payload["tables"] == {}
+        assert [(s["table"], len(s["rows"])) for s in payload["scopes"]] == [
+            ("mcp_tool_roles", 2)
+        ]
+
+        crud.delete_service(db, "svc2")
+        payload = build_changes(db, since=payload["version"])
+        assert [(s["table"], s["rows"]) for s in payload["scopes"]] == [
+            ("mcp_services", [])
+        ]
+        crud.remove_role(db, role_name="base")
+        expected = crud.get_catalog_snapshot(db)
+
+    await follower.sync_once()
+    with follower.session_factory() as db:
+        assert crud.get_catalog_snapshot(db) == expected
+        assert crud.list_tools_by_role(db, role_name="agent")[0].id == 1
+
+
+@pytest.mark.asyncio
+async def test_only_writing_tools_are_forwarded(follower, mocker):
+    forward = mocker.patch.object(follower, "forward_tool", return_value="primary")
+    middleware = ForwardWritesMiddleware(follower)
+
+    async def call_next(context):
+        return "local"
+
+    async def call(name):
+        message = SimpleNamespace(name=name, arguments={"role_name": "agent"})
+        return await middleware.on_call_tool(
+            SimpleNamespace(message=message), call_next
+        )
+
+    assert await call("create_role") == "primary"
+    forward.assert_called_once_with("create_role", {"role_name": "agent"})
+    for name in ("list_users", "list_roles", "list_services", "get_tools"):
+        assert await call(name) == "local"
+    assert forward.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_forwarded_tools_are_registered():
+    from src.main import mcp_server
+
+    tools = await mcp_server.get_tools()
+    assert ForwardWritesMiddleware.FORWARDED_TOOLS <= tools.keys()
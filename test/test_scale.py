@@ -0,0 +1,248 @@
+"""Scale regression tests: crud against a large synthetic catalog.
+
+Each crud function runs against 10k services, 200k tools and 1M users with a
+token each, and must stay within a statement count and wall time, and its
+hot lookups must use indexes (checked with EXPLAIN) rather than scan the big
+tables. Seeding takes about a minute, so the suite is opt-in:
+
+    SCALE_TESTS=1 pytest test/test_scale.py
+    SCALE_TESTS=0.1 pytest test/test_scale.py  # a tenth of the rows
+
+SCALE_TESTS_DATABASE_URL runs it against another empty database (e.g.
+Postgres) instead of a temporary SQLite file.
+"""
+
+import os
+import re
+import time
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import crud
+from bench import synthetic
+from storage import get_engine_and_sessionmaker, init_db
+
+FACTOR = float(os.getenv("SCALE_TESTS", "0") or "0")
+pytestmark = pytest.mark.skipif(
+    FACTOR <= 0, reason="set SCALE_TESTS=1 to run the scale tests"
+)
+
+SCALE = synthetic.Scale(
+    services=max(10, int(10_000 * FACTOR)),
+    tools_per_service=20,
+    roles=100,
+    users=max(100, int(1_000_000 * FACTOR)),
+    tokens_per_user=1,
+)
+# Tables too big to scan on a request path
+BIG_TABLES = {
+    "mcp_services",
+    "mcp_tools",
+    "mcp_tool_roles",
+    "mcp_users",
+    "user_access_tokens",
+}
+
+USER = synthetic.user_id(SCALE.users // 2)
+# A service the user holds a token for
+TOKEN_SERVICE = synthetic.service_name(
+    synthetic.token_services(SCALE.users // 2, SCALE)[0]
+)
+SERVICE = synthetic.service_name(SCALE.services // 2)
+ROLE = synthetic.role_name(SCALE.roles // 2)
+
+
+@pytest.fixture(scope="module")
+def scale_engine(tmp_path_factory):
+    database_url = os.getenv("SCALE_TESTS_DATABASE_URL") or (
+        f"sqlite:///{tmp_path_factory.mktemp('scale')}/scale.db"
+    )
+    engine, _ = get_engine_and_sessionmaker(database_url)
+    init_db(engine)
+    synthetic.seed(engine, SCALE)
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    yield engine
+    engine.dispose()
+
+
+def _scanned_tables(conn, statement: str, parameters) -> set[str]:
+    """Return tables the statement reads in full, per the database's plan."""
+    if conn.dialect.name == "sqlite":
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        # SCAN <table or alias> [USING [COVERING] INDEX ...]; SEARCH is an index lookup
+        found = {
+            match.group(1)
+            for *_, detail in plan
+            if (match := re.match(r"SCAN (\w+)", detail))
+        }
+    else:
+        plan = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        found = {
+            match.group(1)
+            for (line,) in plan
+            if (match := re.search(r"Seq Scan on (\w+)", line))
+        }
+    # Aliases such as mcp_users_1 name the aliased table
+    return {re.sub(r"_\d+$", "", name) for name in found}
+
+
+@pytest.fixture
+def measure(scale_engine):
+    """`with measure(statements, ms, no_scan) as db: ...` runs a bounded call.
+
+    Fails if the block runs more than `statements` statements, takes more than
+    `ms` milliseconds, or if one of its statements scans a table in `no_scan`.
+    """
+    executed: list[tuple[str, object]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            executed.append((statement, parameters))
+
+    @contextmanager
+    def check(statements: int, ms: float, no_scan: set[str] = BIG_TABLES):
+        with Session(bind=scale_engine) as db:
+            event.listen(scale_engine, "before_cursor_execute", record)
+            start = time.perf_counter()
+            try:
+                yield db
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                event.remove(scale_engine, "before_cursor_execute", record)
+        queries = [(s, p) for s, p in executed if not s.lstrip().startswith("INSERT")]
+        assert len(executed) <= statements, (
+            f"{len(executed)} statements ran, at most {statements} expected:\n"
+            + "\n".join(statement for statement, _ in executed)
+        )
+        assert elapsed <= ms, f"took {elapsed:.0f}ms, at most {ms}ms expected"
+        with scale_engine.connect() as conn:
+            for statement, parameters in queries:
+                scanned = _scanned_tables(conn, statement, parameters) & no_scan
+                assert not scanned, f"{statement}\nscans {', '.join(sorted(scanned))}"
+
+    return check
+
+
+def _read(name, call, statements, ms, no_scan=BIG_TABLES):
+    return pytest.param(call, statements, ms, no_scan, id=name)
+
+
+READS = [
+    _read(
+        "get_role_for_user", lambda db: crud.get_role_for_user(db, user_id=USER), 1, 50
+    ),
+    _read(
+        "get_or_create_user",
+        lambda db: crud.get_or_create_user(db, user_id=USER),
+        1,
+        50,
+    ),
+    _read(
+        "get_user_service_token",
+        lambda db: crud.get_user_service_token(
+            db, user_id=USER, service_name=TOKEN_SERVICE
+        ),
+        1,
+        50,
+    ),
+    _read(
+        "get_service_connection",
+        lambda db: crud.get_service_connection(
+            db, service_name=TOKEN_SERVICE, user_id=USER
+        ),
+        1,
+        50,
+    ),
+    _read(
+        "get_service_auth_method",
+        lambda db: crud.get_service_auth_method(db, service_name=SERVICE),
+        1,
+        50,
+    ),
+    _read(
+        "get_service_requires_authorization",
+        lambda db: crud.get_service_requires_authorization(db, service_name=SERVICE),
+        1,
+        50,
+    ),
+    _read("get_tools", lambda db: crud.get_tools(db, service_name=SERVICE), 2, 100),
+    _read("get_user_access", lambda db: crud.get_user_access(db, user_id=USER), 2, 50),
+    _read(
+        "get_role_default_system_prompt",
+        lambda db: crud.get_role_default_system_prompt(db, role_name=ROLE),
+        1,
+        50,
+    ),
+    # A role's tools are read through mcp_tool_roles.role_id; the tools and
+    # services they belong to are then looked up by primary key
+    _read(
+        "list_tools_by_role",
+        lambda db: crud.list_tools_by_role(db, role_name=ROLE),
+        1,
+        300,
+    ),
+    _read(
+        "get_role_catalog", lambda db: crud.get_role_catalog(db, role_name=ROLE), 2, 500
+    ),
+    _read(
+        "list_services_for_role",
+        lambda db: crud.list_services_for_role(db, role_name=ROLE),
+        1,
+        300,
+    ),
+    _read(
+        "list_services_for_user",
+        lambda db: crud.list_services_for_role(db, user_id=USER),
+        1,
+        300,
+    ),
+    _read(
+        "get_catalog_changes",
+        lambda db: crud.get_catalog_changes(db, since=0),
+        3,
+        100,
+    ),
+    # Whole-catalog reads scan by design; only their cost is bounded
+    _read("list_services_brief", crud.list_services_brief, 1, 300, set()),
+    _read("get_catalog_snapshot", crud.get_catalog_snapshot, 3, 15_000, set()),
+]
+
+
+@pytest.mark.parametrize("call, statements, ms, no_scan", READS)
+def test_crud_reads_at_scale(measure, call, statements, ms, no_scan):
+    with measure(statements, ms, no_scan) as db:
+        call(db)
+
+
+def test_set_user_service_token_at_scale(measure):
+    with measure(6, 100) as db:
+        crud.set_user_service_token(
+            db, user_id=USER, service_name=TOKEN_SERVICE, token="rotated"
+        )
+
+
+def test_register_user_at_scale(measure):
+    with measure(4, 100) as db:
+        crud.get_or_create_user(db, user_id="scale-new-user")
+
+
+def test_assign_role_to_users_at_scale(measure):
+    user_ids = [synthetic.user_id(i) for i in range(0, SCALE.users, SCALE.users // 100)]
+    with measure(4, 200) as db:
+        crud.assign_role_to_users(db, role_name=ROLE, user_ids=user_ids)
+
+
+def test_attach_role_to_tools_at_scale(measure):
+    with measure(4, 200) as db:
+        crud.attach_role_to_tools(db, role_name=ROLE, service_name=SERVICE)
+
+
+def test_delete_service_at_scale(measure):
+    # Cascades to the service's tools, their role bindings and its tokens
+    with measure(4, 1000) as db:
+        crud.delete_service(db, synthetic.service_name(SCALE.services - 1))
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def load():
+        runs.append(1)
+        release.wait(5)
+        return {"services": []}
+
+    calls = [asyncio.create_task(flight.do(("list", "admin"), load)) for _ in range(5)]
+    other = asyncio.create_task(flight.do(("list", "guest"), load))
+    await asyncio.sleep(0.05)
+    release.set()
+    results = await asyncio.gather(*calls, other)
+
+    assert len(runs) == 2
+    assert all(result is results[0] for result in results[:5])
+    assert flight.stats() == {
+        "calls": 6,
+        "executions": 2,
+        "coalesced": 4,
+        "in_flight": 0,
+    }
+
+    # Nothing is cached once the call finished
+    await flight.do(("list", "admin"), load)
+    assert len(runs) == 3
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_coalesced_caller():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    calls = [asyncio.create_task(flight.do("key", fail)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    release.set()
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_first_caller_does_not_cancel_followers():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def load():
+        release.wait(5)
+        return "result"
+
+    first = asyncio.create_task(flight.do("key", load))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(flight.do("key", load))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await follower == "result"
+    assert first.cancelled()
+    assert flight.stats()["executions"] == 1
@@ -0,0 +1,128 @@
+import pytest
+from sqlalchemy import inspect, text
+
+import crud
+from storage import get_engine_and_sessionmaker, init_db
+
+LEGACY_SCHEMA = [
+    """CREATE TABLE mcp_services (
+        id INTEGER PRIMARY KEY, service_name VARCHAR(255) NOT NULL UNIQUE,
+        endpoint VARCHAR(512) NOT NULL UNIQUE, description VARCHAR(1024) NOT NULL,
+        requires_authorization BOOLEAN NOT NULL, method_authorization VARCHAR(32) NOT NULL,
+        created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)""",
+    """CREATE TABLE mcp_tools (
+        id INTEGER PRIMARY KEY,
+        service_name VARCHAR(255) NOT NULL
+            REFERENCES mcp_services (service_name) ON DELETE CASCADE,
+        name VARCHAR(255) NOT NULL, description VARCHAR(1024) NOT NULL,
+        CONSTRAINT uq_tool_per_service UNIQUE (service_name, name))""",
+    "CREATE INDEX ix_mcp_tools_service_name ON mcp_tools (service_name)",
+    """CREATE TABLE mcp_roles (
+        id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL UNIQUE,
+        default_system_prompt VARCHAR(8192) NOT NULL DEFAULT '')""",
+    """CREATE TABLE mcp_tool_roles (
+        id INTEGER PRIMARY KEY,
+        tool_id INTEGER NOT NULL REFERENCES mcp_tools (id) ON DELETE CASCADE,
+        role_id INTEGER NOT NULL REFERENCES mcp_roles (id) ON DELETE CASCADE,
+        CONSTRAINT uq_role_per_tool UNIQUE (tool_id, role_id))""",
+    """CREATE TABLE mcp_users (
+        id INTEGER PRIMARY KEY, user_id VARCHAR(255) NOT NULL UNIQUE,
+        role_id_fk INTEGER REFERENCES mcp_roles (id) ON DELETE SET NULL)""",
+    """CREATE TABLE user_access_tokens (
+        id INTEGER PRIMARY KEY,
+        user_id_fk INTEGER NOT NULL REFERENCES mcp_users (id) ON DELETE CASCADE,
+        service_name VARCHAR(255) NOT NULL
+            REFERENCES mcp_services (service_name) ON DELETE CASCADE,
+        token VARCHAR(2048) NOT NULL,
+        created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL,
+        CONSTRAINT uq_token_per_user_service UNIQUE (user_id_fk, service_name))""",
+    """INSERT INTO mcp_services VALUES (7, 'svc1', 'http://localhost:8000', 'd', 1,
+        'Bearer', '2025-01-01 00:00:00.000000', '2025-01-01 00:00:00.000000')""",
+    "INSERT INTO mcp_tools VALUES (3, 'svc1', 'tool1', '')",
+    "INSERT INTO mcp_roles VALUES (1, 'admin', '')",
+    "INSERT INTO mcp_tool_roles VALUES (1, 3, 1)",
+    "INSERT INTO mcp_users VALUES (1, 'alice', 1)",
+    """INSERT INTO user_access_tokens VALUES (1, 1, 'svc1', 'secret',
+        '2025-01-01 00:00:00.000000', '2025-01-01 00:00:00.000000')""",
+]
+
+
+def _legacy_engine(tmp_path):
+    engine, SessionLocal = get_engine_and_sessionmaker(
+        f"sqlite:///{tmp_path / 'legacy.db'}"
+    )
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    return engine, SessionLocal
+
+
+def _assert_migrated(engine, SessionLocal):
+    insp = inspect(engine)
+    assert not [name for name in insp.get_table_names() if name.endswith("_legacy")]
+    for table in ("mcp_tools", "user_access_tokens"):
+        columns = [c["name"] for c in insp.get_columns(table)]
+        assert "service_id" in columns
+        assert "service_name" not in columns
+    with SessionLocal() as db:
+        tools = crud.get_tools(db, service_name="svc1")
+        assert [(t.id, t.name, [r.name for r in t.roles]) for t in tools] == [
+            (3, "tool1", ["admin"])
+        ]
+        token = crud.get_user_service_token(db, user_id="alice", service_name="svc1")
+        assert token == "secret"
+
+
+@pytest.mark.parametrize("copy", [False, True], ids=["transactional", "copy"])
+def test_init_db_migrates_service_name_foreign_keys(tmp_path, monkeypatch, copy):
+    engine, SessionLocal = _legacy_engine(tmp_path)
+    if copy:
+        # The path taken on MySQL, where DDL is not transactional
+        monkeypatch.setattr(engine.dialect, "name", "mysql")
+
+    init_db(engine)
+
+    monkeypatch.undo()
+    _assert_migrated(engine, SessionLocal)
+    # Running again on the migrated schema is a no-op
+    init_db(engine)
+    engine.dispose()
+
+
+def test_init_db_resumes_interrupted_copy_migration(tmp_path):
+    engine, SessionLocal = _legacy_engine(tmp_path)
+    # MySQL committed the renames and the new tables, then the copy failed
+    with engine.begin() as conn:
+        for name in ("mcp_tool_roles", "user_access_tokens", "mcp_tools"):
+            conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}_legacy"))
+
+    init_db(engine)
+
+    _assert_migrated(engine, SessionLocal)
+    engine.dispose()
+
+
+def test_init_db_versions_existing_change_log(tmp_path):
+    engine, SessionLocal = get_engine_and_sessionmaker(f"sqlite:///{tmp_path / 'db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE mcp_change_log (id INTEGER PRIMARY KEY, "
+                "entity VARCHAR(32) NOT NULL, action VARCHAR(16) NOT NULL, "
+                "data TEXT NOT NULL, created_at DATETIME NOT NULL)"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO mcp_change_log VALUES "
+                "(4, 'user', 'added', '{}', '2025-01-01 00:00:00.000000')"
+            )
+        )
+
+    init_db(engine)
+    init_db(engine)
+
+    with SessionLocal() as db:
+        crud.get_or_create_user(db, user_id="alice")
+        assert crud.get_catalog_changes(db, since=3)["version"] == 5
+    engine.dispose()
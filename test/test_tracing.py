@@ -0,0 +1,50 @@
+import inspect
+import json
+
+import crud
+import tracing
+from tracing import Tracer
+
+
+def test_trace_records_nested_spans(db, db_engine, tmp_path):
+    tracer = Tracer(sample_rate=1.0, file_path=str(tmp_path / "traces.jsonl"))
+    tracer.install(db_engine)
+
+    with tracer.trace("http /register_user"), tracing.span("handler", user_id="u1"):
+        crud.get_or_create_user(db, user_id="u1")
+
+    [trace] = tracer.traces()
+    spans = {span["name"]: span for span in trace["spans"]}
+    assert trace["name"] == "http /register_user"
+    assert spans["http /register_user"]["parent_id"] is None
+    assert spans["handler"]["attributes"] == {"user_id": "u1"}
+    assert spans["crud.get_or_create_user"]["parent_id"] == spans["handler"]["span_id"]
+    assert (
+        spans["db.commit"]["parent_id"] == spans["crud.get_or_create_user"]["span_id"]
+    )
+    sql = [span for span in trace["spans"] if span["name"] == "sql"]
+    assert sql[0]["attributes"]["statement"].startswith("SELECT")
+    assert trace["duration_ms"] >= spans["handler"]["duration_ms"]
+
+    tracer.close()
+    written = json.loads((tmp_path / "traces.jsonl").read_text().splitlines()[0])
+    assert written["trace_id"] == trace["trace_id"]
+
+
+def test_unsampled_requests_are_not_recorded(db, db_engine):
+    tracer = Tracer(sample_rate=0.0)
+    tracer.install(db_engine)
+    with tracer.trace("http /list_users"):
+        crud.list_users(db)
+    assert tracer.traces() == []
+
+
+def test_every_crud_function_is_traced():
+    untraced = [
+        name
+        for name, fn in inspect.getmembers(crud, inspect.isfunction)
+        if fn.__module__ == crud.__name__
+        and not name.startswith("_")
+        and not hasattr(fn, "__wrapped__")
+    ]
+    assert untraced == []
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import crud
+import models
+from storage import Base, get_engine_and_sessionmaker
+from write_queue import WriteQueue
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine, SessionLocal = get_engine_and_sessionmaker(
+        f"sqlite:///{tmp_path / 'queue.db'}"
+    )
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(
+            models.MCPService(
+                service_name="svc1",
+                endpoint="http://localhost:8000",
+                description="Test MCP service",
+                requires_authorization=True,
+                method_authorization="Bearer",
+            )
+        )
+        db.commit()
+    yield SessionLocal
+    engine.dispose()
+
+
+def _set_token(user_id, service_name="svc1"):
+    def intent(db):
+        crud.set_user_service_token(
+            db, user_id=user_id, service_name=service_name, token=f"t-{user_id}"
+        )
+        return user_id
+
+    return intent
+
+
+@pytest.mark.asyncio
+async def test_write_queue_group_commits_concurrent_intents(session_factory):
+    queue = WriteQueue(session_factory, enabled=True, max_batch=50, max_delay_ms=20)
+
+    results = await asyncio.gather(
+        *(queue.run(_set_token(f"user{i}")) for i in range(20))
+    )
+
+    assert results == [f"user{i}" for i in range(20)]
+    assert queue.intents == 20
+    assert queue.batches < 20
+    with session_factory() as db:
+        assert (
+            crud.get_user_service_token(db, user_id="user7", service_name="svc1")
+            == "t-user7"
+        )
+
+
+@pytest.mark.asyncio
+async def test_write_queue_failure_only_affects_its_caller(session_factory):
+    queue = WriteQueue(session_factory, enabled=True, max_delay_ms=20)
+
+    results = await asyncio.gather(
+        queue.run(_set_token("alice")),
+        queue.run(_set_token("bob", service_name="missing")),
+        return_exceptions=True,
+    )
+
+    assert results[0] == "alice"
+    assert isinstance(results[1], ValueError)
+    with session_factory() as db:
+        assert crud.get_user_service_token(db, user_id="alice", service_name="svc1")
+
+
+@pytest.mark.asyncio
+async def test_write_queue_survives_batch_infrastructure_failure(session_factory):
+    calls = 0
+
+    def flaky_factory():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("database unavailable")
+        return session_factory()
+
+    queue = WriteQueue(flaky_factory, enabled=True, max_delay_ms=20)
+
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(queue.run(_set_token("alice")), 5)
+    assert await asyncio.wait_for(queue.run(_set_token("bob")), 5) == "bob"